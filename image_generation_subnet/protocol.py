@@ -99,7 +99,9 @@ class ImageGenerating(bt.Synapse):
             "response_dict": self.response_dict,
         }
 
-    def store_response(self, storage_url: str, uid, validator_uid):
+    def store_response(
+        self, storage_url: str, uid, validator_uid, connection_pool=None
+    ):
         if self.model_name == "GoJourney":
             storage_url = storage_url + "/upload-go-journey-item"
             data = {
@@ -129,7 +131,10 @@ class ImageGenerating(bt.Synapse):
                 }
             }
         try:
-            response = requests.post(storage_url, json=data)
+            if connection_pool:
+                response = connection_pool.post(storage_url, json=data)
+            else:
+                response = requests.post(storage_url, json=data)
             response.raise_for_status()
         except Exception as e:
             print(f"Error in storing response: {e}")
@@ -189,7 +194,9 @@ class TextGenerating(bt.Synapse):
             "model_name": self.model_name,
         }
 
-    def store_response(self, storage_url: str, uid, validator_uid):
+    def store_response(
+        self, storage_url: str, uid, validator_uid, connection_pool=None
+    ):
         pass
 
 class MultiModalGenerating(bt.Synapse):
@@ -301,7 +308,9 @@ class MultiModalGenerating(bt.Synapse):
             "model_name": self.model_name,
         }
 
-    def store_response(self, storage_url: str, uid, validator_uid):
+    def store_response(
+        self, storage_url: str, uid, validator_uid, connection_pool=None
+    ):
         storage_url = storage_url + "/upload-multimodal-item"
         minimized_prompt_output: dict = copy.deepcopy(self.prompt_output)
         minimized_prompt_output['choices'][0].pop("logprobs")
@@ -318,7 +327,10 @@ class MultiModalGenerating(bt.Synapse):
             }
         }
         try:
-            response = requests.post(storage_url, json=data)
+            if connection_pool:
+                response = connection_pool.post(storage_url, json=data)
+            else:
+                response = requests.post(storage_url, json=data)
             response.raise_for_status()
         except Exception as e:
             print(f"Error in storing response: {e}")
@@ -127,10 +127,101 @@ def add_args(cls, parser):
         parser.add_argument(
             "--async_batch_size",
             type=int,
-            help="The number of threads to run in a single loop.",
+            help="The number of uids queried per batch.",
             default=16,
         )
 
+        parser.add_argument(
+            "--max_concurrent_batches_per_model",
+            type=int,
+            help="The maximum number of batches of the same model running concurrently.",
+            default=4,
+        )
+
+        parser.add_argument(
+            "--connection_pool.max_connections_per_host",
+            type=int,
+            help="The maximum number of open connections per host for outbound validator traffic.",
+            default=32,
+        )
+
+        parser.add_argument(
+            "--connection_pool.max_keepalive_per_host",
+            type=int,
+            help="The maximum number of idle keep-alive connections kept per host.",
+            default=16,
+        )
+
+        parser.add_argument(
+            "--connection_pool.keepalive_expiry",
+            type=float,
+            help="Seconds an idle keep-alive connection is kept open.",
+            default=60,
+        )
+
+        parser.add_argument(
+            "--connection_pool.disable_http2",
+            action="store_true",
+            help="If set, outbound HTTP calls do not use HTTP/2 even when available.",
+            default=False,
+        )
+
+        parser.add_argument(
+            "--stream_reward.window",
+            type=float,
+            help="Seconds to collect miner responses into one reward micro-batch after the first one arrives.",
+            default=1.0,
+        )
+
+        parser.add_argument(
+            "--stream_reward.disable",
+            action="store_true",
+            help="If set, each challenge group is rewarded once all its miners answered or timed out.",
+            default=False,
+        )
+
+        parser.add_argument(
+            "--adaptive_timeout.disable",
+            action="store_true",
+            help="If set, miners are always queried with the catalogue timeout.",
+            default=False,
+        )
+
+        parser.add_argument(
+            "--adaptive_timeout.quantile",
+            type=float,
+            help="Latency quantile (cut-off requests count at their timeout) used for the adaptive miner timeout.",
+            default=0.99,
+        )
+
+        parser.add_argument(
+            "--adaptive_timeout.margin",
+            type=float,
+            help="Multiplier applied to the latency quantile; the catalogue timeout stays the upper bound.",
+            default=1.5,
+        )
+
+        parser.add_argument(
+            "--miner_identity.ttl",
+            type=float,
+            help="Seconds a miner's Information response is reused before it is probed again.",
+            default=1800,
+        )
+
+        parser.add_argument(
+            "--miner_identity.negative_ttl",
+            type=float,
+            help="Seconds before a serving axon that did not answer Information is probed again.",
+            default=600,
+        )
+
+        parser.add_argument(
+            "--state_journal.compact_size_mb",
+            type=float,
+            help="Compact the validator state journal into a new snapshot once it grows past this size.",
+            default=8,
+        )
+
         parser.add_argument(
             "--storage_url",
             type=str,
@@ -159,6 +250,59 @@ def add_args(cls, parser):
             default=0.1,
         )
 
+        parser.add_argument(
+            "--proxy.separate_process",
+            action="store_true",
+            help="If set, the proxy runs in its own process and reads miner state from shared memory.",
+            default=False,
+        )
+
+        parser.add_argument(
+            "--proxy.cache_size",
+            type=int,
+            help="Maximum number of organic responses cached by request hash. 0 disables the cache.",
+            default=64,
+        )
+
+        parser.add_argument(
+            "--proxy.cache_ttl",
+            type=float,
+            help="Seconds a cached organic response is served for identical requests.",
+            default=600,
+        )
+
+        parser.add_argument(
+            "--proxy.selection_policy",
+            type=str,
+            choices=["queue", "random", "least_outstanding", "p2c"],
+            help="How organic requests pick miners among those with rate-limit credit left. 'queue' keeps the round-robin order.",
+            default="queue",
+        )
+
+        parser.add_argument(
+            "--proxy.fanout",
+            type=int,
+            help="Number of miners an organic request is sent to at once.",
+            default=1,
+        )
+
+        parser.add_argument(
+            "--proxy.max_hedges",
+            type=int,
+            help="Maximum number of backup requests fired while waiting for an organic response. "
+            "Each backup is one more miner request: allowing one sends it for about "
+            "1 - hedge_quantile of the requests (10%% more organic miner load at 0.9). "
+            "0 turns hedging off.",
+            default=0,
+        )
+
+        parser.add_argument(
+            "--proxy.hedge_quantile",
+            type=float,
+            help="Miner latency quantile after which a backup request is sent to the next miner.",
+            default=0.9,
+        )
+
         parser.add_argument(
             "--reward_url.RealitiesEdgeXL",
             type=str,
@@ -270,6 +414,20 @@ def add_args(cls, parser):
             default="https://nicheimage-api.nichetensor.com/challenge/vqa",
         )
 
+        parser.add_argument(
+            "--challenge.prefetch_size",
+            type=int,
+            help="The number of challenges kept ready per pipeline type and model, 0 to disable prefetching.",
+            default=4,
+        )
+
+        parser.add_argument(
+            "--challenge.prefetch_ttl",
+            type=float,
+            help="Seconds after which a prefetched challenge is considered stale.",
+            default=300,
+        )
+
         parser.add_argument(
             "--share_response",
             action="store_true",
@@ -298,6 +456,41 @@ def add_args(cls, parser):
             default="http://127.0.0.1:6379",
         )
 
+        parser.add_argument(
+            "--offline_reward.batch_size",
+            type=int,
+            help="Base synapses sent to the validator endpoint per request.",
+            default=8,
+        )
+
+        parser.add_argument(
+            "--offline_reward.max_in_flight",
+            type=int,
+            help="Requests of one model outstanding at the validator endpoint.",
+            default=2,
+        )
+
+        parser.add_argument(
+            "--offline_reward.request_timeout",
+            type=float,
+            help="Timeout in seconds of a validator endpoint request.",
+            default=300,
+        )
+
+        parser.add_argument(
+            "--offline_reward.blob_dir",
+            type=str,
+            help="Keep images of offline reward messages in this directory instead of Redis.",
+            default=None,
+        )
+
+        parser.add_argument(
+            "--offline_reward.blob_ttl",
+            type=int,
+            help="Seconds an image of an offline reward message is kept.",
+            default=3600,
+        )
+
     else:
         parser.add_argument(
             "--blacklist.force_validator_permit",
@@ -6,6 +6,25 @@ from .forward import (
 )
 from .offline_reward import get_reward_GoJourney, get_reward_dalle
 from .miner_manager import MinerManager
+from .query_queue import QueryQueue, CreditQueue
+from .loop_pacer import LoopPacer
+from .connection_pool import ConnectionPool
+from .challenge_prefetcher import ChallengePrefetcher
+from .weights import compute_weights, rank_matrix
+from .state_journal import StateJournal
+from .adaptive_timeout import AdaptiveTimeout, LatencySketch
+from .micro_batch import as_completed_batches
+from .hedged_request import HedgeMetrics, hedged_request
+from .proxy_selection import (
+    SelectionPolicy,
+    RandomSelection,
+    LeastOutstandingSelection,
+    PowerOfTwoSelection,
+    build_selection_policy,
+)
+from .request_coalescer import RequestCoalescer, ResultCache, request_key
+from .shared_state import SharedStatePublisher, SharedStateReader
+from .proxy_auth import CredentialVerifier
 from .offline_challenge import get_promptGoJouney
 
 __all__ = [
@@ -15,6 +34,30 @@ __all__ = [
     "add_time_penalty",
     "get_reward_GoJourney",
     "MinerManager",
+    "QueryQueue",
+    "CreditQueue",
+    "LoopPacer",
+    "ConnectionPool",
+    "ChallengePrefetcher",
+    "compute_weights",
+    "rank_matrix",
+    "StateJournal",
+    "AdaptiveTimeout",
+    "LatencySketch",
+    "as_completed_batches",
+    "HedgeMetrics",
+    "hedged_request",
+    "SelectionPolicy",
+    "RandomSelection",
+    "LeastOutstandingSelection",
+    "PowerOfTwoSelection",
+    "build_selection_policy",
+    "RequestCoalescer",
+    "ResultCache",
+    "request_key",
+    "SharedStatePublisher",
+    "SharedStateReader",
+    "CredentialVerifier",
     "get_promptGoJouney",
     "get_reward_dalle",
 ]
@@ -0,0 +1,144 @@
+import math
+from collections import defaultdict
+from threading import Lock
+import bittensor as bt
+
+
+class LatencySketch:
+    """
+    Streaming quantile sketch with bounded relative error (DDSketch-style
+    log buckets). Counts decay geometrically so the quantiles follow the
+    recent latency distribution instead of the whole history.
+    """
+
+    def __init__(
+        self,
+        relative_accuracy: float = 0.02,
+        min_value: float = 1e-3,
+    ):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.buckets = defaultdict(float)
+        self.count = 0.0
+
+    def add(self, value: float):
+        index = math.ceil(math.log(max(value, self.min_value)) / self.log_gamma)
+        self.buckets[index] += 1
+        self.count += 1
+
+    def decay(self, factor: float):
+        for index in list(self.buckets):
+            self.buckets[index] *= factor
+            if self.buckets[index] < 1e-3:
+                del self.buckets[index]
+        self.count *= factor
+
+    def quantile(self, q: float) -> float:
+        if self.count <= 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0.0
+        for index in sorted(self.buckets):
+            cumulative += self.buckets[index]
+            if cumulative >= rank:
+                return 2 * self.gamma**index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class AdaptiveTimeout:
+    """
+    Per-model dendrite timeouts derived from observed miner process times.
+
+    The effective timeout of a model is `quantile(q) * margin`, clamped to
+    [min_fraction * catalogue timeout, catalogue timeout]. Until `min_samples`
+    samples were seen, the catalogue timeout is used as is. The timeout is
+    what `dendrite.call` puts in `synapse.timeout`, so miners see it too.
+
+    Responses cut off by the timeout are recorded as censored samples at the
+    timeout they were given: their latency is at least that much. Without
+    them the sketch would only see the responses that beat the timeout and
+    the quantile would keep shrinking towards the lower clamp. With them,
+    once more than `1 - quantile` of the requests are cut off the quantile
+    reaches the timeout and the next one is `margin` times longer.
+    """
+
+    def __init__(
+        self,
+        max_timeouts: dict[str, float],
+        quantile: float = 0.99,
+        margin: float = 1.5,
+        min_fraction: float = 0.25,
+        min_samples: int = 50,
+        decay: float = 0.5,
+        enabled: bool = True,
+    ):
+        self.max_timeouts = dict(max_timeouts)
+        self.quantile = quantile
+        self.margin = margin
+        self.min_fraction = min_fraction
+        self.min_samples = min_samples
+        self.decay_factor = decay
+        self.enabled = enabled
+        self.sketches = defaultdict(LatencySketch)
+        self.lock = Lock()
+
+    def observe(
+        self,
+        model_name: str,
+        process_times: list[float],
+        timed_out: list[float] = (),
+    ):
+        """
+        Record process times of successful responses (negative values are
+        skipped) and, for the requests cut off by their timeout, that timeout.
+        """
+        with self.lock:
+            sketch = self.sketches[model_name]
+            for process_time in process_times:
+                if process_time is not None and process_time >= 0:
+                    sketch.add(process_time)
+            for timeout in timed_out:
+                if timeout:
+                    sketch.add(timeout)
+
+    def get_timeout(self, model_name: str) -> float:
+        max_timeout = self.max_timeouts.get(model_name, 12)
+        if not self.enabled:
+            return max_timeout
+        with self.lock:
+            sketch = self.sketches.get(model_name)
+            if sketch is None or sketch.count < self.min_samples:
+                return max_timeout
+            timeout = sketch.quantile(self.quantile) * self.margin
+        return min(max(timeout, max_timeout * self.min_fraction), max_timeout)
+
+    def get_quantile(self, model_name: str, q: float):
+        """Latency quantile of `model_name`, or None until `min_samples` were seen."""
+        with self.lock:
+            sketch = self.sketches.get(model_name)
+            if sketch is None or sketch.count < self.min_samples:
+                return None
+            return sketch.quantile(q)
+
+    def quantiles(self, model_name: str, qs=(0.5, 0.9, 0.99)) -> dict:
+        with self.lock:
+            sketch = self.sketches.get(model_name)
+            if sketch is None:
+                return {}
+            return {q: sketch.quantile(q) for q in qs}
+
+    def end_loop(self):
+        """Log the latency quantiles and decay the sketches for the next loop."""
+        stats = {}
+        for model_name in sorted(self.sketches):
+            quantiles = self.quantiles(model_name)
+            stats[model_name] = {
+                **{f"p{int(q * 100)}": round(v, 2) for q, v in quantiles.items()},
+                "timeout": round(self.get_timeout(model_name), 2),
+                "samples": round(self.sketches[model_name].count),
+            }
+        bt.logging.info(f"Miner latency quantiles and timeouts: {stats}")
+        with self.lock:
+            for sketch in self.sketches.values():
+                sketch.decay(self.decay_factor)
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+from collections import deque
+import bittensor as bt
+
+
+class ChallengePrefetcher:
+    """
+    Keeps up to `buffer_size` ready-to-use challenge synapses per
+    (pipeline_type, model_name), refilled in the background by one async
+    producer per key. Open category prompts depend on the model, so buffers
+    are keyed by model as well as pipeline type.
+
+    Challenges older than `ttl` seconds are dropped. `get` never blocks: it
+    returns None when the buffer is empty and the caller falls back to the
+    backup challenge functions.
+    """
+
+    def __init__(
+        self,
+        produce_fn,
+        keys: list[tuple[str, str]],
+        buffer_size: int = 4,
+        ttl: float = 300,
+        retry_interval: float = 10,
+    ):
+        self.produce_fn = produce_fn
+        self.keys = list(dict.fromkeys(keys))
+        self.buffer_size = buffer_size
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.buffers = {key: deque() for key in self.keys}
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "produced": 0}
+        self.loop = None
+        self.refill_events = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.buffer_size > 0
+
+    def start(self):
+        if not self.enabled:
+            return
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(
+            asyncio.gather(*[self.produce(key) for key in self.keys])
+        )
+
+    def _drop_stale(self, key) -> None:
+        buffer = self.buffers[key]
+        expired_at = time.time() - self.ttl
+        while buffer and buffer[0][0] < expired_at:
+            buffer.popleft()
+            self.stats["stale"] += 1
+
+    async def produce(self, key):
+        self.refill_events[key] = asyncio.Event()
+        while True:
+            with self.lock:
+                self._drop_stale(key)
+                is_full = len(self.buffers[key]) >= self.buffer_size
+            if is_full:
+                self.refill_events[key].clear()
+                try:
+                    await asyncio.wait_for(
+                        self.refill_events[key].wait(), timeout=self.ttl / 2
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                synapse = await asyncio.to_thread(self.produce_fn, *key)
+            except Exception as e:
+                bt.logging.warning(f"Error prefetching challenge for {key}: {e}")
+                synapse = None
+            if synapse is None:
+                await asyncio.sleep(self.retry_interval)
+                continue
+            with self.lock:
+                self.buffers[key].append((time.time(), synapse))
+                self.stats["produced"] += 1
+
+    def get(self, pipeline_type: str, model_name: str):
+        """Pop a fresh prefetched challenge, or None if the buffer is empty."""
+        key = (pipeline_type, model_name)
+        if key not in self.buffers:
+            return None
+        with self.lock:
+            self._drop_stale(key)
+            if self.buffers[key]:
+                _, synapse = self.buffers[key].popleft()
+                self.stats["hits"] += 1
+            else:
+                synapse = None
+                self.stats["misses"] += 1
+        if self.loop and key in self.refill_events:
+            self.loop.call_soon_threadsafe(self.refill_events[key].set)
+        return synapse
+
+    def log_stats(self):
+        buffered = {
+            f"{pipeline_type}/{model_name}": len(buffer)
+            for (pipeline_type, model_name), buffer in self.buffers.items()
+        }
+        bt.logging.info(
+            f"Challenge prefetcher stats: {self.stats}, buffered: {buffered}"
+        )
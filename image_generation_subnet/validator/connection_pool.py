@@ -0,0 +1,132 @@
+import asyncio
+import importlib.util
+import threading
+from urllib.parse import urlparse
+import aiohttp
+import bittensor as bt
+import httpx
+
+
+class ConnectionPool:
+    """
+    Validator-wide pool of keep-alive connections for outbound traffic.
+
+    - HTTP calls (challenge, reward and storage urls) go through one long-lived
+      httpx.Client per host, so each host has its own connection limits and
+      TCP/TLS sessions are reused across synapses. HTTP/2 is used when `h2` is installed.
+    - Miner queries go through one long-lived dendrite per event loop whose
+      aiohttp session keeps connections to axons alive between batches.
+
+    Counters:
+        pool_hits / pool_misses: requests served by an existing / newly created client.
+        new_connections / reused_connections: connections opened vs reused by requests.
+    """
+
+    def __init__(
+        self,
+        wallet,
+        max_connections_per_host: int = 32,
+        max_keepalive_per_host: int = 16,
+        keepalive_expiry: float = 60,
+        http2: bool = True,
+    ):
+        self.wallet = wallet
+        self.max_connections_per_host = max_connections_per_host
+        self.max_keepalive_per_host = max_keepalive_per_host
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        self.clients: dict[str, httpx.Client] = {}
+        self.dendrites: dict[asyncio.AbstractEventLoop, bt.dendrite] = {}
+        self.lock = threading.Lock()
+        self.stats = {
+            channel: {
+                "requests": 0,
+                "pool_hits": 0,
+                "pool_misses": 0,
+                "new_connections": 0,
+                "reused_connections": 0,
+            }
+            for channel in ["http", "dendrite"]
+        }
+
+    def _count(self, channel: str, key: str, value: int = 1):
+        with self.lock:
+            self.stats[channel][key] += value
+
+    def get_client(self, url: str) -> httpx.Client:
+        parsed_url = urlparse(url)
+        host = f"{parsed_url.scheme}://{parsed_url.netloc}"
+        with self.lock:
+            client = self.clients.get(host)
+            if client is not None:
+                self.stats["http"]["pool_hits"] += 1
+                return client
+            self.stats["http"]["pool_misses"] += 1
+            client = httpx.Client(
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections_per_host,
+                    max_keepalive_connections=self.max_keepalive_per_host,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+            )
+            self.clients[host] = client
+            return client
+
+    def request(self, method: str, url: str, timeout=60, **kwargs) -> httpx.Response:
+        client = self.get_client(url)
+        connected = []
+
+        def trace(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.complete":
+                connected.append(True)
+
+        response = client.request(
+            method,
+            url,
+            timeout=timeout,
+            extensions={"trace": trace},
+            **kwargs,
+        )
+        self._count("http", "requests")
+        self._count("http", "new_connections" if connected else "reused_connections")
+        return response
+
+    def post(self, url: str, timeout=60, **kwargs) -> httpx.Response:
+        return self.request("POST", url, timeout=timeout, **kwargs)
+
+    async def _on_connection_create_end(self, session, context, params):
+        self._count("dendrite", "new_connections")
+
+    async def _on_connection_reuseconn(self, session, context, params):
+        self._count("dendrite", "reused_connections")
+
+    async def _on_request_start(self, session, context, params):
+        self._count("dendrite", "requests")
+
+    def get_dendrite(self) -> bt.dendrite:
+        """Return the shared dendrite of the running event loop."""
+        loop = asyncio.get_running_loop()
+        dendrite = self.dendrites.get(loop)
+        if dendrite is not None:
+            self._count("dendrite", "pool_hits")
+            return dendrite
+        self._count("dendrite", "pool_misses")
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        trace_config.on_request_start.append(self._on_request_start)
+        dendrite = bt.dendrite(wallet=self.wallet)
+        dendrite._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=0,
+                limit_per_host=self.max_connections_per_host,
+                keepalive_timeout=self.keepalive_expiry,
+            ),
+            trace_configs=[trace_config],
+        )
+        self.dendrites[loop] = dendrite
+        return dendrite
+
+    def log_stats(self):
+        bt.logging.info(f"Connection pool stats: {self.stats}")
@@ -4,7 +4,6 @@ from image_generation_subnet.protocol import ImageGenerating
 from typing import List
 from math import pow
 from functools import wraps
-from tqdm import tqdm
 import httpx
 import json
 
@@ -45,15 +44,21 @@ def skip(**kwargs):
 
 
 def get_challenge(
-    url: str, synapses: List[ImageGenerating], backup_func: callable
+    url: str,
+    synapses: List[ImageGenerating],
+    backup_func: callable,
+    connection_pool=None,
 ) -> List[ImageGenerating]:
-    for i, synapse in tqdm(enumerate(synapses), total=len(synapses)):
+    for i, synapse in enumerate(synapses):
         if not synapse:
             continue
         try:
             data = synapse.deserialize()
-            with httpx.Client(timeout=httpx.Timeout(60)) as client:
-                response = client.post(url, json=data)
+            if connection_pool:
+                response = connection_pool.post(url, json=data, timeout=60)
+            else:
+                with httpx.Client(timeout=httpx.Timeout(60)) as client:
+                    response = client.post(url, json=data)
             if response.status_code != 200:
                 challenge = backup_func()
             else:
@@ -98,6 +103,9 @@ def get_reward_offline(
         "all_miner_data": all_miner_data
     }
     try:
+        # Images go to the blob store once, the message only carries references
+        message_broker.blob_store.offload(miner_data + all_miner_data, ["image", "conditional_image"])
+        message_broker.blob_store.offload([data["base_data"]], ["image", "conditional_image"])
         message_broker.publish_to_stream(stream_name = "synapse_data", message = {"data": json.dumps(data)})
     except Exception as ex:
         bt.logging.error(f"Push synapse result to message broker fail: {str(ex)} ")
@@ -110,6 +118,7 @@ def get_reward(
     uids: List[int],
     timeout: float,
     miner_manager,
+    connection_pool=None,
 ) -> List[float]:
     valid_uids = [uid for uid, response in zip(uids, synapses) if response.is_success]
     invalid_uids = [
@@ -122,8 +131,13 @@ def get_reward(
             "miner_data": [synapse.deserialize() for synapse in valid_synapses],
             "base_data": base_synapse.deserialize_input(),
         }
-        with httpx.Client(timeout=httpx.Timeout(120, connect=8)) as client:
-            response = client.post(url, json=data)
+        if connection_pool:
+            response = connection_pool.post(
+                url, json=data, timeout=httpx.Timeout(120, connect=8)
+            )
+        else:
+            with httpx.Client(timeout=httpx.Timeout(120, connect=8)) as client:
+                response = client.post(url, json=data)
         if response.status_code != 200:
             raise Exception(f"Error in get_reward: {response.json()}")
         valid_rewards = response.json()["rewards"]
@@ -0,0 +1,126 @@
+import asyncio
+from collections import defaultdict
+from threading import Lock
+from typing import Awaitable, Callable, Iterator
+import bittensor as bt
+
+
+class HedgeMetrics:
+    """
+    Per-model counters of the hedged proxy requests.
+    - attempts / requests is the load added by hedging and retries.
+    - hedge_wins / hedges is how often a backup request beat the ones before it.
+    """
+
+    FIELDS = [
+        "requests",
+        "successes",
+        "attempts",
+        "hedges",
+        "hedge_wins",
+        "retries",
+        "cancelled",
+    ]
+
+    def __init__(self):
+        self.lock = Lock()
+        self.stats = defaultdict(lambda: dict.fromkeys(self.FIELDS, 0))
+
+    def count(self, model_name: str, key: str, value: int = 1):
+        with self.lock:
+            self.stats[model_name][key] += value
+
+    def summary(self) -> dict:
+        with self.lock:
+            summary = {}
+            for model_name, stats in self.stats.items():
+                summary[model_name] = {
+                    **stats,
+                    "hedge_win_rate": round(
+                        stats["hedge_wins"] / max(stats["hedges"], 1), 3
+                    ),
+                    "load_factor": round(
+                        stats["attempts"] / max(stats["requests"], 1), 3
+                    ),
+                }
+            return summary
+
+    def log_stats(self):
+        bt.logging.info(f"Proxy hedging stats: {self.summary()}")
+
+
+async def hedged_request(
+    candidates: Iterator,
+    send: Callable[..., Awaitable],
+    is_success: Callable[..., bool],
+    model_name: str,
+    metrics: HedgeMetrics,
+    fanout: int = 1,
+    hedge_delay: float = None,
+    max_hedges: int = 0,
+):
+    """
+    Send a request to `fanout` candidates at once, then fire one backup to the
+    next candidate every `hedge_delay` seconds without an answer (up to
+    `max_hedges`). A failed attempt is replaced by the next candidate right
+    away. The first successful result wins and the others are cancelled.
+    Every backup is an extra miner request; `max_hedges = 0` sends none.
+
+    Candidates are only pulled from the iterator when they are sent to, so
+    unused candidates keep their rate-limit credit.
+
+    Returns `(candidate, result)` of the winner, or None if every candidate failed.
+    """
+    metrics.count(model_name, "requests")
+    in_flight = {}
+    hedges = 0
+
+    def launch(is_hedge: bool) -> bool:
+        candidate = next(candidates, None)
+        if candidate is None:
+            return False
+        task = asyncio.create_task(send(candidate))
+        in_flight[task] = (candidate, is_hedge)
+        metrics.count(model_name, "attempts")
+        if is_hedge:
+            metrics.count(model_name, "hedges")
+        return True
+
+    for _ in range(max(fanout, 1)):
+        if not launch(is_hedge=False):
+            break
+    exhausted = False
+    try:
+        while in_flight:
+            can_hedge = (
+                hedge_delay is not None and hedges < max_hedges and not exhausted
+            )
+            done, _ = await asyncio.wait(
+                in_flight,
+                timeout=hedge_delay if can_hedge else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                hedges += 1
+                exhausted = not launch(is_hedge=True)
+                continue
+            for task in done:
+                candidate, is_hedge = in_flight.pop(task)
+                if task.exception() is not None:
+                    bt.logging.warning(
+                        f"Hedged request to {candidate} failed: {task.exception()}"
+                    )
+                elif is_success(task.result()):
+                    metrics.count(model_name, "successes")
+                    if is_hedge:
+                        metrics.count(model_name, "hedge_wins")
+                    return candidate, task.result()
+                if not exhausted:
+                    exhausted = not launch(is_hedge=False)
+                    if not exhausted:
+                        metrics.count(model_name, "retries")
+        return None
+    finally:
+        for task in in_flight:
+            task.cancel()
+        metrics.count(model_name, "cancelled", len(in_flight))
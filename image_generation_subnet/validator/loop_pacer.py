@@ -0,0 +1,70 @@
+import time
+from collections import deque
+import bittensor as bt
+
+
+class LoopPacer:
+    """
+    Deadline-based pacing for the validator forward loop.
+
+    Batch launches are spread over the time left before `loop_base_time`,
+    minus the expected duration of the slowest pending model, so the last
+    batches finish close to the loop deadline. Expected durations are an EWMA
+    of measured batch durations, seeded with the catalogue timeouts.
+    """
+
+    def __init__(
+        self,
+        loop_base_time: float,
+        default_durations: dict[str, float],
+        alpha: float = 0.3,
+        history_size: int = 100,
+    ):
+        self.loop_base_time = loop_base_time
+        self.batch_durations = dict(default_durations)
+        self.alpha = alpha
+        self.slippages = deque(maxlen=history_size)
+        self.loop_start = time.time()
+        self.loop_deadline = self.loop_start + loop_base_time
+
+    def start_loop(self):
+        self.loop_start = time.time()
+        self.loop_deadline = self.loop_start + self.loop_base_time
+
+    def record_batch(self, model_name: str, duration: float):
+        previous = self.batch_durations.get(model_name)
+        if previous is None:
+            self.batch_durations[model_name] = duration
+        else:
+            self.batch_durations[model_name] = (
+                self.alpha * duration + (1 - self.alpha) * previous
+            )
+
+    def expected_duration(self, model_names) -> float:
+        return max(
+            [self.batch_durations.get(model_name, 0) for model_name in model_names],
+            default=0,
+        )
+
+    def next_delay(self, remaining_batches: int, pending_models) -> float:
+        """Seconds to wait before launching the next batch."""
+        if remaining_batches <= 0:
+            return 0
+        launch_window_end = self.loop_deadline - self.expected_duration(pending_models)
+        return max(0, (launch_window_end - time.time()) / remaining_batches)
+
+    def end_loop(self) -> float:
+        """Record and return how far the batches finished past the deadline."""
+        slippage = time.time() - self.loop_deadline
+        self.slippages.append(slippage)
+        bt.logging.info(
+            f"Loop batches finished in {time.time() - self.loop_start:.1f}s, "
+            f"target {self.loop_base_time}s, slippage {slippage:+.1f}s "
+            f"(mean of last {len(self.slippages)}: "
+            f"{sum(self.slippages) / len(self.slippages):+.1f}s)"
+        )
+        bt.logging.info(
+            "Expected batch durations: "
+            + str({k: round(v, 1) for k, v in self.batch_durations.items()})
+        )
+        return slippage
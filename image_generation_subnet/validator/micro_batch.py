@@ -0,0 +1,26 @@
+import asyncio
+from typing import AsyncIterator, Iterable
+
+
+async def as_completed_batches(
+    tasks: Iterable[asyncio.Future], window: float = None
+) -> AsyncIterator[list]:
+    """
+    Yield the results of `tasks` in micro-batches as they complete.
+
+    A batch opens with the first result to arrive and collects whatever else
+    completes in the next `window` seconds. `window=None` waits for all tasks
+    and yields a single batch.
+    """
+    pending = set(tasks)
+    while pending:
+        if window is None:
+            done, pending = await asyncio.wait(pending)
+        else:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            if pending and window > 0:
+                more, pending = await asyncio.wait(pending, timeout=window)
+                done |= more
+        yield [task.result() for task in done]
@@ -1,47 +1,268 @@
+import asyncio
+import copy
+import time
 import bittensor as bt
+from collections.abc import Mapping
 from image_generation_subnet.protocol import ImageGenerating, Information
 import torch
 from image_generation_subnet.utils.volume_setting import get_volume_per_validator
-import requests
-from threading import Thread
+from threading import Lock, Thread
 import image_generation_subnet as ig_subnet
 
+NUM_SCORES_TO_KEEP = 10
+NUM_PROCESS_TIMES_TO_KEEP = 500
+
+
+class MinerInfoView(Mapping):
+    """
+    Read-only dict view of the columnar miner state: `view[uid]` builds the
+    legacy per-uid dict (scores, model_name, process_time, total_volume, ...).
+    """
+
+    def __init__(self, miner_manager):
+        self.miner_manager = miner_manager
+
+    def __getitem__(self, uid):
+        if not isinstance(uid, int) or not 0 <= uid < self.miner_manager.n:
+            raise KeyError(uid)
+        return self.miner_manager.uid_info(uid)
+
+    def __iter__(self):
+        return iter(range(self.miner_manager.n))
+
+    def __len__(self):
+        return self.miner_manager.n
+
+    def to_dict(self) -> dict:
+        return {uid: self[uid] for uid in self}
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
 
 class MinerManager:
-    def __init__(self, validator):
+    """
+    Columnar miner state indexed by uid.
+    - scores / process_times: ring buffers of the last 10 rewards / 500 process times.
+    - model_ids, rate_limit, reward_scale, total_volume: one value per uid.
+    `all_uids_info` exposes the legacy dict-of-dicts API as a view.
+    Mutations are recorded as deltas to `journal` (a StateJournal) when one is set.
+    Miner identities are probed incrementally: `identity_cache` keeps each uid's
+    `Information` response keyed by (hotkey, ip, port) until its TTL expires.
+    """
+
+    def __init__(self, validator, identity_ttl=1800, identity_negative_ttl=600):
         self.validator = validator
         self.all_uids = [int(uid.item()) for uid in self.validator.metagraph.uids]
-        self.all_uids_info = {
-            uid: {"scores": [], "model_name": "", "process_time": []}
-            for uid in self.all_uids
-        }
+        self.lock = Lock()
+        self.model_names = [""]
+        self.model_name_to_id = {"": 0}
+        self.n = 0
+        self._allocate(len(self.all_uids))
         self.layer_one_axons = {}
+        self.journal = None
+        self.identity_ttl = identity_ttl
+        self.identity_negative_ttl = identity_negative_ttl
+        self.identity_cache = {}
+        self.miners_info = {}
+        self.identity_loop = asyncio.new_event_loop()
+        self.refresh_thread = None
+        self.volume_table = {}
+        self.volume_table_block = None
+
+    def _record(self, op: str, payload):
+        if self.journal is not None:
+            self.journal.append(op, payload)
+
+    def replay(self, records):
+        """Apply `(op, payload)` records read back from the state journal."""
+        with self.lock:
+            for op, payload in records:
+                if op == "scores":
+                    for uid, score in zip(*payload):
+                        self._ensure_capacity(uid)
+                        self._append_score(uid, score)
+                elif op == "process_times":
+                    for uid, ptime in zip(*payload):
+                        self._ensure_capacity(uid)
+                        self._append_process_time(uid, ptime)
+                elif op == "identity":
+                    self._set_identity(*payload)
+                elif op == "reset_metadata":
+                    self.process_time_counts[:] = 0
+
+    def _allocate(self, n):
+        def grow(name, *shape, dtype=torch.float64):
+            new_tensor = torch.zeros((n, *shape), dtype=dtype)
+            tensor = getattr(self, name, None)
+            if tensor is not None:
+                new_tensor[: tensor.shape[0]] = tensor
+            setattr(self, name, new_tensor)
+
+        grow("scores", NUM_SCORES_TO_KEEP)
+        grow("score_counts", dtype=torch.long)
+        grow("process_times", NUM_PROCESS_TIMES_TO_KEEP)
+        grow("process_time_counts", dtype=torch.long)
+        grow("model_ids", dtype=torch.long)
+        grow("rate_limit")
+        grow("reward_scale")
+        grow("total_volume")
+        grow("has_identity", dtype=torch.bool)
+        self.extra_info = getattr(self, "extra_info", []) + [
+            {} for _ in range(n - self.n)
+        ]
+        self.n = n
+
+    def _ensure_capacity(self, uid):
+        if uid >= self.n:
+            self._allocate(uid + 1)
+
+    def get_model_id(self, model_name: str) -> int:
+        if model_name not in self.model_name_to_id:
+            self.model_name_to_id[model_name] = len(self.model_names)
+            self.model_names.append(model_name)
+        return self.model_name_to_id[model_name]
 
-    def get_miner_info(self, only_layer_one=False):
+    def get_model_name(self, uid: int) -> str:
+        return self.model_names[int(self.model_ids[uid])]
+
+    @staticmethod
+    def _ordered(ring: torch.Tensor, count: int) -> list:
+        size = ring.shape[0]
+        if count <= size:
+            return ring[:count].tolist()
+        start = count % size
+        return torch.cat([ring[start:], ring[:start]]).tolist()
+
+    def get_scores(self, uid: int) -> list:
+        if uid >= self.n:
+            return []
+        return self._ordered(self.scores[uid], int(self.score_counts[uid]))
+
+    def uid_info(self, uid: int) -> dict:
+        info = {
+            "scores": self.get_scores(uid),
+            "model_name": self.get_model_name(uid),
+            "process_time": self._ordered(
+                self.process_times[uid], int(self.process_time_counts[uid])
+            ),
+        }
+        if self.has_identity[uid]:
+            info["total_volume"] = self.total_volume[uid].item()
+            info["reward_scale"] = self.reward_scale[uid].item()
+            info["rate_limit"] = self.rate_limit[uid].item()
+            info.update(self.extra_info[uid])
+        return info
+
+    @property
+    def all_uids_info(self) -> MinerInfoView:
+        return MinerInfoView(self)
+
+    @all_uids_info.setter
+    def all_uids_info(self, all_uids_info: dict):
+        """Load the columns from a legacy dict-of-dicts state."""
+        with self.lock:
+            for uid, info in all_uids_info.items():
+                if not isinstance(uid, int):
+                    continue
+                self._ensure_capacity(uid)
+                self.model_ids[uid] = self.get_model_id(info.get("model_name", ""))
+                self._reset_history(uid)
+                for score in info.get("scores", [])[-NUM_SCORES_TO_KEEP:]:
+                    self._append_score(uid, score)
+                for ptime in info.get("process_time", [])[-NUM_PROCESS_TIMES_TO_KEEP:]:
+                    self._append_process_time(uid, ptime)
+                if "rate_limit" in info:
+                    self.has_identity[uid] = True
+                    self.total_volume[uid] = info.get("total_volume", 40)
+                    self.reward_scale[uid] = info.get("reward_scale", 0)
+                    self.rate_limit[uid] = info["rate_limit"]
+                    self.extra_info[uid] = {
+                        "min_stake": info.get("min_stake", 10000),
+                        "device_info": info.get("device_info", {}),
+                    }
+
+    def _reset_history(self, uid):
+        self.scores[uid] = 0
+        self.score_counts[uid] = 0
+        self.process_time_counts[uid] = 0
+
+    def _append_score(self, uid, score):
+        count = int(self.score_counts[uid])
+        self.scores[uid, count % NUM_SCORES_TO_KEEP] = score
+        self.score_counts[uid] = count + 1
+
+    def _append_process_time(self, uid, ptime):
+        count = int(self.process_time_counts[uid])
+        self.process_times[uid, count % NUM_PROCESS_TIMES_TO_KEEP] = ptime
+        self.process_time_counts[uid] = count + 1
+
+    def _identity_key(self, axon) -> tuple:
+        return (axon.hotkey, axon.ip, axon.port)
+
+    async def probe_miner_info(self, axons: dict, layer: str) -> dict:
         """
-        1. Query model_name of available uids
+        Send `Information` only to axons whose cache entry is missing, expired or
+        whose (hotkey, ip, port) changed, and return the cached info of all axons.
         """
-        if only_layer_one:
-            uids = self.layer_one_axons.keys()
-            query_axons = [self.layer_one_axons[uid] for uid in uids]
-        else:
-            uids = [int(uid) for uid in self.validator.metagraph.uids]
-            query_axons = [self.validator.metagraph.axons[uid] for uid in uids]
-        synapse = Information()
-        bt.logging.info("Requesting miner info using synapse Information")
-        responses = self.validator.dendrite.query(
-            query_axons,
-            synapse,
-            deserialize=False,
-            timeout=10,
+        now = time.time()
+        to_probe = {}
+        for uid, axon in axons.items():
+            entry = self.identity_cache.get((layer, uid))
+            if (
+                entry is None
+                or entry["key"] != self._identity_key(axon)
+                or entry["expires_at"] < now
+            ):
+                to_probe[uid] = axon
+        bt.logging.info(
+            f"Requesting {layer} miner info from {len(to_probe)}/{len(axons)} uids"
         )
+        if to_probe:
+            dendrite = self.validator.connection_pool.get_dendrite()
+            responses = await dendrite.forward(
+                list(to_probe.values()),
+                Information(),
+                deserialize=False,
+                timeout=10,
+            )
+            now = time.time()
+            for (uid, axon), response in zip(to_probe.items(), responses):
+                info = response.response_dict
+                ttl = self.identity_ttl if info else self.identity_negative_ttl
+                self.identity_cache[(layer, uid)] = {
+                    "key": self._identity_key(axon),
+                    "expires_at": now + ttl,
+                    "info": info,
+                }
         responses = {
-            uid: response.response_dict for uid, response in zip(uids, responses)
+            uid: self.identity_cache[(layer, uid)]["info"] for uid in axons
         }
-        if only_layer_one:
-            bt.logging.debug(f"Some layer one miners: {list(responses.items())[:5]}")
-        responses = {k: v for k, v in responses.items() if v}
-        return responses
+        return {k: v for k, v in responses.items() if v}
+
+    async def _refresh_miners_info(self):
+        metagraph = self.validator.metagraph
+        axons = {
+            int(uid): metagraph.axons[uid]
+            for uid in metagraph.uids.tolist()
+            if metagraph.axons[uid].is_serving
+        }
+        valid_miners_info = await self.probe_miner_info(axons, "layer_zero")
+        self.update_layer_zero(valid_miners_info)
+        layer_one_valid_miners_info = await self.probe_miner_info(
+            dict(self.layer_one_axons), "layer_one"
+        )
+        bt.logging.debug(
+            f"Some layer one miners: {list(layer_one_valid_miners_info.items())[:5]}"
+        )
+        valid_miners_info.update(layer_one_valid_miners_info)
+        self.miners_info = valid_miners_info
+
+    def refresh_miners_info(self):
+        try:
+            self.identity_loop.run_until_complete(self._refresh_miners_info())
+        except Exception as e:
+            bt.logging.error(f"Failed to refresh miner info: {e}")
 
     def update_layer_zero(self, responses: dict):
         for uid, info in responses.items():
@@ -49,7 +270,9 @@ class MinerManager:
             is_layer_one = info.get("is_layer_one", False)
             if is_layer_zero:
                 bt.logging.info(f"Layer zero: {uid}")
-                axon = self.validator.metagraph.axons[uid]
+                # A copy: the metagraph axon keeps the address the chain reported,
+                # which keys the layer zero identity cache entry of this uid.
+                axon = copy.copy(self.validator.metagraph.axons[uid])
                 axon.ip = info["layer_one"]["ip"]
                 axon.port = info["layer_one"]["port"]
                 self.layer_one_axons[uid] = axon
@@ -57,90 +280,117 @@ class MinerManager:
                 self.layer_one_axons.pop(uid)
         bt.logging.success("Updated layer zero")
 
-    def update_miners_identity(self):
-        """
-        1. Query model_name of available uids
-        2. Update the available list
-        """
-        valid_miners_info = self.get_miner_info()
-        self.update_layer_zero(valid_miners_info)
-        layer_one_valid_miners_info = self.get_miner_info(only_layer_one=True)
-        valid_miners_info.update(layer_one_valid_miners_info)
-
-        if not valid_miners_info:
-            bt.logging.warning("No active miner available. Skipping setting weights.")
-        for uid, info in valid_miners_info.items():
-            miner_state = self.all_uids_info.setdefault(
-                uid,
-                {"scores": [], "model_name": "", "process_time": []},
-            )
-            model_name = info.get("model_name", "")
-            miner_state["total_volume"] = info.get("total_volume", 40)
-            miner_state["min_stake"] = info.get("min_stake", 10000)
-            miner_state["reward_scale"] = max(
-                min(miner_state["total_volume"] ** 0.5 / 1000**0.5, 1), 0
-            )
-            miner_state["device_info"] = info.get("device_info", {})
-
+    def get_rate_limit(self, total_volume) -> float:
+        """This validator's share of `total_volume`, memoized per metagraph block."""
+        block = int(self.validator.metagraph.block)
+        if block != self.volume_table_block:
+            self.volume_table = {}
+            self.volume_table_block = block
+        if total_volume not in self.volume_table:
             volume_per_validator = get_volume_per_validator(
                 self.validator.metagraph,
-                miner_state["total_volume"],
+                total_volume,
                 1.03,
                 10000,
                 False,
             )
-            miner_state["rate_limit"] = volume_per_validator.get(self.validator.uid, 2)
-            bt.logging.info(f"Rate limit for {uid}: {miner_state['rate_limit']}")
-            if miner_state["model_name"] == model_name:
-                continue
-            miner_state["model_name"] = model_name
-            miner_state["scores"] = []
-            miner_state["process_time"] = []
+            self.volume_table[total_volume] = volume_per_validator.get(
+                self.validator.uid, 2
+            )
+        return self.volume_table[total_volume]
+
+    def update_miners_identity(self):
+        """
+        1. Take the miner info of the last refresh (refresh now on the first call)
+        2. Update the identity of uids whose info changed
+        3. Start the next refresh in the background
+        """
+        if self.refresh_thread is None:
+            self.refresh_miners_info()
+        else:
+            self.refresh_thread.join()
+        valid_miners_info = self.miners_info
+
+        if not valid_miners_info:
+            bt.logging.warning("No active miner available. Skipping setting weights.")
+        with self.lock:
+            for uid, info in valid_miners_info.items():
+                uid = int(uid)
+                total_volume = info.get("total_volume", 40)
+                identity = {
+                    "model_name": info.get("model_name", ""),
+                    "total_volume": total_volume,
+                    "rate_limit": self.get_rate_limit(total_volume),
+                    "min_stake": info.get("min_stake", 10000),
+                    "device_info": info.get("device_info", {}),
+                }
+                if uid < self.n and self.has_identity[uid]:
+                    current = self.uid_info(uid)
+                    if all(current[k] == v for k, v in identity.items()):
+                        continue
+                self._set_identity(uid, identity)
+                self._record("identity", [uid, identity])
+                bt.logging.info(f"Rate limit for {uid}: {self.rate_limit[uid].item()}")
 
         bt.logging.success("Updated miner identity")
-        model_distribution = {}
-        for uid, info in self.all_uids_info.items():
-            model_distribution[info["model_name"]] = (
-                model_distribution.get(info["model_name"], 0) + 1
-            )
-        # Remove all key type is str, keep only int from all_uids_info
-        self.all_uids_info = {
-            int(k): v for k, v in self.all_uids_info.items() if isinstance(k, int)
+        model_counts = torch.bincount(self.model_ids, minlength=len(self.model_names))
+        model_distribution = {
+            model_name: int(count)
+            for model_name, count in zip(self.model_names, model_counts)
+            if count
         }
         bt.logging.info(f"Model distribution: {model_distribution}")
         thread = Thread(target=self.store_miner_info, daemon=True)
         thread.start()
+        self.refresh_thread = Thread(target=self.refresh_miners_info, daemon=True)
+        self.refresh_thread.start()
+
+    def _set_identity(self, uid: int, identity: dict):
+        self._ensure_capacity(uid)
+        total_volume = identity["total_volume"]
+        self.has_identity[uid] = True
+        self.total_volume[uid] = total_volume
+        self.reward_scale[uid] = max(min(total_volume**0.5 / 1000**0.5, 1), 0)
+        self.rate_limit[uid] = identity["rate_limit"]
+        self.extra_info[uid] = {
+            "min_stake": identity["min_stake"],
+            "device_info": identity["device_info"],
+        }
+        model_name = identity["model_name"]
+        if self.get_model_name(uid) != model_name:
+            self.model_ids[uid] = self.get_model_id(model_name)
+            self._reset_history(uid)
+
+    def get_model_mask(self, model_name: str) -> torch.Tensor:
+        model_id = self.model_name_to_id.get(model_name)
+        if model_id is None:
+            return torch.zeros(self.n, dtype=torch.bool)
+        return self.model_ids == model_id
 
     def get_miner_uids(self, model_name: str):
-        available_uids = [
-            int(uid)
-            for uid in self.all_uids_info.keys()
-            if self.all_uids_info[uid]["model_name"] == model_name
-        ]
-        return available_uids
+        return self.get_model_mask(model_name).nonzero().flatten().tolist()
 
     def update_scores(self, uids, rewards):
-        for uid, reward in zip(uids, rewards):
-            self.all_uids_info[uid]["scores"].append(reward)
-            self.all_uids_info[uid]["scores"] = self.all_uids_info[uid]["scores"][-10:]
+        uids = [int(uid) for uid in uids]
+        rewards = [float(reward) for reward in rewards]
+        with self.lock:
+            for uid, reward in zip(uids, rewards):
+                self._append_score(uid, reward)
+            self._record("scores", [uids, rewards])
 
     def update_metadata(self, uids, process_times):
-        for uid, ptime in zip(uids, process_times):
-            if "process_time" not in self.all_uids_info[uid]:
-                self.all_uids_info[uid]["process_time"] = []
-            self.all_uids_info[uid]["process_time"].append(ptime)
-            self.all_uids_info[uid]["process_time"] = self.all_uids_info[uid][
-                "process_time"
-            ][-500:]
+        uids = [int(uid) for uid in uids]
+        process_times = [float(ptime) for ptime in process_times]
+        with self.lock:
+            for uid, ptime in zip(uids, process_times):
+                self._append_process_time(uid, ptime)
+            self._record("process_times", [uids, process_times])
 
     def get_model_specific_weights(self, model_name, normalize=True):
         model_specific_weights = torch.zeros(len(self.all_uids))
-        for uid in self.get_miner_uids(model_name):
-            num_past_to_check = 10
-            model_specific_weights[int(uid)] = (
-                sum(self.all_uids_info[uid]["scores"][-num_past_to_check:])
-                / num_past_to_check
-            )
+        mask = self.get_model_mask(model_name)[: len(self.all_uids)]
+        mean_scores = self.scores[: len(self.all_uids)].sum(dim=1) / NUM_SCORES_TO_KEEP
+        model_specific_weights[mask] = mean_scores[mask].float()
         model_specific_weights = torch.clamp(model_specific_weights, 0, 1)
         if normalize:
             tensor_sum = torch.sum(model_specific_weights)
@@ -149,6 +399,34 @@ class MinerManager:
                 model_specific_weights = model_specific_weights / tensor_sum
         return model_specific_weights
 
+    def get_mean_score(self, uid: int) -> float:
+        if uid >= self.n:
+            return 0.0
+        return float(self.scores[uid].sum() / NUM_SCORES_TO_KEEP)
+
+    def get_mean_process_time(self, uid: int):
+        """Mean of the recent successful process times of `uid`, or None."""
+        if uid >= self.n:
+            return None
+        count = min(int(self.process_time_counts[uid]), NUM_PROCESS_TIMES_TO_KEEP)
+        process_times = self.process_times[uid, :count]
+        process_times = process_times[process_times >= 0]
+        if not len(process_times):
+            return None
+        return float(process_times.mean())
+
+    def get_score_matrix(self, model_names: list[str]) -> torch.Tensor:
+        """[models x uids] clamped mean scores, zero for uids serving another model."""
+        n = len(self.all_uids)
+        model_ids = torch.tensor(
+            [self.model_name_to_id.get(model_name, -1) for model_name in model_names],
+            dtype=torch.long,
+        )
+        masks = self.model_ids[:n].unsqueeze(0) == model_ids.unsqueeze(1)
+        mean_scores = self.scores[:n].sum(dim=1) / NUM_SCORES_TO_KEEP
+        score_matrix = mean_scores.float().unsqueeze(0) * masks
+        return torch.clamp(score_matrix, 0, 1)
+
     def store_miner_info(self):
         try:
             catalogue = {}
@@ -157,11 +435,11 @@ class MinerManager:
                     "model_incentive_weight": v.get("model_incentive_weight", 0),
                     "supporting_pipelines": v.get("supporting_pipelines", []),
                 }
-            requests.post(
+            self.validator.connection_pool.post(
                 self.validator.config.storage_url + "/store_miner_info",
                 json={
                     "uid": self.validator.uid,
-                    "info": self.all_uids_info,
+                    "info": self.all_uids_info.to_dict(),
                     "version": ig_subnet.__version__,
                     "catalogue": catalogue,
                 },
@@ -171,5 +449,6 @@ class MinerManager:
             bt.logging.error(f"Failed to store miner info: {e}")
 
     def reset_metadata(self):
-        for uid in self.all_uids_info:
-            self.all_uids_info[uid]["process_time"] = []
+        with self.lock:
+            self.process_time_counts[:] = 0
+            self._record("reset_metadata", None)
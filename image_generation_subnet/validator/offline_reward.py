@@ -38,10 +38,10 @@ PROCESSOR = None
 moderation_model = None
 
 
-def fetch_GoJourney(task_id):
+def fetch_GoJourney(task_id, timeout=30):
     endpoint = "https://api.midjourneyapi.xyz/mj/v2/fetch"
     data = {"task_id": task_id}
-    response = requests.post(endpoint, json=data)
+    response = requests.post(endpoint, json=data, timeout=timeout)
     return response.json()
 
 
@@ -1,11 +1,31 @@
+import bisect
 import json
 import os
+import threading
 from datetime import date
 import bittensor as bt
 
+LATENCY_BUCKETS = [0.5, 1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+
 class ProxyCounter:
-    def __init__(self, save_path):
+    """
+    Daily organic request counters: totals plus per-model success/fail counts
+    and latency histograms (upper bounds in LATENCY_BUCKETS seconds, "inf" last).
+
+    `update` only touches memory. A background thread writes the file with an
+    atomic rename every `flush_interval` seconds, or sooner once `flush_every`
+    updates are pending.
+    """
+
+    def __init__(self, save_path, flush_interval: float = 30, flush_every: int = 100):
         self.save_path = save_path
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.pending = 0
+        self.flush_event = threading.Event()
         if os.path.exists(save_path):
             try:
                 self.proxy_logs = json.load(open(save_path))
@@ -14,14 +34,54 @@ class ProxyCounter:
                 self.proxy_logs = {}
         else:
             self.proxy_logs = {}
+        threading.Thread(target=self.flush_loop, daemon=True).start()
 
-    def update(self, is_success):
+    def update(self, is_success, model_name: str = None, latency: float = None):
+        key = "success" if is_success else "fail"
         today = str(date.today())
-        self.proxy_logs.setdefault(today, {"success": 0, "fail": 0})
-        if is_success:
-            self.proxy_logs[today]["success"] += 1
-        else:
-            self.proxy_logs[today]["fail"] += 1
+        with self.lock:
+            day = self.proxy_logs.setdefault(today, {"success": 0, "fail": 0})
+            day[key] += 1
+            if model_name is not None:
+                model = day.setdefault("models", {}).setdefault(
+                    model_name,
+                    {
+                        "success": 0,
+                        "fail": 0,
+                        "latency_histogram": {
+                            str(bound): 0 for bound in LATENCY_BUCKETS + ["inf"]
+                        },
+                    },
+                )
+                model[key] += 1
+                if latency is not None:
+                    index = bisect.bisect_left(LATENCY_BUCKETS, latency)
+                    bound = (
+                        LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else "inf"
+                    )
+                    model["latency_histogram"][str(bound)] += 1
+            self.pending += 1
+            if self.pending >= self.flush_every:
+                self.flush_event.set()
 
     def save(self):
-        json.dump(self.proxy_logs, open(self.save_path, "w"))
+        """Write the counters now, replacing the file atomically."""
+        with self.lock:
+            if not self.pending and os.path.exists(self.save_path):
+                return
+            data = json.dumps(self.proxy_logs)
+            self.pending = 0
+        with self.save_lock:
+            tmp_path = self.save_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, self.save_path)
+
+    def flush_loop(self):
+        while True:
+            self.flush_event.wait(timeout=self.flush_interval)
+            self.flush_event.clear()
+            try:
+                self.save()
+            except Exception as e:
+                bt.logging.error(f"Error saving proxy logs: {e}")
@@ -0,0 +1,65 @@
+import base64
+import threading
+from collections import OrderedDict
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+
+class CredentialVerifier:
+    """
+    Checks a proxy client's Ed25519 public key against the message/signature
+    handed out by the proxy client service. Keys that verified are cached by
+    their raw bytes (LRU, `max_size` entries) until `set_credentials` installs
+    a new signature, so repeated requests skip the signature check.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.verified = OrderedDict()
+        self.message = None
+        self.signature = None
+        self.generation = 0
+        self.stats = {"hits": 0, "verifications": 0, "failures": 0}
+
+    def set_credentials(self, message: bytes, signature: bytes):
+        with self.lock:
+            self.message = message
+            self.signature = signature
+            self.verified.clear()
+            self.generation += 1
+
+    def verify(self, public_key_bytes: bytes) -> bool:
+        with self.lock:
+            if public_key_bytes in self.verified:
+                self.verified.move_to_end(public_key_bytes)
+                self.stats["hits"] += 1
+                return True
+            message, signature, generation = (
+                self.message,
+                self.signature,
+                self.generation,
+            )
+        self.stats["verifications"] += 1
+        try:
+            public_key = Ed25519PublicKey.from_public_bytes(public_key_bytes)
+            public_key.verify(signature, message)
+        except (InvalidSignature, ValueError, TypeError):
+            self.stats["failures"] += 1
+            return False
+        with self.lock:
+            # Credentials may have been refreshed while verifying without the lock.
+            if generation == self.generation:
+                self.verified[public_key_bytes] = True
+                while len(self.verified) > self.max_size:
+                    self.verified.popitem(last=False)
+        return True
+
+    def verify_token(self, token: str) -> bool:
+        """Verify a base64 encoded public key, as sent by proxy clients."""
+        try:
+            public_key_bytes = base64.b64decode(token)
+        except ValueError:
+            self.stats["failures"] += 1
+            return False
+        return self.verify(public_key_bytes)
@@ -0,0 +1,123 @@
+import random
+from collections import defaultdict
+from threading import Lock
+from typing import Callable, Optional
+
+
+class SelectionPolicy:
+    """
+    Picks the miner an organic request goes to among the uids that still have
+    rate-limit credit. `on_start` / `on_finish` let policies track in-flight
+    requests and observed latency.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.outstanding = defaultdict(int)
+
+    def select(self, uids: list[int]) -> int:
+        raise NotImplementedError
+
+    def on_start(self, uid: int):
+        with self.lock:
+            self.outstanding[uid] += 1
+
+    def on_finish(self, uid: int, latency: float = None, success: bool = None):
+        """`latency=None` means the request was cancelled and nothing was observed."""
+        with self.lock:
+            self.outstanding[uid] = max(self.outstanding[uid] - 1, 0)
+
+
+class RandomSelection(SelectionPolicy):
+    def select(self, uids: list[int]) -> int:
+        return random.choice(uids)
+
+
+class LeastOutstandingSelection(SelectionPolicy):
+    """Send to the miner with the fewest in-flight requests, ties broken at random."""
+
+    def select(self, uids: list[int]) -> int:
+        with self.lock:
+            least = min(self.outstanding[uid] for uid in uids)
+            return random.choice(
+                [uid for uid in uids if self.outstanding[uid] == least]
+            )
+
+
+class PowerOfTwoSelection(SelectionPolicy):
+    """
+    Power-of-two-choices: sample two candidates and keep the cheaper one, with
+    cost = EWMA latency * (1 + in-flight requests) / (0.1 + recent score).
+
+    Failures are observed as `failure_latency`, so dead miners sink quickly.
+    Uids without an EWMA yet start from `latency_fn(uid)` (e.g. the mean of the
+    process times MinerManager keeps) or, failing that, the median EWMA.
+    """
+
+    def __init__(
+        self,
+        failure_latency: float,
+        score_fn: Callable[[int], float] = None,
+        latency_fn: Callable[[int], Optional[float]] = None,
+        alpha: float = 0.3,
+    ):
+        super().__init__()
+        self.failure_latency = failure_latency
+        self.score_fn = score_fn
+        self.latency_fn = latency_fn
+        self.alpha = alpha
+        self.latencies = {}
+
+    def _latency(self, uid: int) -> float:
+        if uid not in self.latencies and self.latency_fn is not None:
+            latency = self.latency_fn(uid)
+            if latency is not None:
+                self.latencies[uid] = latency
+        if uid in self.latencies:
+            return self.latencies[uid]
+        if not self.latencies:
+            return 0.0
+        known = sorted(self.latencies.values())
+        return known[len(known) // 2]
+
+    def cost(self, uid: int) -> float:
+        score = self.score_fn(uid) if self.score_fn is not None else 1.0
+        return self._latency(uid) * (1 + self.outstanding[uid]) / (0.1 + score)
+
+    def select(self, uids: list[int]) -> int:
+        if len(uids) == 1:
+            return uids[0]
+        first, second = random.sample(uids, 2)
+        with self.lock:
+            return first if self.cost(first) <= self.cost(second) else second
+
+    def on_finish(self, uid: int, latency: float = None, success: bool = None):
+        super().on_finish(uid, latency, success)
+        if latency is None:
+            return
+        sample = latency if success else max(latency, self.failure_latency)
+        with self.lock:
+            previous = self.latencies.get(uid)
+            self.latencies[uid] = (
+                sample
+                if previous is None
+                else self.alpha * sample + (1 - self.alpha) * previous
+            )
+
+
+SELECTION_POLICIES = {
+    "random": RandomSelection,
+    "least_outstanding": LeastOutstandingSelection,
+    "p2c": PowerOfTwoSelection,
+}
+
+
+def build_selection_policy(
+    name: str, failure_latency: float, score_fn=None, latency_fn=None
+) -> Optional[SelectionPolicy]:
+    """Return the policy called `name`, or None for the plain proxy queue order."""
+    if name == "queue":
+        return None
+    if name == "p2c":
+        return PowerOfTwoSelection(failure_latency, score_fn, latency_fn)
+    return SELECTION_POLICIES[name]()
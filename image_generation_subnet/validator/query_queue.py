@@ -0,0 +1,205 @@
+import math
+import random
+import threading
+import bittensor as bt
+
+
+class CreditQueue:
+    """
+    Weighted deficit round-robin over the uids serving one model.
+
+    Instead of materializing one item per rate-limit slot, every uid keeps its
+    remaining credit. Each round visits the active uids in random order and
+    adds a quantum of `credit / max_credit` to their deficit; a uid is served
+    whenever its deficit reaches 1. High-volume miners are therefore spread
+    evenly across the loop while memory stays O(number of uids).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset([], [])
+
+    def reset(self, uids: list[int], credits: list[int]):
+        with self.lock:
+            self.uids = []
+            self.credits = []
+            for uid, credit in zip(uids, credits):
+                if credit > 0:
+                    self.uids.append(uid)
+                    self.credits.append(int(credit))
+            self.positions = {uid: i for i, uid in enumerate(self.uids)}
+            max_credit = max(self.credits, default=1)
+            self.quantums = [credit / max_credit for credit in self.credits]
+            self.deficits = [0.0] * len(self.uids)
+            self.order = list(range(len(self.uids)))
+            self.cursor = len(self.order)
+            self.remaining = sum(self.credits)
+
+    def _new_round(self):
+        self.order = [i for i in self.order if self.credits[i] > 0]
+        random.shuffle(self.order)
+        for i in self.order:
+            self.deficits[i] += self.quantums[i]
+        self.cursor = 0
+
+    def get(self):
+        """Return the next uid to query, or None if all credits are spent."""
+        with self.lock:
+            while self.remaining > 0:
+                if self.cursor >= len(self.order):
+                    self._new_round()
+                i = self.order[self.cursor]
+                self.cursor += 1
+                if self.credits[i] > 0 and self.deficits[i] >= 1 - 1e-9:
+                    self.deficits[i] -= 1
+                    self.credits[i] -= 1
+                    self.remaining -= 1
+                    return self.uids[i]
+            return None
+
+    def snapshot(self) -> tuple[list[int], list[int]]:
+        """Uids and their remaining credits."""
+        with self.lock:
+            return list(self.uids), list(self.credits)
+
+    def available(self) -> list[int]:
+        """Uids that still have credit."""
+        with self.lock:
+            return [uid for uid, credit in zip(self.uids, self.credits) if credit > 0]
+
+    def take(self, uid: int) -> bool:
+        """Spend one credit of `uid` outside of the round-robin order."""
+        with self.lock:
+            i = self.positions.get(uid)
+            if i is None or self.credits[i] <= 0:
+                return False
+            self.credits[i] -= 1
+            self.remaining -= 1
+            return True
+
+    def empty(self) -> bool:
+        return self.remaining == 0
+
+    def qsize(self) -> int:
+        return self.remaining
+
+
+class QueryQueue:
+    def __init__(self, model_names: list[str], time_per_loop: int = 600):
+        self.synthentic_queue: dict[str, CreditQueue] = {
+            model_name: CreditQueue() for model_name in model_names
+        }
+        self.proxy_queue: dict[str, CreditQueue] = {
+            model_name: CreditQueue() for model_name in model_names
+        }
+        self.synthentic_rewarded = set()
+        self.time_per_loop = time_per_loop
+        self.total_uids_remaining = 0
+
+    def update_queue(self, all_uids_info):
+        self.total_uids_remaining = 0
+        self.synthentic_rewarded = set()
+        model_credits = {}
+        for uid, info in all_uids_info.items():
+            if not info["model_name"]:
+                continue
+            synthetic_rate_limit, proxy_rate_limit = self.get_rate_limit_by_type(
+                info["rate_limit"]
+            )
+            uids, synthetic_credits, proxy_credits = model_credits.setdefault(
+                info["model_name"], ([], [], [])
+            )
+            uids.append(uid)
+            synthetic_credits.append(int(synthetic_rate_limit))
+            proxy_credits.append(int(proxy_rate_limit))
+        for model_name in set(self.synthentic_queue) | set(model_credits):
+            uids, synthetic_credits, proxy_credits = model_credits.get(
+                model_name, ([], [], [])
+            )
+            self.synthentic_queue.setdefault(model_name, CreditQueue()).reset(
+                uids, synthetic_credits
+            )
+            self.proxy_queue.setdefault(model_name, CreditQueue()).reset(
+                uids, proxy_credits
+            )
+        for model_name, q in self.synthentic_queue.items():
+            self.total_uids_remaining += q.qsize()
+            bt.logging.info(
+                f"- Model {model_name} has {q.qsize()} uids remaining for synthentic"
+            )
+        for model_name, q in self.proxy_queue.items():
+            bt.logging.info(
+                f"- Model {model_name} has {q.qsize()} uids remaining for organic"
+            )
+
+    def get_batch_query(self, batch_size: int):
+        if not self.total_uids_remaining:
+            return
+        more_data = True
+        while more_data:
+            more_data = False
+            for model_name, q in self.synthentic_queue.items():
+                if q.empty():
+                    continue
+                time_to_sleep = self.time_per_loop * (
+                    min(batch_size / (self.total_uids_remaining + 1), 1)
+                )
+                uids_to_query = []
+                should_rewards = []
+
+                while len(uids_to_query) < batch_size:
+                    uid = q.get()
+                    if uid is None:
+                        break
+                    more_data = True
+                    uids_to_query.append(uid)
+                    if uid in self.synthentic_rewarded:
+                        should_rewards.append(False)
+                    else:
+                        should_rewards.append(True)
+                        self.synthentic_rewarded.add(uid)
+
+                if uids_to_query:
+                    yield model_name, uids_to_query, should_rewards, time_to_sleep
+
+    def pending_models(self) -> list[str]:
+        return [
+            model_name
+            for model_name, q in self.synthentic_queue.items()
+            if not q.empty()
+        ]
+
+    def remaining_batches(self, batch_size: int) -> int:
+        return sum(
+            math.ceil(q.qsize() / batch_size) for q in self.synthentic_queue.values()
+        )
+
+    def get_query_for_proxy(self, model_name, policy=None):
+        """
+        Yield `(uid, should_reward)` candidates for an organic request, spending
+        synthetic credits first. With a selection `policy`, each candidate is
+        chosen by the policy among the uids that still have credit.
+        """
+        synthentic_q = self.synthentic_queue[model_name]
+        proxy_q = self.proxy_queue[model_name]
+        for q, rewardable in [(synthentic_q, True), (proxy_q, False)]:
+            while (uid := self._next_for_proxy(q, policy)) is not None:
+                yield uid, rewardable and uid not in self.synthentic_rewarded
+
+    @staticmethod
+    def _next_for_proxy(q: CreditQueue, policy=None):
+        if policy is None:
+            return q.get()
+        while uids := q.available():
+            uid = policy.select(uids)
+            if q.take(uid):
+                return uid
+        return None
+
+    def get_rate_limit_by_type(self, rate_limit):
+        synthentic_rate_limit = max(1, int(math.floor(rate_limit * 0.8)) - 1)
+        synthentic_rate_limit = max(
+            rate_limit - synthentic_rate_limit, synthentic_rate_limit
+        )
+        proxy_rate_limit = rate_limit - synthentic_rate_limit
+        return synthentic_rate_limit, proxy_rate_limit
@@ -0,0 +1,111 @@
+import asyncio
+import copy
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Awaitable, Callable
+import bittensor as bt
+
+
+def request_key(synapse: bt.Synapse) -> str:
+    """
+    Canonical hash of a synapse input: same model, prompt, seed and params give the same key.
+
+    `deserialize_input` of some synapses rewrites `pipeline_params` in place (logprobs of
+    MultiModalGenerating), so it runs on a copy: the synapse sent to miners stays as is.
+    TextGenerating's leaves out the seed, so model name and seed are added explicitly.
+    """
+    data = {
+        "input": copy.deepcopy(synapse).deserialize_input(),
+        "model_name": getattr(synapse, "model_name", None),
+        "seed": getattr(synapse, "seed", None),
+    }
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Bounded LRU cache whose entries expire `ttl` seconds after they were stored."""
+
+    def __init__(self, max_size: int = 64, ttl: float = 600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.time():
+                del self.entries[key]
+                self.stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def put(self, key: str, value):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.time() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+
+class RequestCoalescer:
+    """
+    Singleflight in front of a result cache: concurrent calls with the same key
+    share one in-flight call, and successful results are served from the cache
+    until they expire. A `None` result is never cached.
+
+    In-flight calls are shared within one event loop, which is the loop the
+    proxy server runs on.
+    """
+
+    def __init__(self, max_size: int = 64, ttl: float = 600):
+        self.cache = ResultCache(max_size, ttl)
+        self.in_flight: dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def run(self, key: str, fn: Callable[[], Awaitable]):
+        """Return `(result, source)` where source is "cache", "coalesced" or "call"."""
+        result = self.cache.get(key)
+        if result is not None:
+            return result, "cache"
+        task = self.in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            # Shielded so a client that disconnects does not cancel the others' call.
+            return await asyncio.shield(task), "coalesced"
+        task = asyncio.ensure_future(self._call(key, fn))
+        self.in_flight[key] = task
+        task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        return await asyncio.shield(task), "call"
+
+    async def _call(self, key: str, fn: Callable[[], Awaitable]):
+        result = await fn()
+        if result is not None:
+            self.cache.put(key, result)
+        return result
+
+    def summary(self) -> dict:
+        stats = dict(self.cache.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["coalesced"] = self.coalesced
+        stats["size"] = len(self.cache.entries)
+        stats["hit_ratio"] = round(
+            (stats["hits"] + self.coalesced) / max(lookups, 1), 3
+        )
+        return stats
+
+    def log_stats(self):
+        bt.logging.info(f"Proxy result cache stats: {self.summary()}")
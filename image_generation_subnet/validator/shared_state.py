@@ -0,0 +1,73 @@
+import struct
+import time
+from multiprocessing import shared_memory
+import msgpack
+
+HEADER = struct.Struct("<QQ")
+
+
+class SharedStatePublisher:
+    """
+    Single-writer snapshot in shared memory, guarded by a sequence lock.
+
+    The header holds a sequence number and the payload length. The sequence is
+    odd while a write is in progress; readers copy the payload and retry if the
+    sequence changed meanwhile, so neither side ever takes a lock.
+    """
+
+    def __init__(self, name: str = None, size: int = 16 * 1024 * 1024):
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = self.shm.name
+        self.capacity = size - HEADER.size
+        self.seq = 0
+        HEADER.pack_into(self.shm.buf, 0, self.seq, 0)
+
+    def publish(self, state: dict):
+        data = msgpack.packb(state)
+        if len(data) > self.capacity:
+            raise ValueError(
+                f"Shared state of {len(data)} bytes exceeds capacity {self.capacity}"
+            )
+        buf = self.shm.buf
+        self.seq += 1
+        HEADER.pack_into(buf, 0, self.seq, 0)
+        buf[HEADER.size : HEADER.size + len(data)] = data
+        self.seq += 1
+        HEADER.pack_into(buf, 0, self.seq, len(data))
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SharedStateReader:
+    """Reads the latest snapshot written by a SharedStatePublisher in another process."""
+
+    def __init__(self, name: str):
+        # Readers are spawned by the publisher's process and share its resource
+        # tracker, so attaching does not hand the block's lifetime to the reader.
+        self.shm = shared_memory.SharedMemory(name=name)
+        self.seq = 0
+        self.state = None
+
+    def read(self, max_retries: int = 100):
+        """Return `(state, changed)`; the payload is only decoded when the sequence moved."""
+        buf = self.shm.buf
+        for _ in range(max_retries):
+            seq, length = HEADER.unpack_from(buf, 0)
+            if seq == self.seq:
+                return self.state, False
+            if seq % 2:
+                time.sleep(0.001)
+                continue
+            data = bytes(buf[HEADER.size : HEADER.size + length])
+            if HEADER.unpack_from(buf, 0)[0] != seq:
+                continue
+            self.seq = seq
+            if length:
+                self.state = msgpack.unpackb(data, strict_map_key=False)
+            return self.state, True
+        return self.state, False
+
+    def close(self):
+        self.shm.close()
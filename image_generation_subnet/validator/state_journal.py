@@ -0,0 +1,154 @@
+import os
+import time
+from threading import Lock
+import bittensor as bt
+import msgpack
+
+SNAPSHOT_FILE = "state_snapshot.msgpack"
+JOURNAL_FILE = "state_journal.msgpack"
+
+
+class StateJournal:
+    """
+    Crash-safe validator state on disk.
+    - state_snapshot.msgpack: full state as of sequence number `seq`, replaced
+      atomically (write tmp, fsync, rename).
+    - state_journal.msgpack: append-only stream of `[seq, op, payload]` deltas
+      recorded after the snapshot.
+
+    Startup loads the snapshot and replays the journal tail. Records already
+    covered by the snapshot are skipped, so a crash between the snapshot rename
+    and the journal truncation is harmless, and a torn last record is cut off.
+    A snapshot that cannot be read is moved aside with its journal and the state
+    starts empty, so new records are still written.
+    """
+
+    def __init__(self, directory: str, compact_size: int = 8 * 1024 * 1024):
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self.journal_path = os.path.join(directory, JOURNAL_FILE)
+        self.compact_size = compact_size
+        self.lock = Lock()
+        self.seq = 0
+        self.file = None
+        self.packer = msgpack.Packer()
+
+    def exists(self) -> bool:
+        """Whether a snapshot or journal is on disk, readable or not."""
+        return os.path.exists(self.snapshot_path) or os.path.exists(self.journal_path)
+
+    def load(self) -> tuple[dict, list]:
+        """
+        Returns the snapshot state (None if there is none) and the `(op, payload)`
+        records to replay on top of it, then opens the journal for appending.
+        """
+        try:
+            snapshot, records = self._read()
+        except Exception as e:
+            bt.logging.error(
+                f"Could not load validator state from {self.directory}, starting from an empty state: {e}"
+            )
+            self._move_aside()
+            snapshot, records = None, []
+            self.seq = 0
+        self.open()
+        return snapshot, records
+
+    def open(self):
+        """Open the journal for appending, if `load` did not."""
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.journal_path, "ab")
+
+    def _move_aside(self):
+        # The journal only holds deltas on top of the unreadable snapshot, keep both for inspection
+        suffix = f".corrupt-{int(time.time())}"
+        for path in (self.snapshot_path, self.journal_path):
+            if os.path.exists(path):
+                os.replace(path, path + suffix)
+                bt.logging.error(f"Moved {path} to {path + suffix}")
+
+    def _read(self) -> tuple[dict, list]:
+        snapshot = None
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "rb") as f:
+                snapshot = msgpack.unpackb(f.read(), strict_map_key=False)
+            snapshot_seq = snapshot["seq"]
+        self.seq = snapshot_seq
+
+        records = []
+        valid_size = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as f:
+                unpacker = msgpack.Unpacker(f, strict_map_key=False)
+                try:
+                    for seq, op, payload in unpacker:
+                        valid_size = unpacker.tell()
+                        if seq <= snapshot_seq:
+                            continue
+                        records.append((op, payload))
+                        self.seq = seq
+                except Exception as e:
+                    bt.logging.warning(f"Ignoring corrupted state journal tail: {e}")
+            if valid_size < os.path.getsize(self.journal_path):
+                bt.logging.warning(
+                    f"Truncating state journal to last complete record at {valid_size} bytes"
+                )
+                os.truncate(self.journal_path, valid_size)
+        return snapshot, records
+
+    def append(self, op: str, payload):
+        """Buffer one delta record. It is durable after the next `sync`."""
+        if self.file is None:
+            return
+        with self.lock:
+            self.seq += 1
+            self.file.write(self.packer.pack([self.seq, op, payload]))
+
+    def sync(self):
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def should_compact(self) -> bool:
+        with self.lock:
+            return self.file is not None and self.file.tell() >= self.compact_size
+
+    def compact(self, state: dict):
+        """
+        Write `state` as the new snapshot and truncate the journal. The caller must
+        make sure no record is appended while `state` is being built.
+        """
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(msgpack.packb({**state, "seq": self.seq}))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            self._fsync_directory()
+            if self.file is not None:
+                self.file.truncate(0)
+                self.file.seek(0)
+                os.fsync(self.file.fileno())
+
+    def _fsync_directory(self):
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
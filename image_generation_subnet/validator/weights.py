@@ -0,0 +1,49 @@
+import torch
+
+
+def rank_matrix(matrix: torch.Tensor) -> torch.Tensor:
+    """
+    Row-wise rank weights: the top uid gets 1.0, the next two get 2/3 and 1/3,
+    or 0.5 each if they tie. Rows that sum to zero stay zero.
+    """
+    ranked = torch.zeros_like(matrix)
+    if matrix.shape[1] < 3:
+        return ranked
+    sorted_matrix, indices = torch.sort(matrix, dim=1, descending=True)
+    is_tie = sorted_matrix[:, 1] == sorted_matrix[:, 2]
+    top_values = torch.stack(
+        [
+            torch.ones_like(sorted_matrix[:, 0]),
+            torch.where(is_tie, 0.5, 2 / 3).to(matrix.dtype),
+            torch.where(is_tie, 0.5, 1 / 3).to(matrix.dtype),
+        ],
+        dim=1,
+    )
+    ranked.scatter_(1, indices[:, :3], top_values)
+    ranked[matrix.sum(dim=1) == 0] = 0
+    return ranked
+
+
+def compute_weights(
+    score_matrix: torch.Tensor,
+    is_open_category: torch.Tensor,
+    incentive_weights: torch.Tensor,
+) -> torch.Tensor:
+    """
+    Combine per-model scores into one weight vector.
+
+    Args:
+        score_matrix: [models x uids] clamped mean scores, zero outside each model's miners.
+        is_open_category: [models] bool, rows that get the rank blend.
+        incentive_weights: [models] incentive share of each model.
+    """
+    row_sums = score_matrix.sum(dim=1, keepdim=True)
+    normalized = torch.where(row_sums > 0, score_matrix / row_sums, score_matrix)
+
+    mask = normalized > 1e-4
+    blended = normalized * 0.5 + rank_matrix(normalized) * 0.5
+    blended = (0.8 + 0.2 * blended) * mask
+    blended = torch.nn.functional.normalize(blended, p=1, dim=1)
+    model_weights = torch.where(is_open_category.unsqueeze(1), blended, normalized)
+
+    return (model_weights * incentive_weights.unsqueeze(1)).sum(dim=0)
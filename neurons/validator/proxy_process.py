@@ -0,0 +1,270 @@
+import multiprocessing
+import threading
+import time
+import bittensor as bt
+from types import SimpleNamespace
+from image_generation_subnet.validator import ConnectionPool, CreditQueue, QueryQueue
+from image_generation_subnet.validator.miner_manager import NUM_SCORES_TO_KEEP
+from image_generation_subnet.validator.shared_state import (
+    SharedStatePublisher,
+    SharedStateReader,
+)
+
+
+class ProxyProcess:
+    """
+    Runs ValidatorProxy in its own process so organic traffic does not share
+    the GIL with the forward loop and the reward threads.
+    - The validator publishes a snapshot of axons, rate credits, scores and
+      latency quantiles to shared memory every `publish_interval` seconds.
+    - The proxy sends the credits it spent and the scores / process times it
+      observed back through a queue, applied here by a validator thread.
+    Credits spent by either side between two snapshots may be used twice, so
+    miners can see at most one publish interval of extra organic traffic.
+    """
+
+    def __init__(self, validator, publish_interval: float = 2.0):
+        self.validator = validator
+        self.publish_interval = publish_interval
+        self.context = multiprocessing.get_context("spawn")
+        self.publisher = SharedStatePublisher()
+        self.updates = self.context.Queue()
+        self.stats = {"publishes": 0, "credit": 0, "scores": 0, "metadata": 0}
+        self.publish()
+        self.start_process()
+        threading.Thread(target=self.publish_loop, daemon=True).start()
+        threading.Thread(target=self.apply_updates, daemon=True).start()
+
+    def start_process(self):
+        self.process = self.context.Process(
+            target=run_proxy_process,
+            args=(self.validator.config, self.publisher.name, self.updates),
+            daemon=True,
+        )
+        self.process.start()
+
+    def build_snapshot(self) -> dict:
+        validator = self.validator
+        miner_manager = validator.miner_manager
+        query_queue = validator.query_queue
+        miners = {}
+        for uid, axon in enumerate(validator.metagraph.axons):
+            axon = miner_manager.layer_one_axons.get(uid) or axon
+            miners[uid] = {
+                "axon": axon.to_string(),
+                "scores": miner_manager.get_scores(uid),
+                "reward_scale": (
+                    miner_manager.reward_scale[uid].item()
+                    if uid < miner_manager.n
+                    else 0
+                ),
+                "mean_process_time": miner_manager.get_mean_process_time(uid),
+            }
+        latency_quantiles = {}
+        for model_name, model_config in validator.nicheimage_catalogue.items():
+            q = model_config.get("proxy_hedge", {}).get(
+                "hedge_quantile", validator.config.proxy.hedge_quantile
+            )
+            latency_quantiles[model_name] = {
+                str(q): validator.adaptive_timeout.get_quantile(model_name, q)
+            }
+        return {
+            "uid": validator.uid,
+            "miners": miners,
+            "credits": {
+                model_name: {
+                    "synthetic": q.snapshot(),
+                    "proxy": query_queue.proxy_queue[model_name].snapshot(),
+                }
+                for model_name, q in query_queue.synthentic_queue.items()
+            },
+            "synthentic_rewarded": list(query_queue.synthentic_rewarded),
+            "latency_quantiles": latency_quantiles,
+        }
+
+    def publish(self):
+        self.publisher.publish(self.build_snapshot())
+        self.stats["publishes"] += 1
+
+    def publish_loop(self):
+        while True:
+            time.sleep(self.publish_interval)
+            try:
+                self.publish()
+            except Exception as e:
+                bt.logging.error(f"Failed to publish proxy state: {e}")
+
+    def apply_updates(self):
+        while True:
+            kind, *args = self.updates.get()
+            try:
+                if kind == "credit":
+                    model_name, uid = args
+                    query_queue = self.validator.query_queue
+                    if not query_queue.synthentic_queue[model_name].take(uid):
+                        query_queue.proxy_queue[model_name].take(uid)
+                elif kind == "scores":
+                    self.validator.miner_manager.update_scores(*args)
+                elif kind == "metadata":
+                    self.validator.miner_manager.update_metadata(*args)
+                self.stats[kind] += 1
+            except Exception as e:
+                bt.logging.error(f"Failed to apply proxy update {kind}: {e}")
+
+    def log_stats(self):
+        bt.logging.info(f"Proxy process updates: {self.stats}")
+        if not self.process.is_alive():
+            bt.logging.warning(
+                f"Proxy process exited with code {self.process.exitcode}, restarting"
+            )
+            self.start_process()
+
+
+class SnapshotMinerManager:
+    """The part of MinerManager the proxy uses, read from the shared snapshot."""
+
+    def __init__(self, updates):
+        self.updates = updates
+        self.layer_one_axons = {}
+        self.all_uids_info = {}
+        self.mean_process_times = {}
+
+    def load(self, miners: dict):
+        self.all_uids_info = {
+            uid: {"scores": info["scores"], "reward_scale": info["reward_scale"]}
+            for uid, info in miners.items()
+        }
+        self.mean_process_times = {
+            uid: info["mean_process_time"] for uid, info in miners.items()
+        }
+
+    def get_mean_score(self, uid: int) -> float:
+        scores = self.all_uids_info.get(uid, {}).get("scores", [])
+        return sum(scores) / NUM_SCORES_TO_KEEP
+
+    def get_mean_process_time(self, uid: int):
+        return self.mean_process_times.get(uid)
+
+    def update_scores(self, uids, rewards):
+        self.updates.put(
+            ("scores", [int(uid) for uid in uids], [float(r) for r in rewards])
+        )
+
+    def update_metadata(self, uids, process_times):
+        self.updates.put(
+            (
+                "metadata",
+                [int(uid) for uid in uids],
+                [float(ptime) for ptime in process_times],
+            )
+        )
+
+
+class SnapshotQueryQueue(QueryQueue):
+    """Local copy of the validator's credit queues; spent credits are reported back."""
+
+    def __init__(self, updates):
+        super().__init__([])
+        self.updates = updates
+
+    def load(self, credits: dict, synthentic_rewarded: list):
+        for model_name, queues in credits.items():
+            self.synthentic_queue.setdefault(model_name, CreditQueue()).reset(
+                *queues["synthetic"]
+            )
+            self.proxy_queue.setdefault(model_name, CreditQueue()).reset(
+                *queues["proxy"]
+            )
+        self.synthentic_rewarded = set(synthentic_rewarded)
+
+    def get_query_for_proxy(self, model_name, policy=None):
+        for uid, should_reward in super().get_query_for_proxy(model_name, policy):
+            self.updates.put(("credit", model_name, uid))
+            yield uid, should_reward
+
+
+class SnapshotLatency:
+    """Serves `get_quantile` from the latency quantiles published by the validator."""
+
+    def __init__(self):
+        self.latency_quantiles = {}
+
+    def get_quantile(self, model_name: str, q: float):
+        return self.latency_quantiles.get(model_name, {}).get(str(q))
+
+
+class SnapshotValidator:
+    """
+    Stands in for the Validator inside the proxy process: static parts are
+    rebuilt from the config, miner state comes from the shared snapshot.
+    """
+
+    supporting_offline_reward_types = ["image", "custom_offline"]
+
+    def __init__(self, config, shm_name: str, updates, nicheimage_catalogue: dict):
+        self.config = config
+        self.wallet = bt.wallet(config=config)
+        self.connection_pool = ConnectionPool(
+            self.wallet,
+            max_connections_per_host=config.connection_pool.max_connections_per_host,
+            max_keepalive_per_host=config.connection_pool.max_keepalive_per_host,
+            keepalive_expiry=config.connection_pool.keepalive_expiry,
+            http2=not config.connection_pool.disable_http2,
+        )
+        self.nicheimage_catalogue = nicheimage_catalogue
+        self.offline_reward = config.offline_reward.enable
+        if self.offline_reward:
+            from services.offline_rewarding.redis_client import RedisClient
+
+            self.redis_client = RedisClient(
+                url=config.offline_reward.redis_endpoint,
+                blob_dir=config.offline_reward.blob_dir,
+                blob_ttl=config.offline_reward.blob_ttl,
+            )
+        self.reader = SharedStateReader(shm_name)
+        self.miner_manager = SnapshotMinerManager(updates)
+        self.query_queue = SnapshotQueryQueue(updates)
+        self.adaptive_timeout = SnapshotLatency()
+        self.metagraph = SimpleNamespace(axons=[])
+        self.uid = None
+        self.refresh()
+
+    def refresh(self):
+        state, changed = self.reader.read()
+        if not changed:
+            return
+        self.uid = state["uid"]
+        miners = state["miners"]
+        self.metagraph.axons = [
+            bt.AxonInfo.from_string(miners[uid]["axon"]) for uid in sorted(miners)
+        ]
+        self.miner_manager.load(miners)
+        self.query_queue.load(state["credits"], state["synthentic_rewarded"])
+        self.adaptive_timeout.latency_quantiles = state["latency_quantiles"]
+
+    def enqueue_synapse_for_validation(self, base_synapse):
+        """Push base synapse to queue for generating validator response."""
+        self.redis_client.publish_base_synapse(base_synapse.deserialize())
+
+
+def run_proxy_process(config, shm_name: str, updates):
+    """Entry point of the proxy process."""
+    from neurons.validator.validator import initialize_nicheimage_catalogue
+    from neurons.validator.validator_proxy import ValidatorProxy
+
+    bt.logging(config=config, logging_dir=config.full_path)
+    validator = SnapshotValidator(
+        config, shm_name, updates, initialize_nicheimage_catalogue(config)
+    )
+    proxy = ValidatorProxy(validator)
+    bt.logging.info(f"Validator proxy process started on port {config.proxy.port}")
+    last_log = time.time()
+    while True:
+        time.sleep(0.5)
+        try:
+            validator.refresh()
+        except Exception as e:
+            bt.logging.error(f"Failed to read proxy state: {e}")
+        if time.time() - last_log > config.loop_base_time:
+            proxy.log_stats()
+            last_log = time.time()
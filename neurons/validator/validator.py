@@ -4,14 +4,23 @@ import random
 import torch
 from image_generation_subnet.base.validator import BaseValidatorNeuron
 from neurons.validator.validator_proxy import ValidatorProxy
-from image_generation_subnet.validator import MinerManager
+from neurons.validator.proxy_process import ProxyProcess
+from image_generation_subnet.validator import (
+    MinerManager,
+    QueryQueue,
+    LoopPacer,
+    ConnectionPool,
+    ChallengePrefetcher,
+    compute_weights,
+    StateJournal,
+    AdaptiveTimeout,
+    as_completed_batches,
+)
 import image_generation_subnet as ig_subnet
 import traceback
 import yaml
 import threading
-import math
-import queue
-import json
+import os
 from image_generation_subnet.validator.offline_challenge import (
     get_backup_image,
     get_backup_prompt,
@@ -28,106 +37,6 @@ MODEL_CONFIGS = yaml.load(
 )
 
 
-class QueryItem:
-    def __init__(self, uid: int):
-        self.uid = uid
-
-
-class QueryQueue:
-    def __init__(self, model_names: list[str], time_per_loop: int = 600):
-        self.synthentic_queue: dict[str, queue.Queue[QueryItem]] = {
-            model_name: queue.Queue() for model_name in model_names
-        }
-        self.proxy_queue: dict[str, queue.Queue[QueryItem]] = {
-            model_name: queue.Queue() for model_name in model_names
-        }
-        self.synthentic_rewarded = []
-        self.time_per_loop = time_per_loop
-        self.total_uids_remaining = 0
-
-    def update_queue(self, all_uids_info):
-        self.total_uids_remaining = 0
-        self.synthentic_rewarded = []
-        for q in self.synthentic_queue.values():
-            q.queue.clear()
-        for q in self.proxy_queue.values():
-            q.queue.clear()
-        for uid, info in all_uids_info.items():
-            if not info["model_name"]:
-                continue
-            synthentic_model_queue = self.synthentic_queue.setdefault(
-                info["model_name"], queue.Queue()
-            )
-            proxy_model_queue = self.proxy_queue.setdefault(
-                info["model_name"], queue.Queue()
-            )
-            synthetic_rate_limit, proxy_rate_limit = self.get_rate_limit_by_type(
-                info["rate_limit"]
-            )
-            for _ in range(int(synthetic_rate_limit)):
-                synthentic_model_queue.put(QueryItem(uid=uid))
-            for _ in range(int(proxy_rate_limit)):
-                proxy_model_queue.put(QueryItem(uid=uid))
-        # Shuffle the queue
-        for model_name, q in self.synthentic_queue.items():
-            random.shuffle(q.queue)
-            self.total_uids_remaining += len(q.queue)
-            bt.logging.info(
-                f"- Model {model_name} has {len(q.queue)} uids remaining for synthentic"
-            )
-        for model_name, q in self.proxy_queue.items():
-            random.shuffle(q.queue)
-            bt.logging.info(
-                f"- Model {model_name} has {len(q.queue)} uids remaining for organic"
-            )
-
-    def get_batch_query(self, batch_size: int):
-        if not self.total_uids_remaining:
-            return
-        more_data = True
-        while more_data:
-            more_data = False
-            for model_name, q in self.synthentic_queue.items():
-                if q.empty():
-                    continue
-                time_to_sleep = self.time_per_loop * (
-                    min(batch_size / (self.total_uids_remaining + 1), 1)
-                )
-                uids_to_query = []
-                should_rewards = []
-
-                while len(uids_to_query) < batch_size and not q.empty():
-                    more_data = True
-                    query_item = q.get()
-                    uids_to_query.append(query_item.uid)
-                    if query_item.uid in self.synthentic_rewarded:
-                        should_rewards.append(False)
-                    else:
-                        should_rewards.append(True)
-                        self.synthentic_rewarded.append(query_item.uid)
-
-                yield model_name, uids_to_query, should_rewards, time_to_sleep
-
-    def get_query_for_proxy(self, model_name):
-        synthentic_q = self.synthentic_queue[model_name]
-        proxy_q = self.proxy_queue[model_name]
-        while not synthentic_q.empty():
-            query_item = synthentic_q.get()
-            should_reward = query_item.uid not in self.synthentic_rewarded
-            yield query_item.uid, should_reward
-        while not proxy_q.empty():
-            query_item = proxy_q.get()
-            yield query_item.uid, False
-
-    def get_rate_limit_by_type(self, rate_limit):
-        synthentic_rate_limit = max(1, int(math.floor(rate_limit * 0.8)) - 1)
-        synthentic_rate_limit = max(
-            rate_limit - synthentic_rate_limit, synthentic_rate_limit
-        )
-        proxy_rate_limit = rate_limit - synthentic_rate_limit
-        return synthentic_rate_limit, proxy_rate_limit
-
-
 def initialize_challenge_urls(config):
     challenge_urls = {
         "txt2img": {
@@ -369,7 +278,18 @@ class Validator(BaseValidatorNeuron):
         self.challenge_urls = initialize_challenge_urls(self.config)
         self.nicheimage_catalogue = initialize_nicheimage_catalogue(self.config)
         self.open_category_reward_synapses = self.init_reward_open_category_synapses()
-        self.miner_manager = MinerManager(self)
+        self.connection_pool = ConnectionPool(
+            self.wallet,
+            max_connections_per_host=self.config.connection_pool.max_connections_per_host,
+            max_keepalive_per_host=self.config.connection_pool.max_keepalive_per_host,
+            keepalive_expiry=self.config.connection_pool.keepalive_expiry,
+            http2=not self.config.connection_pool.disable_http2,
+        )
+        self.miner_manager = MinerManager(
+            self,
+            identity_ttl=self.config.miner_identity.ttl,
+            identity_negative_ttl=self.config.miner_identity.negative_ttl,
+        )
         self.load_state()
         self.update_scores_on_chain()
         self.sync()
@@ -378,24 +298,54 @@ class Validator(BaseValidatorNeuron):
             list(self.nicheimage_catalogue.keys()),
             time_per_loop=self.config.loop_base_time,
         )
+        self.challenge_prefetcher = ChallengePrefetcher(
+            self.prefetch_challenge,
+            [
+                (pipeline_type, model_name)
+                for model_name, model_config in self.nicheimage_catalogue.items()
+                for pipeline_type in model_config["supporting_pipelines"]
+            ],
+            buffer_size=self.config.challenge.prefetch_size,
+            ttl=self.config.challenge.prefetch_ttl,
+        )
+        self.challenge_prefetcher.start()
+        self.forward_loop = asyncio.new_event_loop()
+        self.loop_pacer = LoopPacer(
+            self.config.loop_base_time,
+            {
+                model_name: model_config["timeout"]
+                for model_name, model_config in self.nicheimage_catalogue.items()
+            },
+        )
+        self.adaptive_timeout = AdaptiveTimeout(
+            {
+                model_name: model_config["timeout"]
+                for model_name, model_config in self.nicheimage_catalogue.items()
+            },
+            quantile=self.config.adaptive_timeout.quantile,
+            margin=self.config.adaptive_timeout.margin,
+            enabled=not self.config.adaptive_timeout.disable,
+        )
         self.offline_reward = self.config.offline_reward.enable
         self.supporting_offline_reward_types = ["image", "custom_offline"]
         self.generate_response_offline_types = ["image"]
         if self.offline_reward:
             self.redis_client = RedisClient(
-                url=self.config.offline_reward.redis_endpoint
+                url=self.config.offline_reward.redis_endpoint,
+                blob_dir=self.config.offline_reward.blob_dir,
+                blob_ttl=self.config.offline_reward.blob_ttl,
             )
             self.reward_app = RewardApp(self)
             self.end_loop_event = threading.Event()
             threading.Thread(target=self.clear_data, daemon=True).start()
-            threading.Thread(
-                target=self.generate_validator_responses, daemon=True
-            ).start()
             threading.Thread(target=self.reward_offline, daemon=True).start()
 
         if self.config.proxy.port:
             try:
-                self.validator_proxy = ValidatorProxy(self)
+                if self.config.proxy.separate_process:
+                    self.validator_proxy = ProxyProcess(self)
+                else:
+                    self.validator_proxy = ValidatorProxy(self)
                 bt.logging.info("Validator proxy started succesfully")
             except Exception:
                 bt.logging.warning(
@@ -409,19 +359,15 @@ class Validator(BaseValidatorNeuron):
         - Querying all miners to get their model_name and total_volume
         - Create serving queue, here is pseudo code:
             ```
-                synthentic_queue = Queue()
-                for uid, total_volume_this_validator in all_uids_info:
-                    for _ in range(total_volume_this_validator*0.8):
-                        synthentic_queue.put(uid)
-                shuffle(synthentic_queue)
-
-                organic_queue = Queue()
-                for uid, total_volume_this_validator in all_uids_info:
-                    for _ in range(total_volume_this_validator*0.2):
-                        organic_queue.put(uid)
-                shuffle(organic_queue)
+                synthentic_queue = CreditQueue()
+                synthentic_queue.reset(uids, [volume * 0.8 for volume in volumes])
+
+                organic_queue = CreditQueue()
+                organic_queue.reset(uids, [volume * 0.2 for volume in volumes])
             ```
-        - Forwarding requests to miners in multiple thread to ensure total time is around 600 seconds. In each thread, we do:
+          Each CreditQueue serves uids by weighted deficit round-robin over their remaining credits.
+        - Forwarding requests to miners as asyncio tasks on one event loop, with bounded concurrency per model.
+          Batch launches are paced from measured batch durations so the loop finishes around 600 seconds. In each task, we do:
             - Calculating rewards if needed
             - Updating scores based on rewards
             - Saving the state
@@ -431,40 +377,13 @@ class Validator(BaseValidatorNeuron):
         """
 
         bt.logging.info("Updating available models & uids")
-        async_batch_size = self.config.async_batch_size
         loop_base_time = self.config.loop_base_time  # default is 600 seconds
         self.open_category_reward_synapses = self.init_reward_open_category_synapses()
-        threads = []
         loop_start = time.time()
         self.miner_manager.update_miners_identity()
         self.query_queue.update_queue(self.miner_manager.all_uids_info)
 
-        for (
-            model_name,
-            uids,
-            should_rewards,
-            sleep_per_batch,
-        ) in self.query_queue.get_batch_query(async_batch_size):
-            bt.logging.info(
-                f"Querying {len(uids)} uids for model {model_name}, sleep_per_batch: {sleep_per_batch}"
-            )
-            if model_name not in self.nicheimage_catalogue:
-                bt.logging.warning(
-                    f"Model {model_name} not in nicheimage_catalogue, skipping"
-                )
-                continue
-            thread = threading.Thread(
-                target=self.async_query_and_reward,
-                args=(model_name, uids, should_rewards),
-            )
-            threads.append(thread)
-            thread.start()
-
-            bt.logging.info(f"Sleeping for {sleep_per_batch} seconds between batches")
-            time.sleep(sleep_per_batch)
-
-        for thread in threads:
-            thread.join()
+        self.forward_loop.run_until_complete(self.run_batches())
 
         bt.logging.info(
             "Loop completed, uids info:\n",
@@ -486,20 +405,71 @@ class Validator(BaseValidatorNeuron):
         if self.offline_reward:
             self.end_loop_event.set()
 
+        self.connection_pool.log_stats()
+        self.challenge_prefetcher.log_stats()
+        self.adaptive_timeout.end_loop()
+        if hasattr(self, "validator_proxy"):
+            self.validator_proxy.log_stats()
         self.update_scores_on_chain()
         self.save_state()
 
-    def reward_offline(self):
-        """Calculate rewards for miner based on  validator responses (from cache) and miner responses"""
-        asyncio.get_event_loop().run_until_complete(
-            self.reward_app.dequeue_reward_message()
-        )
+    async def run_batches(self):
+        """
+        Launch every batch of the loop as a task, pacing launches with the loop pacer.
+        """
+        async_batch_size = self.config.async_batch_size
+        semaphores = {}
+        tasks = []
+        self.loop_pacer.start_loop()
+        for (
+            model_name,
+            uids,
+            should_rewards,
+            _,
+        ) in self.query_queue.get_batch_query(async_batch_size):
+            if model_name not in self.nicheimage_catalogue:
+                bt.logging.warning(
+                    f"Model {model_name} not in nicheimage_catalogue, skipping"
+                )
+                continue
+            semaphore = semaphores.setdefault(
+                model_name,
+                asyncio.Semaphore(self.config.max_concurrent_batches_per_model),
+            )
+            tasks.append(
+                asyncio.create_task(
+                    self.run_batch(semaphore, model_name, uids, should_rewards)
+                )
+            )
+            sleep_per_batch = self.loop_pacer.next_delay(
+                self.query_queue.remaining_batches(async_batch_size),
+                self.query_queue.pending_models(),
+            )
+            bt.logging.info(
+                f"Querying {len(uids)} uids for model {model_name}, sleep_per_batch: {sleep_per_batch:.2f}"
+            )
+            await asyncio.sleep(sleep_per_batch)
 
-    def generate_validator_responses(self):
-        """Handle generating validator responses for base synapses and cache the results to score the miner later"""
-        asyncio.get_event_loop().run_until_complete(
-            self.reward_app.dequeue_base_synapse_message()
-        )
+        await asyncio.gather(*tasks)
+        self.loop_pacer.end_loop()
+
+    async def run_batch(self, semaphore, model_name, uids, should_rewards):
+        async with semaphore:
+            start = time.time()
+            try:
+                await self.async_query_and_reward(model_name, uids, should_rewards)
+            except Exception:
+                bt.logging.error(
+                    f"Error in batch of {model_name}: {traceback.format_exc()}"
+                )
+            self.loop_pacer.record_batch(model_name, time.time() - start)
+
+    def reward_offline(self):
+        """
+        Generate validator responses for base synapses and cache them, and calculate rewards
+        for miners from the cached validator responses, as two tasks on one event loop.
+        """
+        asyncio.run(self.reward_app.run())
 
     def clear_data(self):
         """Process when the duration of one loop is complete."""
@@ -509,6 +479,7 @@ class Validator(BaseValidatorNeuron):
                 self.redis_client.get_stream_info(
                     self.reward_app.base_synapse_stream_name
                 )
+                self.redis_client.blob_store.log_stats()
                 self.reward_app.show_total_uids_and_rewards()
                 self.reward_app.reset_total_uids_and_rewards()
                 self.end_loop_event.clear()
@@ -516,130 +487,183 @@ class Validator(BaseValidatorNeuron):
 
     def enqueue_synapse_for_validation(self, base_synapse):
         """Push base synapse to queue for generating validator response."""
-        self.redis_client.publish_to_stream(
-            stream_name=self.redis_client.base_synapse_stream_name,
-            message={"data": json.dumps(base_synapse.deserialize())},
-        )
+        self.redis_client.publish_base_synapse(base_synapse.deserialize())
 
-    def async_query_and_reward(
+    async def async_query_and_reward(
         self,
         model_name: str,
         uids: list[int],
         should_rewards: list[int],
     ):
-        dendrite = bt.dendrite(self.wallet)
+        dendrite = self.connection_pool.get_dendrite()
         pipeline_type = random.choice(
             self.nicheimage_catalogue[model_name]["supporting_pipelines"]
         )
-        reward_url = self.nicheimage_catalogue[model_name]["reward_url"]
         uids_should_rewards = list(zip(uids, should_rewards))
-        synapses, batched_uids_should_rewards = self.prepare_challenge(
-            uids_should_rewards, model_name, pipeline_type
+        synapses, batched_uids_should_rewards = await asyncio.to_thread(
+            self.prepare_challenge, uids_should_rewards, model_name, pipeline_type
+        )
+        await asyncio.gather(
+            *[
+                self.query_and_reward_group(
+                    dendrite, model_name, synapse, uids_should_rewards
+                )
+                for synapse, uids_should_rewards in zip(
+                    synapses, batched_uids_should_rewards
+                )
+            ]
         )
-        for synapse, uids_should_rewards in zip(synapses, batched_uids_should_rewards):
-            uids, should_rewards = zip(*uids_should_rewards)
-            bt.logging.info(f"Quering {uids}, Should reward: {should_rewards}")
-            if not synapse:
-                continue
-            base_synapse = synapse.copy()
-            if (
-                self.offline_reward
-                and any([should_reward for should_reward in should_rewards])
-                and self.nicheimage_catalogue[model_name]["reward_type"]
-                in self.generate_response_offline_types
-            ):
-                self.enqueue_synapse_for_validation(base_synapse)
 
-            axons = []
-            for uid in uids:
-                if uid in self.miner_manager.layer_one_axons:
-                    axons.append(self.miner_manager.layer_one_axons[uid])
-                else:
-                    axons.append(self.metagraph.axons[uid])
-            responses = dendrite.query(
-                axons=axons,
-                synapse=synapse,
+    async def query_and_reward_group(
+        self, dendrite, model_name, synapse, uids_should_rewards
+    ):
+        """
+        Query one challenge group and reward responses as they arrive, in
+        micro-batches collected over `stream_reward.window` seconds.
+        """
+        uids, should_rewards = zip(*uids_should_rewards)
+        bt.logging.info(f"Quering {uids}, Should reward: {should_rewards}")
+        if not synapse:
+            return
+        base_synapse = synapse.copy()
+        if (
+            self.offline_reward
+            and any([should_reward for should_reward in should_rewards])
+            and self.nicheimage_catalogue[model_name]["reward_type"]
+            in self.generate_response_offline_types
+        ):
+            self.enqueue_synapse_for_validation(base_synapse)
+
+        timeout = self.adaptive_timeout.get_timeout(model_name)
+
+        async def query_axon(uid, should_reward):
+            # layer_one_axons is refreshed in the background, look each uid up once.
+            axon = (
+                self.miner_manager.layer_one_axons.get(uid) or self.metagraph.axons[uid]
+            )
+            response = await dendrite.call(
+                target_axon=axon,
+                synapse=synapse.copy(),
+                timeout=timeout,
                 deserialize=False,
-                timeout=self.nicheimage_catalogue[model_name]["timeout"],
             )
-            reward_responses = [
-                response
-                for response, should_reward in zip(responses, should_rewards)
-                if should_reward
-            ]
-            reward_uids = [
-                uid for uid, should_reward in zip(uids, should_rewards) if should_reward
-            ]
+            return uid, should_reward, response
 
-            bt.logging.info(
-                f"Received {len(responses)} responses, {len(reward_responses)} to be rewarded"
-            )
-            store_thread = threading.Thread(
-                target=self.store_miner_output,
-                args=(self.config.storage_url, responses, uids, self.uid),
-                daemon=True,
+        query_tasks = [
+            asyncio.create_task(query_axon(uid, should_reward))
+            for uid, should_reward in uids_should_rewards
+        ]
+        window = (
+            None
+            if self.config.stream_reward.disable
+            else self.config.stream_reward.window
+        )
+        reward_tasks = []
+        async for results in as_completed_batches(query_tasks, window):
+            batch_uids, batch_should_rewards, responses = zip(*results)
+            reward_tasks.append(
+                asyncio.create_task(
+                    asyncio.to_thread(
+                        self.reward_responses,
+                        model_name,
+                        base_synapse,
+                        list(responses),
+                        list(batch_uids),
+                        list(batch_should_rewards),
+                    )
+                )
             )
-            store_thread.start()
+        # The group shares one challenge: store it once, with all of the group's responses
+        _, _, responses = zip(*[task.result() for task in query_tasks])
+        await asyncio.gather(
+            *reward_tasks,
+            asyncio.to_thread(
+                self.store_miner_output,
+                self.config.storage_url,
+                list(responses),
+                list(uids),
+                self.uid,
+            ),
+        )
 
-            process_times = [
-                synapse.dendrite.process_time if synapse.is_success else -1
-                for synapse in responses
-            ]
-            self.miner_manager.update_metadata(uids, process_times)
-            if reward_uids:
-                if (
-                    self.offline_reward
-                    and self.nicheimage_catalogue[model_name]["reward_type"]
-                    in self.supporting_offline_reward_types
-                ):
-                    ig_subnet.validator.get_reward_offline(
+    def reward_responses(
+        self,
+        model_name: str,
+        base_synapse: bt.Synapse,
+        responses: list[bt.Synapse],
+        uids: list[int],
+        should_rewards: list[bool],
+    ):
+        reward_url = self.nicheimage_catalogue[model_name]["reward_url"]
+        reward_responses = [
+            response
+            for response, should_reward in zip(responses, should_rewards)
+            if should_reward
+        ]
+        reward_uids = [
+            uid for uid, should_reward in zip(uids, should_rewards) if should_reward
+        ]
+
+        bt.logging.info(
+            f"Received {len(responses)} responses, {len(reward_responses)} to be rewarded"
+        )
+        process_times = [
+            synapse.dendrite.process_time if synapse.is_success else -1
+            for synapse in responses
+        ]
+        self.miner_manager.update_metadata(uids, process_times)
+        self.adaptive_timeout.observe(
+            model_name,
+            process_times,
+            [synapse.timeout for synapse in responses if synapse.is_timeout],
+        )
+        if reward_uids:
+            if (
+                self.offline_reward
+                and self.nicheimage_catalogue[model_name]["reward_type"]
+                in self.supporting_offline_reward_types
+            ):
+                ig_subnet.validator.get_reward_offline(
+                    base_synapse,
+                    reward_responses,
+                    reward_uids,
+                    self.nicheimage_catalogue[model_name].get("timeout", 12),
+                    self.redis_client,
+                )
+            else:
+                if callable(reward_url):
+                    reward_uids, rewards = reward_url(
+                        base_synapse, reward_responses, reward_uids
+                    )
+                else:
+                    reward_uids, rewards = ig_subnet.validator.get_reward(
+                        reward_url,
                         base_synapse,
                         reward_responses,
                         reward_uids,
                         self.nicheimage_catalogue[model_name].get("timeout", 12),
-                        self.redis_client,
+                        self.miner_manager,
+                        self.connection_pool,
                     )
-                else:
-                    if callable(reward_url):
-                        reward_uids, rewards = reward_url(
-                            base_synapse, reward_responses, reward_uids
-                        )
-                    else:
-                        reward_uids, rewards = ig_subnet.validator.get_reward(
-                            reward_url,
-                            base_synapse,
-                            reward_responses,
-                            reward_uids,
-                            self.nicheimage_catalogue[model_name].get("timeout", 12),
-                            self.miner_manager,
-                        )
 
-                        # Scale Reward based on Miner Volume
-                    for i, uid in enumerate(reward_uids):
-                        if rewards[i] > 0:
-                            rewards[i] = rewards[i] * (
-                                0.6
-                                + 0.4
-                                * self.miner_manager.all_uids_info[uid]["reward_scale"]
-                            )
+                    # Scale Reward based on Miner Volume
+                for i, uid in enumerate(reward_uids):
+                    if rewards[i] > 0:
+                        rewards[i] = rewards[i] * (
+                            0.6
+                            + 0.4
+                            * self.miner_manager.all_uids_info[uid]["reward_scale"]
+                        )
 
-                    bt.logging.info(f"Scored responses: {rewards}")
+                bt.logging.info(f"Scored responses: {rewards}")
 
-                    self.miner_manager.update_scores(reward_uids, rewards)
-            store_thread.join()
+                self.miner_manager.update_scores(reward_uids, rewards)
 
     def prepare_challenge(self, uids_should_rewards, model_name, pipeline_type):
         """
         Batch the batch (max = 16) into smaller batch size (max = 4) and prepare synapses for each batch.
         """
-        synapse_type = self.nicheimage_catalogue[model_name]["synapse_type"]
-        model_miner_count = len(
-            [
-                uid
-                for uid, info in self.miner_manager.all_uids_info.items()
-                if info["model_name"] == model_name
-            ]
-        )
+        model_miner_count = len(self.miner_manager.get_miner_uids(model_name))
         batch_size = min(4, 1 + model_miner_count // 4)
 
         random.shuffle(uids_should_rewards)
@@ -649,38 +673,73 @@ class Validator(BaseValidatorNeuron):
         ]
         num_batch = len(batched_uids_should_rewards)
         synapses = [
-            synapse_type(pipeline_type=pipeline_type, model_name=model_name)
+            self.challenge_prefetcher.get(pipeline_type, model_name)
             for _ in range(num_batch)
         ]
-        for synapse in synapses:
-            synapse.pipeline_params.update(
-                self.nicheimage_catalogue[model_name]["inference_params"]
+        missing_indexes = [i for i, synapse in enumerate(synapses) if synapse is None]
+        if missing_indexes:
+            if self.challenge_prefetcher.enabled:
+                bt.logging.info(
+                    f"Challenge buffer of {pipeline_type}/{model_name} is empty, using backup challenges for {len(missing_indexes)} batches"
+                )
+            missing_synapses = self.fetch_challenges(
+                [
+                    self.new_challenge_synapse(model_name, pipeline_type)
+                    for _ in missing_indexes
+                ],
+                pipeline_type,
+                use_backup=self.challenge_prefetcher.enabled,
             )
-            if self.nicheimage_catalogue[model_name]["reward_type"] == "open_category":
-                width, height = random_image_size()
-                synapse.pipeline_params.update({"width": width, "height": height})
-            synapse.seed = random.randint(0, 1e9)
+            for i, synapse in zip(missing_indexes, missing_synapses):
+                synapses[i] = synapse
+        if self.nicheimage_catalogue[model_name]["reward_type"] == "open_category":
+            # Reward same test for uids in same open category
+            for i, batch in enumerate(batched_uids_should_rewards):
+                if any([should_reward for _, should_reward in batch]):
+                    self.open_category_reward_synapses[model_name] = (
+                        self.open_category_reward_synapses[model_name] or synapses[i]
+                    )
+                    synapses[i] = self.open_category_reward_synapses[model_name]
+
+        return synapses, batched_uids_should_rewards
+
+    def new_challenge_synapse(self, model_name, pipeline_type):
+        synapse_type = self.nicheimage_catalogue[model_name]["synapse_type"]
+        synapse = synapse_type(pipeline_type=pipeline_type, model_name=model_name)
+        synapse.pipeline_params.update(
+            self.nicheimage_catalogue[model_name]["inference_params"]
+        )
+        if self.nicheimage_catalogue[model_name]["reward_type"] == "open_category":
+            width, height = random_image_size()
+            synapse.pipeline_params.update({"width": width, "height": height})
+        synapse.seed = random.randint(0, 1e9)
+        return synapse
+
+    def fetch_challenges(self, synapses, pipeline_type, use_backup=False):
+        """
+        Fill synapses with challenges from the challenge urls, or only from the backup functions if use_backup.
+        """
         for challenge_url, backup_func in zip(
             self.challenge_urls[pipeline_type]["main"],
             self.challenge_urls[pipeline_type]["backup"],
         ):
             if callable(challenge_url):
                 synapses = challenge_url(synapses)
+            elif use_backup:
+                synapses = [
+                    synapse.copy(update=backup_func()) if synapse else None
+                    for synapse in synapses
+                ]
             else:
                 assert isinstance(challenge_url, str)
                 synapses = ig_subnet.validator.get_challenge(
-                    challenge_url, synapses, backup_func
+                    challenge_url, synapses, backup_func, self.connection_pool
                 )
-        if self.nicheimage_catalogue[model_name]["reward_type"] == "open_category":
-            # Reward same test for uids in same open category
-            for i, batch in enumerate(batched_uids_should_rewards):
-                if any([should_reward for _, should_reward in batch]):
-                    self.open_category_reward_synapses[model_name] = (
-                        self.open_category_reward_synapses[model_name] or synapses[i]
-                    )
-                    synapses[i] = self.open_category_reward_synapses[model_name]
+        return synapses
 
-        return synapses, batched_uids_should_rewards
+    def prefetch_challenge(self, pipeline_type, model_name):
+        synapse = self.new_challenge_synapse(model_name, pipeline_type)
+        return self.fetch_challenges([synapse], pipeline_type)[0]
 
     def store_miner_output(
         self, storage_url, responses: list[bt.Synapse], uids, validator_uid
@@ -692,7 +751,9 @@ class Validator(BaseValidatorNeuron):
             if not response.is_success:
                 continue
             try:
-                response.store_response(storage_url, uid, validator_uid)
+                response.store_response(
+                    storage_url, uid, validator_uid, self.connection_pool
+                )
                 break
             except Exception as e:
                 bt.logging.error(f"Error in storing response: {e}")
@@ -707,70 +768,60 @@ class Validator(BaseValidatorNeuron):
             if self.nicheimage_catalogue[k]["reward_type"] == "open_category"
         }
 
+    def get_incentive_weights(self, model_names: list[str]) -> torch.Tensor:
+        # Smoothing update incentive
+        temp_incentive_weight = {}
+        if datetime.utcnow() < datetime(2024, 11, 7, 14, 0, 0):
+            temp_incentive_weight = {
+                "AnimeV3": 0.15,
+                "JuggernautXL": 0.12,
+                "RealitiesEdgeXL": 0.16,
+                "OpenGeneral": 0.04,
+                "OpenDigitalArt": 0.04,
+            }
+        elif datetime.utcnow() < datetime(2024, 11, 9, 14, 0, 0):
+            temp_incentive_weight = {
+                "AnimeV3": 0.135,
+                "JuggernautXL": 0.11,
+                "RealitiesEdgeXL": 0.145,
+                "OpenGeneral": 0.06,
+                "OpenDigitalArt": 0.06,
+            }
+        if temp_incentive_weight:
+            bt.logging.info(f"Using temp_incentive_weight: {temp_incentive_weight}")
+        return torch.tensor(
+            [
+                temp_incentive_weight.get(
+                    model_name,
+                    self.nicheimage_catalogue[model_name]["model_incentive_weight"],
+                )
+                for model_name in model_names
+            ]
+        )
+
     def update_scores_on_chain(self):
         """
         Update weights based on incentive pool and model specific weights.
         - Apply rank weight for open category model.
+        All models are computed at once from a [models x uids] score matrix.
         """
 
-        weights = torch.zeros(len(self.miner_manager.all_uids))
-        for model_name in self.nicheimage_catalogue.keys():
-            model_specific_weights = self.miner_manager.get_model_specific_weights(
-                model_name
-            )
-            if self.nicheimage_catalogue[model_name]["reward_type"] == "open_category":
-                mask = model_specific_weights > 1e-4
-                ranked_model_specific_weights = self.rank_tensor(model_specific_weights)
-                bt.logging.debug(
-                    f"Unique ranked weights for {model_name}\n{model_specific_weights.unique()}"
-                )
-                model_specific_weights = (
-                    model_specific_weights * 0.5 + ranked_model_specific_weights * 0.5
-                )
-                model_specific_weights = 0.8 + 0.2 * model_specific_weights
-                model_specific_weights = model_specific_weights * mask
-                model_specific_weights = torch.nn.functional.normalize(
-                    model_specific_weights, p=1, dim=0
-                )
-                bt.logging.debug(
-                    f"Normalized {model_name} weights\n{model_specific_weights}"
-                )
-            # Smoothing update incentive
-            temp_incentive_weight = {}
-            if datetime.utcnow() < datetime(2024, 11, 7, 14, 0, 0):
-                temp_incentive_weight = {
-                    "AnimeV3": 0.15,
-                    "JuggernautXL": 0.12,
-                    "RealitiesEdgeXL": 0.16,
-                    "OpenGeneral": 0.04,
-                    "OpenDigitalArt": 0.04,
-                }
-            elif datetime.utcnow() < datetime(2024, 11, 9, 14, 0, 0):
-                temp_incentive_weight = {
-                    "AnimeV3": 0.135,
-                    "JuggernautXL": 0.11,
-                    "RealitiesEdgeXL": 0.145,
-                    "OpenGeneral": 0.06,
-                    "OpenDigitalArt": 0.06,
-                }
-
-            if model_name in temp_incentive_weight:
-                bt.logging.info(
-                    f"Using temp_incentive_weight: {temp_incentive_weight} for {model_name}"
-                )
-                model_specific_weights = (
-                    model_specific_weights * temp_incentive_weight[model_name]
-                )
-            else:
-                model_specific_weights = (
-                    model_specific_weights
-                    * self.nicheimage_catalogue[model_name]["model_incentive_weight"]
-                )
-            bt.logging.info(
-                f"model_specific_weights for {model_name}\n{model_specific_weights}"
-            )
-
-            weights = weights + model_specific_weights
+        model_names = list(self.nicheimage_catalogue.keys())
+        score_matrix = self.miner_manager.get_score_matrix(model_names)
+        is_open_category = torch.tensor(
+            [
+                self.nicheimage_catalogue[model_name]["reward_type"] == "open_category"
+                for model_name in model_names
+            ]
+        )
+        weights = compute_weights(
+            score_matrix,
+            is_open_category,
+            self.get_incentive_weights(model_names),
+        )
+        bt.logging.debug(
+            f"Number of scored uids per model: {dict(zip(model_names, (score_matrix > 0).sum(dim=1).tolist()))}"
+        )
 
         # Check if rewards contains NaN values.
         if torch.isnan(weights).any():
@@ -781,59 +832,73 @@ class Validator(BaseValidatorNeuron):
         bt.logging.success(f"Updated scores: {self.scores}")
 
     def save_state(self):
-        """Saves the state of the validator to a file."""
-
-        torch.save(
-            {
-                "step": self.step,
-                "all_uids_info": self.miner_manager.all_uids_info,
-            },
-            self.config.neuron.full_path + "/state.pt",
-        )
+        """
+        Makes the state journal durable and compacts it into a new snapshot once
+        it grows past the configured size.
+        """
+        self.state_journal.append("step", self.step)
+        if not self.state_journal.should_compact():
+            self.state_journal.sync()
+            return
+        # Hold the miner manager lock so no delta lands between snapshot and truncate.
+        with self.miner_manager.lock:
+            self.state_journal.compact(
+                {
+                    "step": self.step,
+                    "all_uids_info": self.miner_manager.all_uids_info.to_dict(),
+                }
+            )
+        bt.logging.info("Compacted validator state journal")
 
     def load_state(self):
-        """Loads the state of the validator from a file."""
-
-        # Load the state of the validator from file.
+        """
+        Loads the state snapshot and replays the journal tail.
+        A legacy `state.pt` is migrated into a snapshot, only when there is no
+        journal state at all, and then renamed to `state.pt.migrated`.
+        """
+        self.step = 0
+        self.state_journal = StateJournal(
+            self.config.neuron.full_path,
+            compact_size=int(self.config.state_journal.compact_size_mb * 1024 * 1024),
+        )
         try:
-            path = self.config.neuron.full_path + "/state.pt"
-            bt.logging.info("Loading validator state from: " + path)
-            state = torch.load(path)
-            self.step = state["step"]
-            self.miner_manager.all_uids_info = state["all_uids_info"]
-            bt.logging.info("Succesfully loaded state")
+            bt.logging.info(
+                "Loading validator state from: " + self.config.neuron.full_path
+            )
+            # Checked before `load`, which moves an unreadable journal aside: that
+            # case must not bring the legacy state back either.
+            journal_exists = self.state_journal.exists()
+            snapshot, records = self.state_journal.load()
+            legacy_path = self.config.neuron.full_path + "/state.pt"
+            if not journal_exists and os.path.exists(legacy_path):
+                bt.logging.info(f"Migrating legacy state from {legacy_path}")
+                snapshot = torch.load(legacy_path)
+                self.miner_manager.all_uids_info = snapshot["all_uids_info"]
+                self.state_journal.compact(
+                    {
+                        "step": snapshot["step"],
+                        "all_uids_info": self.miner_manager.all_uids_info.to_dict(),
+                    }
+                )
+                os.replace(legacy_path, legacy_path + ".migrated")
+            elif snapshot is not None:
+                self.miner_manager.all_uids_info = snapshot["all_uids_info"]
+            if snapshot is not None:
+                self.step = snapshot["step"]
+            for op, payload in records:
+                if op == "step":
+                    self.step = payload
+            self.miner_manager.replay(records)
+            bt.logging.info(
+                f"Succesfully loaded state, replayed {len(records)} journal records"
+            )
         except Exception as e:
-            self.step = 0
-            bt.logging.info("Could not find previously saved state.", e)
-
-    @staticmethod
-    def rank_tensor(tensor):
-        # Return Zeros if tensor is zeros
-        if torch.sum(tensor) == 0:
-            return tensor
-        # Step 1: Sort the tensor and get the original indices
-        sorted_tensor, indices = torch.sort(tensor, descending=True)
-
-        # Step 2: Create a new tensor for rankings
-        ranked_tensor = torch.zeros_like(tensor)
-
-        # Step 3: Assign ranks based on conditions
-        # First element gets 1.0
-        ranked_tensor[indices[0]] = 1.0
-
-        # Check for tie between second and third elements
-        if sorted_tensor[1] == sorted_tensor[2]:
-            # If there's a tie, both get 0.5
-            ranked_tensor[indices[1]] = 0.5
-            ranked_tensor[indices[2]] = 0.5
-        else:
-            # Otherwise, assign 2/3 and 1/3
-            ranked_tensor[indices[1]] = 2 / 3
-            ranked_tensor[indices[2]] = 1 / 3
-
-        # All others (rank 4 and below) get 0 (already initialized)
-
-        return ranked_tensor
+            bt.logging.error(
+                f"Could not restore validator state: {e}\n{traceback.format_exc()}"
+            )
+        # Record new deltas even if restoring failed part way
+        self.state_journal.open()
+        self.miner_manager.journal = self.state_journal
 
 
 # The main function parses the configuration and runs the validator.
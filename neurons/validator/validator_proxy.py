@@ -1,8 +1,7 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.responses import JSONResponse
 from concurrent.futures import ThreadPoolExecutor
 import uvicorn
-from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
-from cryptography.exceptions import InvalidSignature
 import bittensor as bt
 import base64
 import image_generation_subnet
@@ -10,11 +9,20 @@ import os
 import random
 import asyncio
 from image_generation_subnet.validator.proxy import ProxyCounter
+from image_generation_subnet.validator.proxy_auth import CredentialVerifier
+from image_generation_subnet.validator.hedged_request import (
+    HedgeMetrics,
+    hedged_request,
+)
+from image_generation_subnet.validator.proxy_selection import build_selection_policy
+from image_generation_subnet.validator.request_coalescer import (
+    RequestCoalescer,
+    request_key,
+)
 from image_generation_subnet.protocol import ImageGenerating
-import traceback
-import httpx
 from starlette.concurrency import run_in_threadpool
 import threading
+import time
 
 
 class ValidatorProxy:
@@ -23,10 +31,11 @@ class ValidatorProxy:
         validator,
     ):
         self.validator = validator
+        self.credential_verifier = CredentialVerifier()
         self.get_credentials()
         self.miner_request_counter = {}
-        self.dendrite = bt.dendrite(wallet=validator.wallet)
         self.app = FastAPI()
+        self.app.middleware("http")(self.authorization_middleware)
         self.app.add_api_route(
             "/validator_proxy",
             self.forward,
@@ -37,36 +46,42 @@ class ValidatorProxy:
         self.proxy_counter = ProxyCounter(
             os.path.join(self.validator.config.neuron.full_path, "proxy_counter.json")
         )
+        self.hedge_metrics = HedgeMetrics()
+        self.coalescer = RequestCoalescer(
+            max_size=self.validator.config.proxy.cache_size,
+            ttl=self.validator.config.proxy.cache_ttl,
+        )
+        self.selection_policies = {
+            model_name: build_selection_policy(
+                self.validator.config.proxy.selection_policy,
+                model_config["timeout"],
+                score_fn=self.validator.miner_manager.get_mean_score,
+                latency_fn=self.validator.miner_manager.get_mean_process_time,
+            )
+            for model_name, model_config in self.validator.nicheimage_catalogue.items()
+        }
         if self.validator.config.proxy.port:
             self.start_server()
 
     def get_credentials(self):
-        with httpx.Client(timeout=httpx.Timeout(30)) as client:
-            response = client.post(
-                f"{self.validator.config.proxy.proxy_client_url}/get_credentials",
-                json={
-                    "postfix": (
-                        f":{self.validator.config.proxy.port}/validator_proxy"
-                        if self.validator.config.proxy.port
-                        else ""
-                    ),
-                    "uid": self.validator.uid,
-                },
-            )
+        response = self.validator.connection_pool.post(
+            f"{self.validator.config.proxy.proxy_client_url}/get_credentials",
+            json={
+                "postfix": (
+                    f":{self.validator.config.proxy.port}/validator_proxy"
+                    if self.validator.config.proxy.port
+                    else ""
+                ),
+                "uid": self.validator.uid,
+            },
+            timeout=30,
+        )
         response.raise_for_status()
         response = response.json()
         message = response["message"]
         signature = response["signature"]
         signature = base64.b64decode(signature)
-
-        def verify_credentials(public_key_bytes):
-            public_key = Ed25519PublicKey.from_public_bytes(public_key_bytes)
-            try:
-                public_key.verify(signature, message.encode("utf-8"))
-            except InvalidSignature:
-                raise Exception("Invalid signature")
-
-        self.verify_credentials = verify_credentials
+        self.credential_verifier.set_credentials(message.encode("utf-8"), signature)
 
     def start_server(self):
         self.executor = ThreadPoolExecutor(max_workers=1)
@@ -74,18 +89,32 @@ class ValidatorProxy:
             uvicorn.run, self.app, host="0.0.0.0", port=self.validator.config.proxy.port
         )
 
-    def authenticate_token(self, public_key_bytes):
-        public_key_bytes = base64.b64decode(public_key_bytes)
-        try:
-            self.verify_credentials(public_key_bytes)
-            bt.logging.info("Successfully authenticated token")
-            return public_key_bytes
-        except Exception as e:
-            print("Exception occured in authenticating token", e, flush=True)
-            print(traceback.print_exc(), flush=True)
+    def authenticate_token(self, token):
+        if not self.credential_verifier.verify_token(token):
+            bt.logging.warning("Rejected organic request with invalid token")
             raise HTTPException(
                 status_code=401, detail="Error getting authentication token"
             )
+        bt.logging.debug("Successfully authenticated token")
+
+    async def authorization_middleware(self, request: Request, call_next):
+        """
+        Authenticate requests carrying an `Authorization: Bearer <base64 key>`
+        header before the body is read. Requests without the header fall back
+        to the `authorization` field of the body.
+        """
+        header = request.headers.get("authorization")
+        if header is not None:
+            scheme, _, token = header.partition(" ")
+            token = token.strip() if scheme.lower() == "bearer" else header.strip()
+            if not self.credential_verifier.verify_token(token):
+                bt.logging.warning("Rejected organic request with invalid token")
+                return JSONResponse(
+                    status_code=401,
+                    content={"detail": "Error getting authentication token"},
+                )
+            request.state.authenticated = True
+        return await call_next(request)
 
     def organic_reward(self, synapse, response, uid, reward_url, timeout):
         if self.validator.offline_reward:
@@ -106,6 +135,7 @@ class ValidatorProxy:
                     [uid],
                     timeout,
                     self.validator.miner_manager,
+                    self.validator.connection_pool,
                 )
             bt.logging.info(
                 f"Proxy: Updating scores of miners {uids} with rewards {rewards}"
@@ -123,14 +153,16 @@ class ValidatorProxy:
             bt.logging.info(f"Organic reward: {rewards}")
             self.validator.miner_manager.update_scores(uids, rewards)
 
-    async def forward(self, data: dict = {}):
-        self.authenticate_token(data["authorization"])
+    async def forward(self, request: Request, data: dict = {}):
+        if not getattr(request.state, "authenticated", False):
+            self.authenticate_token(data["authorization"])
         payload = data.get("payload")
         if "recheck" in payload:
             bt.logging.info("Rechecking validators")
             self.get_credentials()
             return {"message": "done"}
         bt.logging.info("Received an organic request!")
+        start = time.time()
         if "seed" not in payload:
             payload["seed"] = random.randint(0, 1e9)
         model_name = payload["model_name"]
@@ -139,15 +171,41 @@ class ValidatorProxy:
         synapse = synapse_cls(**payload)
         synapse.limit_params()
 
+        response, source = await self.coalescer.run(
+            request_key(synapse), lambda: self.query_miners(model_name, synapse)
+        )
+        if source != "call":
+            bt.logging.info(f"Organic request served from {source} result")
+        self.proxy_counter.update(
+            is_success=response is not None,
+            model_name=model_name,
+            latency=time.time() - start,
+        )
+        if response is not None:
+            return response
+        else:
+            return HTTPException(status_code=500, detail="No valid response received")
+
+    async def query_miners(self, model_name, synapse):
+        """Query miners for an organic request; return the deserialized response or None."""
+        model_config = self.validator.nicheimage_catalogue[model_name]
         timeout = model_config["timeout"]
         reward_url = model_config["reward_url"]
 
         metagraph = self.validator.metagraph
+        hedge_config = {
+            "fanout": self.validator.config.proxy.fanout,
+            "max_hedges": self.validator.config.proxy.max_hedges,
+            "hedge_quantile": self.validator.config.proxy.hedge_quantile,
+            **model_config.get("proxy_hedge", {}),
+        }
+        policy = self.selection_policies.get(model_name)
+        hedge_delay = self.validator.adaptive_timeout.get_quantile(
+            model_name, hedge_config["hedge_quantile"]
+        )
 
-        output = None
-        for uid, should_reward in self.validator.query_queue.get_query_for_proxy(
-            model_name
-        ):
+        async def send(candidate):
+            uid, should_reward = candidate
             should_reward = (
                 should_reward
                 or random.random() < self.validator.config.proxy.checking_probability
@@ -168,10 +226,25 @@ class ValidatorProxy:
                 or metagraph.axons[uid]
             )
             bt.logging.info(f"Sending request to axon: {axon}")
-            responses = await self.dendrite.forward(
-                [axon], synapse, deserialize=False, timeout=timeout, run_async=True
-            )
-            response = responses[0]
+            dendrite = self.validator.connection_pool.get_dendrite()
+            if policy is not None:
+                policy.on_start(uid)
+            start = time.time()
+            response = None
+            try:
+                response = await dendrite.call(
+                    target_axon=axon,
+                    synapse=synapse.copy(),
+                    timeout=timeout,
+                    deserialize=False,
+                )
+            finally:
+                if policy is not None:
+                    policy.on_finish(
+                        uid,
+                        time.time() - start if response is not None else None,
+                        response is not None and response.is_success,
+                    )
             bt.logging.info(
                 f"Received response from miner {uid}, status: {response.is_success}"
             )
@@ -185,20 +258,25 @@ class ValidatorProxy:
                 response.dendrite.process_time if response.is_success else -1
             ]
             self.validator.miner_manager.update_metadata([uid], process_times)
-            if response.is_success:
-                output = response
-                break
-            else:
-                continue
-        if output:
-            self.proxy_counter.update(is_success=True)
-            self.proxy_counter.save()
-            response = output.deserialize_response()
             return response
-        else:
-            self.proxy_counter.update(is_success=False)
-            self.proxy_counter.save()
-            return HTTPException(status_code=500, detail="No valid response received")
+
+        winner = await hedged_request(
+            iter(self.validator.query_queue.get_query_for_proxy(model_name, policy)),
+            send,
+            lambda response: response.is_success,
+            model_name,
+            self.hedge_metrics,
+            fanout=hedge_config["fanout"],
+            hedge_delay=hedge_delay,
+            max_hedges=hedge_config["max_hedges"],
+        )
+        if winner is None:
+            return None
+        return winner[1].deserialize_response()
+
+    def log_stats(self):
+        self.hedge_metrics.log_stats()
+        self.coalescer.log_stats()
 
     async def get_self(self):
         return self
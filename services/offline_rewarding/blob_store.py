@@ -0,0 +1,225 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import os
+import time
+from io import BytesIO
+from PIL import Image
+import bittensor as bt
+
+REF_PREFIX = "blob:sha256:"
+
+
+def is_ref(value) -> bool:
+    return isinstance(value, str) and value.startswith(REF_PREFIX)
+
+
+def decode_image(data: bytes) -> Image.Image:
+    return Image.open(BytesIO(data)).convert("RGB")
+
+
+class BlobStore:
+    """
+    Content-addressed store for the images carried by the offline reward streams.
+
+    Base64 images are decoded once and stored as raw (already compressed PNG/JPEG) bytes
+    under their sha256, in Redis with a TTL or in `directory` (files older than `ttl`
+    are removed by `cleanup`). Messages carry `blob:sha256:<hex>` references instead, so
+    an image shared by `miner_data` and `all_miner_data`, or by several messages, is
+    stored once. Strings shorter than `min_size` or not valid base64 stay inline.
+
+    The Redis clients are read from `redis_client` at call time: `client` for the
+    blocking writers in validator threads, `async_client` for the reward loops.
+    """
+
+    def __init__(self, redis_client=None, directory=None, ttl=3600, min_size=1024):
+        self.redis_client = redis_client
+        self.directory = directory
+        self.ttl = ttl
+        self.min_size = min_size
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # inline_bytes: base64 replaced by references, ref_bytes: the references,
+        # sent_bytes: blob payloads written out, stored_bytes: of which new blobs
+        self.stats = {
+            "inline_bytes": 0,
+            "ref_bytes": 0,
+            "sent_bytes": 0,
+            "stored_bytes": 0,
+            "refs": 0,
+            "stored": 0,
+        }
+
+    def key(self, digest: str) -> str:
+        return REF_PREFIX + digest
+
+    def path(self, ref: str) -> str:
+        digest = ref[len(REF_PREFIX) :]
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def prepare(self, items, fields):
+        """
+        Replace large base64 `fields` of `items` (dicts, in place) with references.
+        Returns {ref: raw bytes} for the blobs to write.
+        """
+        blobs = {}
+        # The same image string usually appears several times (miner_data and all_miner_data)
+        refs = {}
+        for item in items:
+            for field in fields:
+                value = item.get(field)
+                if (
+                    not isinstance(value, str)
+                    or len(value) < self.min_size
+                    or is_ref(value)
+                ):
+                    continue
+                ref = refs.get(value)
+                if ref is None:
+                    try:
+                        data = base64.b64decode(value, validate=True)
+                    except (binascii.Error, ValueError):
+                        continue
+                    ref = self.key(hashlib.sha256(data).hexdigest())
+                    refs[value] = ref
+                    blobs[ref] = data
+                item[field] = ref
+                self.stats["inline_bytes"] += len(value)
+                self.stats["ref_bytes"] += len(ref)
+                self.stats["refs"] += 1
+        return blobs
+
+    def write_files(self, blobs):
+        created = []
+        for ref, data in blobs.items():
+            path = self.path(ref)
+            if os.path.exists(path):
+                # Same content: only refresh its age
+                os.utime(path)
+                created.append(False)
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            created.append(True)
+        self.count_stored(blobs, created)
+
+    def count_stored(self, blobs, created):
+        for (ref, data), is_new in zip(blobs.items(), created):
+            self.stats["sent_bytes"] += len(data)
+            if is_new:
+                self.stats["stored"] += 1
+                self.stats["stored_bytes"] += len(data)
+
+    def offload(self, items, fields):
+        """Blocking version of `offload_async`, for publishers running in validator threads."""
+        blobs = self.prepare(items, fields)
+        if not blobs:
+            return items
+        if self.directory:
+            self.write_files(blobs)
+            return items
+        pipe = self.redis_client.client.pipeline(transaction=False)
+        for ref, data in blobs.items():
+            # Written only if absent so identical images are counted once; the TTL is refreshed either way
+            pipe.set(ref, data, ex=self.ttl, nx=True)
+            pipe.expire(ref, self.ttl)
+        self.count_stored(blobs, pipe.execute()[::2])
+        return items
+
+    async def offload_async(self, items, fields):
+        blobs = self.prepare(items, fields)
+        if not blobs:
+            return items
+        if self.directory:
+            self.write_files(blobs)
+            return items
+        async with self.redis_client.async_client.pipeline(transaction=False) as pipe:
+            for ref, data in blobs.items():
+                pipe.set(ref, data, ex=self.ttl, nx=True)
+                pipe.expire(ref, self.ttl)
+            results = await pipe.execute()
+        self.count_stored(blobs, results[::2])
+        return items
+
+    async def get_many(self, refs):
+        """Fetch blobs with one MGET; returns {ref: bytes} for the refs that still exist."""
+        refs = list(dict.fromkeys(refs))
+        if not refs:
+            return {}
+        if self.directory:
+            blobs = {}
+            for ref in refs:
+                path = self.path(ref)
+                if os.path.exists(path):
+                    with open(path, "rb") as f:
+                        blobs[ref] = f.read()
+            return blobs
+        values = await self.redis_client.async_client.mget(refs)
+        return {ref: value for ref, value in zip(refs, values) if value is not None}
+
+    async def resolve(self, items, fields, decode=None):
+        """
+        Replace references in `fields` of `items` (in place) by their content: base64 strings
+        by default, or whatever `decode(bytes)` returns, computed once per distinct blob.
+        Missing blobs resolve to "".
+        """
+        refs = [
+            item.get(field)
+            for item in items
+            for field in fields
+            if is_ref(item.get(field))
+        ]
+        blobs = await self.get_many(refs)
+        if len(blobs) < len(set(refs)):
+            bt.logging.warning(
+                f"{len(set(refs)) - len(blobs)} image blobs expired before reward"
+            )
+        if decode:
+            # Image decoding is CPU bound, keep it off the event loop
+            decoded = await asyncio.to_thread(
+                lambda: {ref: decode(data) for ref, data in blobs.items()}
+            )
+        else:
+            decoded = {
+                ref: base64.b64encode(data).decode("utf-8")
+                for ref, data in blobs.items()
+            }
+        for item in items:
+            for field in fields:
+                if is_ref(item.get(field)):
+                    item[field] = decoded.get(item[field], "")
+        return items
+
+    def cleanup(self):
+        """Remove blobs older than the TTL from the disk store; Redis expires them by itself."""
+        if not self.directory:
+            return 0
+        removed = 0
+        deadline = time.time() - self.ttl
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) < deadline:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def summary(self) -> dict:
+        stats = dict(self.stats)
+        saved = stats["inline_bytes"] - stats["ref_bytes"] - stats["sent_bytes"]
+        stats["saved_bytes"] = saved
+        stats["saved_ratio"] = round(saved / max(stats["inline_bytes"], 1), 3)
+        return stats
+
+    def log_stats(self):
+        bt.logging.info(f"Image blob store stats: {self.summary()}")
+        removed = self.cleanup()
+        if removed:
+            bt.logging.info(f"Removed {removed} expired image blobs")
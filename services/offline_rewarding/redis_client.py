@@ -1,13 +1,27 @@
 import redis
-import json, time
+import redis.asyncio
+import json, time, os, socket
 from urllib.parse import urlparse
 import bittensor as bt
+from services.offline_rewarding.blob_store import BlobStore
 
 class RedisClient():
     """ A client class to interact with Redis, allowing for publishing, reading,
     and managing messages in streams. This is useful for systems that require message
-    queuing, processing, and real-time data handling."""
-    def __init__(self, host=None, port=None, url=None, db=0):
+    queuing, processing, and real-time data handling.
+
+    Streams are consumed through a consumer group, so several reward workers can share
+    a stream and each message is delivered to one of them. A message stays pending until
+    it is acknowledged; messages left pending for `claim_idle_ms` (not processable yet,
+    or owned by a worker that died) are reclaimed with XAUTOCLAIM and retried.
+
+    `client` is a blocking client for publishing from validator threads. Stream consumption
+    and the validator response cache go through `async_client`, a redis.asyncio client on
+    a connection pool, so the reward loops never block their event loop on Redis.
+
+    Images in stream messages are replaced by references into `blob_store`, kept in Redis
+    or, with `blob_dir`, on local disk for `blob_ttl` seconds."""
+    def __init__(self, host=None, port=None, url=None, db=0, group_name="reward_workers", consumer_name=None, claim_idle_ms=10000, max_connections=16, blob_dir=None, blob_ttl=3600):
         """
         Initializes the Redis client with given host, port, and database.
         If a URL is provided, it overrides host and port settings.
@@ -18,23 +32,94 @@ class RedisClient():
             port = parsed_url.port
             
         self.client = redis.Redis(host=host, port=port, db=db)
+        self.async_client = redis.asyncio.Redis(
+            connection_pool=redis.asyncio.ConnectionPool(host=host, port=port, db=db, max_connections=max_connections)
+        )
         self.reward_stream_name = "synapse_data"
         self.base_synapse_stream_name = "base_synapse"
         self.max_queue_size = 200
         self.count_success = {}
 
+        self.group_name = group_name
+        self.consumer_name = consumer_name or f"{socket.gethostname()}-{os.getpid()}"
+        self.claim_idle_ms = claim_idle_ms
+        self.groups = set()
+        self.claim_cursors = {}
+        self.blob_store = BlobStore(self, directory=blob_dir, ttl=blob_ttl)
+
+    async def ensure_group(self, stream_name):
+        """Create the consumer group (and the stream) if needed, starting from the oldest message."""
+        if stream_name in self.groups:
+            return
+        try:
+            await self.async_client.xgroup_create(stream_name, self.group_name, id="0", mkstream=True)
+        except redis.exceptions.ResponseError as ex:
+            if "BUSYGROUP" not in str(ex):
+                raise
+        self.groups.add(stream_name)
+
     def publish_to_stream(self, stream_name, message):
         message_id = self.client.xadd(stream_name, message)
         bt.logging.info(f"Published {stream_name} message ID: {message_id}")
         return message_id
 
-    def read_from_stream(self, stream_name, count, block):
-        messages = self.client.xread({stream_name: '0-0'}, count=count, block=block)  # read $count messages, block for $block miliseconds if no messages
-        return messages
-    
-    def remove_from_stream(self, stream_name, message_id):
-        self.client.xdel(stream_name, message_id)
-        bt.logging.info(f"Removed {stream_name} message ID: {message_id}")
+    def publish_base_synapse(self, data):
+        """Publish a base synapse for validator response generation, its images go to the blob store."""
+        self.blob_store.offload([data], ["image", "conditional_image"])
+        return self.publish_to_stream(self.base_synapse_stream_name, {"data": json.dumps(data)})
+
+    async def claim_pending(self, stream_name, count):
+        """Take over messages that stayed unacknowledged for `claim_idle_ms`, walking the pending list with a cursor."""
+        cursor = self.claim_cursors.get(stream_name, "0-0")
+        result = await self.async_client.xautoclaim(stream_name, self.group_name, self.consumer_name, self.claim_idle_ms, start_id=cursor, count=count)
+        next_cursor, messages = result[0], result[1]
+        self.claim_cursors[stream_name] = next_cursor
+        # Entries trimmed from the stream while pending come back without data, drop them from the pending list
+        deleted_ids = [message_id for message_id, message_data in messages if not message_data]
+        if deleted_ids:
+            await self.async_client.xack(stream_name, self.group_name, *deleted_ids)
+        return [(message_id, message_data) for message_id, message_data in messages if message_data]
+
+    async def read_from_stream(self, stream_name, count, block):
+        """Read up to $count messages: reclaimed pending ones first, then new ones, blocking for $block miliseconds if there are none."""
+        await self.ensure_group(stream_name)
+        messages = await self.claim_pending(stream_name, count)
+        if len(messages) < count:
+            new_messages = await self.async_client.xreadgroup(self.group_name, self.consumer_name, {stream_name: '>'}, count=count - len(messages), block=None if messages else block)
+            for _, message_list in new_messages or []:
+                messages.extend(message_list)
+        if not messages:
+            return []
+        return [(stream_name, messages)]
+
+    async def ack_messages(self, stream_name, message_ids, delete=True):
+        """Acknowledge (and delete) messages with one pipelined round trip."""
+        if not message_ids:
+            return
+        async with self.async_client.pipeline(transaction=False) as pipe:
+            pipe.xack(stream_name, self.group_name, *message_ids)
+            if delete:
+                pipe.xdel(stream_name, *message_ids)
+            await pipe.execute()
+        bt.logging.debug(f"Acknowledged {len(message_ids)} {stream_name} messages")
+
+    async def remove_from_stream(self, stream_name, message_id):
+        await self.ack_messages(stream_name, [message_id])
+
+    async def set_cache_many(self, values, ttl):
+        """Set several {key: value} with a TTL in one pipelined round trip."""
+        if not values:
+            return
+        async with self.async_client.pipeline(transaction=False) as pipe:
+            for key, value in values.items():
+                pipe.set(key, value, ex=ttl)
+            await pipe.execute()
+
+    async def get_cache_many(self, keys):
+        """Fetch several cached values with one MGET; missing keys give None."""
+        if not keys:
+            return []
+        return await self.async_client.mget(keys)
 
     def decode_message_stream(self, message_data):
         output = {}
@@ -45,7 +130,8 @@ class RedisClient():
     def get_stream_info(self, stream_name, is_clear = False):
         bt.logging.info(f"Num success messages: {self.count_success}")
         count = self.client.xlen(stream_name)
-        bt.logging.info(f"Number of messages remain in {stream_name} stream: {count}.")
+        pending = self.client.xpending(stream_name, self.group_name)["pending"] if stream_name in self.groups else 0
+        bt.logging.info(f"Number of messages remain in {stream_name} stream: {count}, pending: {pending}.")
         if is_clear:
             self.client.xtrim(stream_name, maxlen=0)
             bt.logging.info(f"Clear stream {stream_name} done !")
@@ -70,13 +156,14 @@ class RedisClient():
         Handles message decoding, acknowledgment
         """
         while True:
-            messages = self.read_from_stream(stream_name, count, block)
+            messages = await self.read_from_stream(stream_name, count, block)
 
             if not messages:
                 bt.logging.info("No new messages. Waiting for more...")
                 continue
 
             all_messages = []
+            received_ids = []
             for stream, message_list in messages:
                 for message_id, message_data in message_list:
                     if decode:
@@ -86,16 +173,16 @@ class RedisClient():
                         "content": message_data,
                         "id": message_id.decode('utf-8')
                     })
-                    if always_ack:
-                        self.remove_from_stream(stream_name, message_id)
-            
+                    received_ids.append(message_id)
+            if always_ack:
+                await self.ack_messages(stream_name, received_ids)
+
             try:
                 success_message_ids, error_message_ids, meta  = await process_callback(all_messages)
                 if len(success_message_ids) > 0:
                     self.update_meta_success(stream_name, meta)
                     bt.logging.info(f"Count success:  {self.count_success}")
                     if not  always_ack:
-                        for message_id in success_message_ids:
-                            self.remove_from_stream(stream_name, message_id)
+                        await self.ack_messages(stream_name, success_message_ids)
             except Exception as ex:
                 bt.logging.error(f"Exception process message in stream: {str(ex)}")
\ No newline at end of file
@@ -2,10 +2,12 @@ import yaml
 from services.rays.image_generating import ModelDeployment
 from image_generation_subnet.protocol import ImageGenerating
 from image_generation_subnet.validator import get_challenge, add_time_penalty
+import asyncio
 import hashlib
 import time, json, os, copy
-import requests
+import httpx
 from services.offline_rewarding.redis_client import RedisClient
+from services.offline_rewarding.blob_store import decode_image
 from services.rewarding.cosine_similarity_compare import CosineSimilarityReward
 import bittensor as bt
 
@@ -35,6 +37,7 @@ class RewardApp():
         
         self.validator = validator
         self.redis_client: RedisClient = self.validator.redis_client
+        self.blob_store = self.redis_client.blob_store
 
         self.reward_stream_name = self.redis_client.reward_stream_name
         self.base_synapse_stream_name = self.redis_client.base_synapse_stream_name
@@ -48,39 +51,38 @@ class RewardApp():
             os.makedirs(self.log_validator_response_dir)
 
         self.reward_endpoint = self.validator.config.offline_reward.validator_endpoint
+        self.batch_size = self.validator.config.offline_reward.batch_size
+        self.max_in_flight = self.validator.config.offline_reward.max_in_flight
+        self.request_timeout = self.validator.config.offline_reward.request_timeout
+        self.http_client = None
         self.current_model = None
 
         self.total_uids = []
         self.total_rewards = []
 
-    def save_log_validator(self, key, value):
+    async def save_log_validators(self, values):
+        """Cache {key: base synapse with validator response}, in one pipelined round trip for Redis."""
         if self.log_validator_response_engine == "redis":
-            self.redis_client.client.set(key, json.dumps(value))
-            self.redis_client.client.expire(key, self.redis_key_ttl)
+            await self.redis_client.set_cache_many({key: json.dumps(value) for key, value in values.items()}, self.redis_key_ttl)
         else:
-            save_path = os.path.join(self.log_validator_response_dir, f'{key}.json')
-            with open(save_path , 'w') as f:
-                json.dump(value, f, ensure_ascii =False)
-    
-    def get_log_validator(self, key):
-        if self.log_validator_response_engine == "redis":
-            data_str = self.redis_client.client.get(key)
-            data = json.loads(data_str)
-        else:
-            save_path = os.path.join(self.log_validator_response_dir, f'{key}.json')
-            with open(save_path) as f:
-                data = json.load(f)
-        return data
-
-    def check_exists_log(self, key):
+            for key, value in values.items():
+                save_path = os.path.join(self.log_validator_response_dir, f'{key}.json')
+                with open(save_path , 'w') as f:
+                    json.dump(value, f, ensure_ascii =False)
+
+    async def get_log_validators(self, keys):
+        """Return {key: cached base synapse} for the keys that have a cached validator response."""
+        keys = list(dict.fromkeys(keys))
         if self.log_validator_response_engine == "redis":
-            if  self.redis_client.client.exists(key):
-                return True
-        else:
+            values = await self.redis_client.get_cache_many(keys)
+            return {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+        data = {}
+        for key in keys:
             save_path = os.path.join(self.log_validator_response_dir, f'{key}.json')
             if os.path.exists(save_path):
-                return True
-        return False
+                with open(save_path) as f:
+                    data[key] = json.load(f)
+        return data
 
     def get_base_synapse_hashid(self, base_synapse):
         dt = copy.deepcopy(base_synapse)
@@ -89,20 +91,59 @@ class RewardApp():
         return hash_id
 
     
-    def get_challenge_result(self, model_name, base_synapse):
+    async def get_challenge_results(self, model_name, base_synapses):
+        """
+        Generate validator responses for several base synapses of one model with a single
+        request to the validator endpoint. Returns one base64 image per base synapse.
+        """
         if model_name in ["GoJourney","DallE"]:
-            return None
+            return [None] * len(base_synapses)
+        if self.http_client is None:
+            self.http_client = httpx.AsyncClient(timeout=httpx.Timeout(self.request_timeout, connect=8))
         req = {
             "model_name": model_name,
-            "prompts": [base_synapse],
+            "prompts": base_synapses,
         }
-        response = requests.post(self.reward_endpoint, json = req)
+        response = await self.http_client.post(self.reward_endpoint, json = req)
         if response.status_code != 200:
-            bt.logging.error(f"Error in get_challenge_result: {response.text}")
-            result = None
-        else:
-            result = response.json()[0]["image"] # for image models, not implement for text
-        return result
+            raise Exception(f"Validator endpoint returned {response.status_code}: {response.text}")
+        outputs = response.json()
+        if len(outputs) != len(base_synapses):
+            raise Exception(f"Validator endpoint returned {len(outputs)} results for {len(base_synapses)} prompts")
+        return [output.get("image") for output in outputs] # for image models, not implement for text
+
+    async def generate_validator_responses(self, model_name, base_synapses):
+        """
+        Batching stage: send the base synapses in requests of up to `batch_size` prompts,
+        with at most `max_in_flight` requests outstanding so the endpoint always has the next
+        batch queued, and cache each batch's validator responses as soon as it returns.
+        Returns {hash_id: cached base synapse} for the ones that were generated.
+        """
+        pending = list({x["hash_id"]: x for x in base_synapses}.values())
+        if not pending:
+            return {}
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        async def run_batch(batch):
+            async with semaphore:
+                prompts = [copy.deepcopy(x) for x in batch]
+                await self.blob_store.resolve(prompts, ["image", "conditional_image"])
+                images = await self.get_challenge_results(model_name, prompts)
+                self.current_model = model_name
+            for base_synapse, image in zip(batch, images):
+                base_synapse["validator_response"] = image
+            await self.blob_store.offload_async(batch, ["validator_response"])
+            await self.save_log_validators({x["hash_id"]: x for x in batch})
+            return batch
+
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        generated = {}
+        for result in await asyncio.gather(*[run_batch(batch) for batch in batches], return_exceptions=True):
+            if isinstance(result, Exception):
+                bt.logging.error(f"[ERROR] generate_response fail for {model_name}: {str(result)}")
+                continue
+            generated.update({x["hash_id"]: x for x in result})
+        return generated
 
     def group_synapse_by_model(self, data):
         data_group_by_model = {}
@@ -115,22 +156,16 @@ class RewardApp():
 
         return data_group_by_model
 
-    async def generate_response(self, base_synapses, model_name):
-        success_ids, error_ids = [], []
-        for base_synapse in base_synapses:
-            raw_message_id = copy.deepcopy(base_synapse["message_id"])
-            try:
-                hash_id = base_synapse["hash_id"]
-                if not self.check_exists_log(hash_id):
-                    base_synapse["validator_response"] = self.get_challenge_result(model_name, base_synapse)
-                    self.current_model = model_name
-                    self.save_log_validator(hash_id, base_synapse)
-                else:
-                    base_synapse = self.get_log_validator(hash_id)
-                success_ids.append(raw_message_id)
-            except Exception as ex:
-                bt.logging.error(f"[ERROR] generate_response fail: {str(ex)}")
-                error_ids.append(raw_message_id)
+    async def generate_response(self, base_synapses, model_name, cached=None):
+        """Cache validator responses for base synapses that have none; `cached` is a lookup already done for them."""
+        if cached is None:
+            cached = await self.get_log_validators([x["hash_id"] for x in base_synapses])
+        cached = dict(cached)
+        cached.update(
+            await self.generate_validator_responses(model_name, [x for x in base_synapses if x["hash_id"] not in cached])
+        )
+        success_ids = [x["message_id"] for x in base_synapses if x["hash_id"] in cached]
+        error_ids = [x["message_id"] for x in base_synapses if x["hash_id"] not in cached]
         return success_ids, error_ids
     
     def group_miner_data_by_model(self, data):
@@ -146,31 +181,27 @@ class RewardApp():
     async def generate_image_response(self, synapse_info, model_name, generate_if_not_exist = False):
         success_ids, not_processed_ids = [], []
         success_synapses = []
+        for synapse in synapse_info:
+            if len(synapse["valid_uids"]) > 0:
+                synapse["base_data"]["hash_id"] = self.get_base_synapse_hashid(synapse["base_data"])
+        cached = await self.get_log_validators(
+            [x["base_data"]["hash_id"] for x in synapse_info if len(x["valid_uids"]) > 0]
+        )
+        if generate_if_not_exist:
+            cached.update(
+                await self.generate_validator_responses(
+                    model_name,
+                    [x["base_data"] for x in synapse_info if len(x["valid_uids"]) > 0 and x["base_data"]["hash_id"] not in cached],
+                )
+            )
         for synapse in synapse_info:
             raw_message_id = copy.deepcopy(synapse["message_id"])
             if len(synapse["valid_uids"]) > 0:
                 base_synapse = synapse["base_data"]
-                base_synapse["hash_id"] = self.get_base_synapse_hashid(base_synapse)
-                if not self.check_exists_log(base_synapse["hash_id"]):
-                    if generate_if_not_exist:
-                        try:
-                            base64_image = self.get_challenge_result(model_name, base_synapse)
-                            self.current_model = model_name
-                            synapse["validator_response"] = base64_image
-                            base_synapse["validator_response"] = base64_image
-                            self.save_log_validator(base_synapse["hash_id"], base_synapse)
-
-                            success_ids.append(raw_message_id)
-                            success_synapses.append(synapse)
-                        except Exception as ex:
-                            bt.logging.error(f"Genereate response error: {str(ex)}")
-                            not_processed_ids.append(raw_message_id)
-                    else:
-                        not_processed_ids.append(raw_message_id)
-                    
+                if base_synapse["hash_id"] not in cached:
+                    not_processed_ids.append(raw_message_id)
                 else:
-                    base_synapse = self.get_log_validator(base_synapse["hash_id"])
-                    synapse["validator_response"] = base_synapse["validator_response"]
+                    synapse["validator_response"] = cached[base_synapse["hash_id"]]["validator_response"]
 
                     success_ids.append(raw_message_id)
                     success_synapses.append(synapse)
@@ -230,9 +261,20 @@ class RewardApp():
         return sorted_model_names
 
 
+    async def resolve_reward_images(self, data):
+        """Fetch the miner and validator images of the messages to reward and decode each distinct one once."""
+        items = []
+        for info in data:
+            if len(info["valid_uids"]) > 0:
+                items.append(info)
+                items.extend(info["miner_data"])
+        await self.blob_store.resolve(items, ["image", "validator_response"], decode=decode_image)
+
     async def reward_image_type(self, data, model_name):
         data_with_validator_response, success_ids, not_processed_ids = await self.generate_image_response(data, model_name)    
-        total_uids, total_rewards = self.calculate_rewards(data_with_validator_response)
+        await self.resolve_reward_images(data_with_validator_response)
+        # Scoring is CPU/GPU bound, keep it off the event loop shared with the other stream
+        total_uids, total_rewards = await asyncio.to_thread(self.calculate_rewards, data_with_validator_response)
         return {
             "total_uids": total_uids,
             "total_rewards": total_rewards,
@@ -253,8 +295,13 @@ class RewardApp():
 
             elif reward_type == "custom_offline" and callable(reward_url):
                 for d in data:
-                    d_uids, d_rewards = reward_url(
-                        ImageGenerating(**d["base_data"]), [ImageGenerating(**synapse) for synapse in d["all_miner_data"]], d["uids"]
+                    await self.blob_store.resolve([d["base_data"]] + d["all_miner_data"], ["image", "conditional_image"])
+                    # Custom rewards make blocking HTTP calls per miner, keep them off the event loop shared with the other stream
+                    d_uids, d_rewards = await asyncio.to_thread(
+                        reward_url,
+                        ImageGenerating(**d["base_data"]),
+                        [ImageGenerating(**synapse) for synapse in d["all_miner_data"]],
+                        d["uids"],
                     )
                     reward_uids.extend(d_uids)
                     rewards.extend(d_rewards)
@@ -313,21 +360,34 @@ class RewardApp():
             data_group_by_model = self.group_synapse_by_model(base_synapses)
             priority_models = self.get_priority_of_model(data_group_by_model)
 
+            # Cache lookups for every model start now and finish while the endpoint works on
+            # the first ones. Models are generated one after another, the endpoint holds one model at a time.
+            lookups = {
+                model_name: asyncio.ensure_future(
+                    self.get_log_validators([x["hash_id"] for x in data_group_by_model[model_name]])
+                )
+                for model_name in priority_models
+            }
             total_success_ids, total_error_ids = [], []
             for model_name in priority_models:
-                if model_name not in meta:
-                    meta["count_success"][model_name] = 0
-                if model_name in data_group_by_model:
-                    success_ids, error_ids = await self.generate_response(data_group_by_model[model_name], model_name)
-                    total_success_ids.extend(success_ids)
-                    total_error_ids.extend(error_ids)
-                    meta["count_success"][model_name]+= len(success_ids)
-                    break
-            
+                success_ids, error_ids = await self.generate_response(
+                    data_group_by_model[model_name], model_name, cached=await lookups[model_name]
+                )
+                total_success_ids.extend(success_ids)
+                total_error_ids.extend(error_ids)
+                meta["count_success"][model_name] = len(success_ids)
+
             return total_success_ids, total_error_ids, meta
         
         await self.redis_client.process_message_from_stream_async(self.base_synapse_stream_name, generate_validator_response, count=1000)    
 
+    async def run(self):
+        """Run both stream consumers as concurrent tasks on the current event loop."""
+        await asyncio.gather(
+            self.dequeue_base_synapse_message(),
+            self.dequeue_reward_message(),
+        )
+
     def show_total_uids_and_rewards(self):
         bt.logging.info(f"Total_uids (len = {len(self.total_uids)}; len distinct = {len(list(set(self.total_uids)))}): {self.total_uids}")
         bt.logging.info(f"Total rewards (len={len(self.total_rewards)}): {self.total_rewards}")
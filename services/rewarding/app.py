@@ -14,6 +14,9 @@ from functools import partial
 from services.rewarding.cosine_similarity_compare import CosineSimilarityReward
 from services.rewarding.open_category_reward import OpenCategoryReward
 import asyncio
+import hashlib
+import json
+from collections import OrderedDict
 from services.owner_api_core import define_allowed_ips, filter_allowed_ips, limiter
 from prometheus_fastapi_instrumentator import Instrumentator
 
@@ -91,6 +94,12 @@ def get_args():
         type=float,
         default=0.2,
     )
+    parser.add_argument(
+        "--validator_output_cache_size",
+        type=int,
+        default=16,
+        help="Number of recent challenges whose validator output is kept for later reward requests.",
+    )
 
     args = parser.parse_args()
     return args
@@ -144,11 +153,35 @@ class FixedCategoryRewardApp(BaseRewardApp):
         super().__init__(args)
         self.rewarder = CosineSimilarityReward()
         self.model_handle = model_handle
+        self.validator_outputs = OrderedDict()
+        self.validator_output_cache_size = max(args.validator_output_cache_size, 1)
+
+    async def generate_validator_image(self, base_data: Prompt):
+        """
+        Validator output of a challenge. The responses of one challenge group are rewarded
+        in several requests as they arrive, all with the same seeded `base_data`: the first
+        one starts the generation, the others wait for it or reuse its result.
+        """
+        key = hashlib.sha256(
+            json.dumps(base_data.dict(), sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        task = self.validator_outputs.get(key)
+        if task is None or (task.done() and (task.cancelled() or task.exception())):
+            task = asyncio.ensure_future(
+                self.model_handle.generate.remote(prompt_data=base_data)
+            )
+            self.validator_outputs[key] = task
+            while len(self.validator_outputs) > self.validator_output_cache_size:
+                self.validator_outputs.popitem(last=False)
+        else:
+            self.validator_outputs.move_to_end(key)
+        # Shielded so a cancelled request does not cancel the generation the others wait for.
+        return await asyncio.shield(task)
 
     async def __call__(self, reward_request: RewardRequest):
         base_data = reward_request.base_data
         miner_data = reward_request.miner_data
-        validator_image = await self.model_handle.generate.remote(prompt_data=base_data)
+        validator_image = await self.generate_validator_image(base_data)
         miner_images = [d.image for d in miner_data]
         rewards = self.rewarder.get_reward(
             validator_image, miner_images, base_data.pipeline_type
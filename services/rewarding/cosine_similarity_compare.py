@@ -1,3 +1,5 @@
+import hashlib
+from collections import OrderedDict
 import timm
 import torch.nn.functional as F
 import torch.nn as nn
@@ -5,18 +7,51 @@ from PIL import Image
 import torch
 from typing import List
 from generation_models.utils import base64_to_pil_image
-import imagehash
-import numpy as np
-from skimage.metrics import peak_signal_noise_ratio as psnr
-from skimage.metrics import structural_similarity as ssim
+from services.rewarding.hash_compare import average_hashes, hamming_distances, nsfw_filter_batch
+from services.rewarding.upscale_metrics import psnr_ssim
+
+
+DTYPES = {"fp16": torch.float16, "bf16": torch.bfloat16}
 
 
 class CosineSimilarityReward(nn.Module):
+    """
+    Rewards miner images by the cosine similarity of their ViT embedding to the
+    validator image's embedding.
+
+    `get_reward` embeds the validator image and every decodable miner image in one
+    batched pass (chunks of `max_batch_size`); validator embeddings are cached for the
+    last `embedding_cache_size` validator images. `dtype` ("fp16" or "bf16") and
+    `channels_last` select a reduced precision / memory layout path; fp16 needs CUDA.
+
+    Before the model, `fast_path` gives reward 1.0 to miner images whose pixels are identical
+    to the validator's (same digest as the embedding cache), which the model would score 1.0
+    too. `fast_path_max_distance` also accepts average hashes of `fast_path_hash_size` within
+    that many bits; off by default, as it changes rewards: such a near pair gets 1.0 where the
+    model may score it below the threshold. Only the remaining pairs are embedded.
+
+    Upscale rewards compare grayscale PSNR/SSIM of all miner images against the validator
+    image in batches of `upscale_batch_size` on `device`. `upscale_n_tiles` evaluates only
+    that many random `upscale_tile_size` tiles per request instead of the whole image (see
+    `upscale_metrics.psnr_ssim` for the error this adds).
+    """
+
     def __init__(
         self,
         model_name="vit_base_patch16_clip_384.laion2b_ft_in12k_in1k",
         threshold=0.9,
         device=None,
+        dtype=None,
+        channels_last=False,
+        max_batch_size=16,
+        embedding_cache_size=32,
+        pretrained=True,
+        fast_path=True,
+        fast_path_hash_size=16,
+        fast_path_max_distance=None,
+        upscale_batch_size=4,
+        upscale_tile_size=256,
+        upscale_n_tiles=None,
     ):
         super(CosineSimilarityReward, self).__init__()
         if not device:
@@ -25,34 +60,99 @@ class CosineSimilarityReward(nn.Module):
             self.device = device
 
         self.threshold = threshold
-        self.model, self.transforms = self.get_model(model_name)
+        self.dtype = DTYPES.get(dtype, torch.float32)
+        if self.dtype == torch.float16 and not str(self.device).startswith("cuda"):
+            print("fp16 is not supported on CPU, using fp32", flush=True)
+            self.dtype = torch.float32
+        self.memory_format = torch.channels_last if channels_last else torch.contiguous_format
+        self.max_batch_size = max_batch_size
+        self.embedding_cache_size = embedding_cache_size
+        self.embedding_cache = OrderedDict()
+        self.fast_path = fast_path
+        self.fast_path_hash_size = fast_path_hash_size
+        self.fast_path_max_distance = fast_path_max_distance
+        self.match_stats = {"exact": 0, "perceptual": 0, "model": 0}
+        self.upscale_batch_size = upscale_batch_size
+        self.upscale_tile_size = upscale_tile_size
+        self.upscale_n_tiles = upscale_n_tiles
+        self.model, self.transforms = self.get_model(model_name, pretrained)
 
-    def get_model(self, model_name):
-        model = timm.create_model(model_name, pretrained=True, num_classes=0)
+    def get_model(self, model_name, pretrained=True):
+        model = timm.create_model(model_name, pretrained=pretrained, num_classes=0)
         model.eval()
-        model.to(self.device)
+        model.to(self.device, dtype=self.dtype, memory_format=self.memory_format)
         data_config = timm.data.resolve_model_data_config(model)
         transforms = timm.data.create_transform(**data_config, is_training=False)
         return model, transforms
 
+    @torch.inference_mode()
+    def embed(self, images: List[Image.Image]) -> torch.Tensor:
+        """L2-normalized fp32 embeddings of `images`, `max_batch_size` images per forward pass."""
+        embeddings = []
+        for i in range(0, len(images), self.max_batch_size):
+            batch = torch.stack([self.transforms(image) for image in images[i : i + self.max_batch_size]])
+            batch = batch.to(self.device, dtype=self.dtype, memory_format=self.memory_format)
+            embeddings.append(F.normalize(self.model(batch).float(), dim=-1))
+        return torch.cat(embeddings)
+
+    def get_cache_key(self, image: Image.Image) -> str:
+        return hashlib.sha1(image.tobytes()).hexdigest() + str(image.size)
+
+    def similarities(self, validator_image: Image.Image, miner_images: List[Image.Image]) -> List[float]:
+        """Cosine similarity of each miner image to the validator image, in one batched pass."""
+        key = self.get_cache_key(validator_image)
+        validator_vec = self.embedding_cache.get(key)
+        if validator_vec is None:
+            embeddings = self.embed([validator_image] + miner_images)
+            validator_vec, miner_vecs = embeddings[:1], embeddings[1:]
+            self.embedding_cache[key] = validator_vec
+            while len(self.embedding_cache) > self.embedding_cache_size:
+                self.embedding_cache.popitem(last=False)
+        else:
+            self.embedding_cache.move_to_end(key)
+            miner_vecs = self.embed(miner_images) if miner_images else validator_vec[:0]
+        return (miner_vecs @ validator_vec.T).squeeze(-1).tolist()
+
+    def fast_path_filter(self, validator_image: Image.Image, miner_images: List[Image.Image]) -> List[bool]:
+        """Per miner image, True when the pair is a match without running the model (see the class docstring)."""
+        validator_key = self.get_cache_key(validator_image)
+        matched = [self.get_cache_key(image) == validator_key for image in miner_images]
+        self.match_stats["exact"] += sum(matched)
+        if self.fast_path_max_distance is not None:
+            candidates = [
+                i for i, image in enumerate(miner_images) if not matched[i] and image.size == validator_image.size
+            ]
+            if candidates:
+                hashes = average_hashes(
+                    [validator_image] + [miner_images[i] for i in candidates], hash_size=self.fast_path_hash_size
+                )
+                distances = hamming_distances(hashes[1:], hashes[0])
+                for i, distance in zip(candidates, distances.tolist()):
+                    if distance <= self.fast_path_max_distance:
+                        matched[i] = True
+                        self.match_stats["perceptual"] += 1
+        return matched
+
+    def similarity_to_reward(self, cosine_similarity: float) -> float:
+        if cosine_similarity > self.threshold:
+            return 1.0
+        if cosine_similarity > 0.4:
+            return (cosine_similarity + (1 - self.threshold)) ** 3
+        return 0.0
+
     @torch.inference_mode()
     def forward(
         self, validator_image: Image.Image, miner_image: Image.Image, binary=True
     ) -> float:
         validator_vec = self.model(
-            self.transforms(validator_image).unsqueeze(0).to(self.device)
+            self.transforms(validator_image).unsqueeze(0).to(self.device, dtype=self.dtype, memory_format=self.memory_format)
         )
         image_vec = self.model(
-            self.transforms(miner_image).unsqueeze(0).to(self.device)
+            self.transforms(miner_image).unsqueeze(0).to(self.device, dtype=self.dtype, memory_format=self.memory_format)
         )
-        cosine_similarity = F.cosine_similarity(validator_vec, image_vec)
+        cosine_similarity = F.cosine_similarity(validator_vec.float(), image_vec.float())
         if binary:
-            if cosine_similarity.item() > self.threshold:
-                reward = 1.0
-            elif cosine_similarity.item() > 0.4:
-                reward = (cosine_similarity.item() + (1 - self.threshold)) ** 3
-            else:
-                reward = 0.0
+            reward = self.similarity_to_reward(cosine_similarity.item())
 
             print(f"Sim: {cosine_similarity.item()} -> reward: {reward}")
             return reward
@@ -65,39 +165,50 @@ class CosineSimilarityReward(nn.Module):
         batched_miner_images: List[str],
         pipeline_type: str,
     ) -> List[float]:
-        rewards = []
+        rewards = [False] * len(batched_miner_images)
         if not isinstance(validator_image, Image.Image):
             validator_image = base64_to_pil_image(validator_image)
-        for miner_image in batched_miner_images:
+        decoded = {}
+        for i, miner_image in enumerate(batched_miner_images):
             if not miner_image:
-                reward = False
+                continue
+            try:
+                if not isinstance(miner_image, Image.Image):
+                    miner_image = base64_to_pil_image(miner_image)
+                decoded[i] = miner_image
+            except Exception:
+                print("Corrupted miner image", flush=True)
+        indices = list(decoded)
+        nsfw_checks = nsfw_filter_batch(validator_image, [decoded[i] for i in indices])
+        # Images left to score by similarity (or PSNR/SSIM for upscale), as (index in rewards, image)
+        candidates = []
+        for i, nsfw_check in zip(indices, nsfw_checks):
+            if nsfw_check:
+                rewards[i] = -5 if nsfw_check == 2 else 0
             else:
-                try:
-                    if not isinstance(miner_image, Image.Image):
-                        miner_image = base64_to_pil_image(miner_image)
-                except Exception:
-                    print("Corrupted miner image", flush=True)
-                    reward = False
-                    rewards.append(reward)
-                    continue
-                nsfw_check = self.nsfw_filter(validator_image, miner_image)
-                if nsfw_check:
-                    reward = -5 if nsfw_check == 2 else 0
+                candidates.append((i, decoded[i]))
+        if pipeline_type == "upscale":
+            upscale_rewards = self.calculate_rewards_upscale(validator_image, [image for _, image in candidates])
+            for (i, _), reward in zip(candidates, upscale_rewards):
+                rewards[i] = reward
+            return rewards
+        to_match = candidates
+        if self.fast_path and candidates:
+            matched = self.fast_path_filter(validator_image, [image for _, image in candidates])
+            to_match = []
+            for (i, image), is_match in zip(candidates, matched):
+                if is_match:
+                    rewards[i] = 1.0
                 else:
-                    if pipeline_type == "upscale":
-                        reward = self.calculate_reward_upscale(
-                            miner_image, validator_image
-                        )
-                    else:
-                        reward = self.matching_image(miner_image, validator_image)
-
-            rewards.append(reward)
+                    to_match.append((i, image))
+        if to_match:
+            self.match_stats["model"] += len(to_match)
+            sims = self.similarities(validator_image, [image for _, image in to_match])
+            for (index, _), sim in zip(to_match, sims):
+                rewards[index] = self.similarity_to_reward(sim)
+            print(f"Sims: {sims} -> rewards: {[rewards[index] for index, _ in to_match]}", flush=True)
         return rewards
 
-    def get_black_hash(self, H, W) -> str:
-        image = Image.new("RGB", (W, H), color="black")
-        return str(imagehash.average_hash(image, hash_size=8))
-
     def matching_image(
         self, miner_image: Image.Image, validator_image: Image.Image
     ) -> bool:
@@ -108,17 +219,32 @@ class CosineSimilarityReward(nn.Module):
     def nsfw_filter(
         self, validator_image: Image.Image, miner_image: Image.Image
     ) -> bool:
-        W, H = validator_image.size
-        validator_hash = imagehash.average_hash(validator_image, hash_size=6)
-        miner_hash = imagehash.average_hash(miner_image, hash_size=6)
-        validator_hash = str(validator_hash)
-        miner_hash = str(miner_hash)
-        black_hash = self.get_black_hash(H, W)
-        if validator_hash != black_hash and miner_hash == black_hash:
-            return 1
-        if validator_hash == black_hash and miner_hash != black_hash:
-            return 2
-        return 0
+        return nsfw_filter_batch(validator_image, [miner_image])[0]
+
+    def calculate_rewards_upscale(
+        self,
+        validator_image: Image.Image,
+        miner_images: List[Image.Image],
+        psnr_threshold=30,
+        ssim_threshold=0.9,
+    ) -> List[float]:
+        rewards = [0.0] * len(miner_images)
+        # PSNR/SSIM need the validator's resolution; a miner image of another size gets 0
+        same_size = [i for i, image in enumerate(miner_images) if image.size == validator_image.size]
+        if len(same_size) < len(miner_images):
+            print(f"Upscale images of the wrong size: {len(miner_images) - len(same_size)}", flush=True)
+        psnr_values, ssim_values = psnr_ssim(
+            validator_image,
+            [miner_images[i] for i in same_size],
+            device=self.device,
+            batch_size=self.upscale_batch_size,
+            tile_size=self.upscale_tile_size,
+            n_tiles=self.upscale_n_tiles,
+        )
+        for i, psnr_value, ssim_value in zip(same_size, psnr_values, ssim_values):
+            rewards[i] = self.upscale_reward(psnr_value, ssim_value, psnr_threshold, ssim_threshold)
+        print("calculate_rewards_upscale: ", psnr_values, ssim_values, rewards, flush=True)
+        return rewards
 
     def calculate_reward_upscale(
         self,
@@ -127,11 +253,9 @@ class CosineSimilarityReward(nn.Module):
         psnr_threshold=30,
         ssim_threshold=0.9,
     ):
-        validator_array = np.array(validator_image.convert("L"))
-        miner_array = np.array(miner_image.convert("L"))
-        psnr_value = psnr(validator_array, miner_array)
-        ssim_value, _ = ssim(validator_array, miner_array, full=True)
+        return self.calculate_rewards_upscale(validator_image, [miner_image], psnr_threshold, ssim_threshold)[0]
 
+    def upscale_reward(self, psnr_value, ssim_value, psnr_threshold=30, ssim_threshold=0.9) -> float:
         if psnr_value >= psnr_threshold and ssim_value >= ssim_threshold:
             reward = 1.0
         elif psnr_value < psnr_threshold and ssim_value < ssim_threshold:
@@ -142,5 +266,4 @@ class CosineSimilarityReward(nn.Module):
             ssim_penalty = min(ssim_value / ssim_threshold, 1.0)
             penalty_factor = 0.6
             reward = penalty_factor * (psnr_penalty + ssim_penalty) / 2
-        print("calculate_reward_upscale: ", psnr_value, ssim_value, reward)
         return reward
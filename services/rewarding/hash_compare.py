@@ -1,56 +1,99 @@
 from generation_models.utils import base64_to_pil_image
-import imagehash
+import numpy as np
 from PIL import Image
 from typing import List
 
+# Brightest grayscale value (0-255) of an image counted as black by `nsfw_filter_batch`,
+# e.g. the black image of an NSFW filtered generation. None disables the check: the
+# previous hash-based check compared a 6x6 hash with an 8x8 black hash and never fired,
+# so enabling it changes rewards.
+BLACK_MAX_LUMINANCE = None
 
-def get_black_hash(H, W) -> str:
-    image = Image.new("RGB", (W, H), color="black")
-    return str(imagehash.average_hash(image, hash_size=8))
+
+def average_hashes(images: List[Image.Image], hash_size=8) -> np.ndarray:
+    """
+    Average hashes of a batch of images as a (N, hash_size * hash_size) bool array.
+    Same bits as `imagehash.average_hash`: grayscale, LANCZOS resize, pixel > mean.
+    """
+    if not images:
+        return np.zeros((0, hash_size * hash_size), dtype=bool)
+    pixels = np.stack(
+        [
+            np.asarray(image.convert("L").resize((hash_size, hash_size), Image.LANCZOS))
+            for image in images
+        ]
+    ).reshape(len(images), -1)
+    return pixels > pixels.mean(axis=1, keepdims=True)
+
+
+def hamming_distances(hashes: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    """Bit distance of each hash in `hashes` to `reference`."""
+    return np.count_nonzero(hashes != reference, axis=-1)
+
+
+def is_black(images: List[Image.Image], max_luminance=10) -> List[bool]:
+    """True for images whose brightest grayscale pixel is at most `max_luminance`."""
+    return [image.convert("L").getextrema()[1] <= max_luminance for image in images]
+
+
+def matching_images(
+    miner_images: List[Image.Image], validator_image: Image.Image, validator_hash=None
+) -> List[bool]:
+    if validator_hash is None:
+        validator_hash = average_hashes([validator_image], hash_size=8)[0]
+    distances = hamming_distances(average_hashes(miner_images, hash_size=8), validator_hash)
+    print("Hamming Distance:", distances.tolist(), flush=True)
+    return (distances <= 6).tolist()
 
 
 def matching_image(miner_image: Image.Image, validator_image: Image.Image) -> bool:
-    miner_hash = imagehash.average_hash(miner_image, hash_size=8)
-    validator_hash = imagehash.average_hash(validator_image, hash_size=8)
-    print("Hamming Distance:", miner_hash - validator_hash, flush=True)
-    return (miner_hash - validator_hash) <= 6
+    return matching_images([miner_image], validator_image)[0]
+
+
+def nsfw_filter_batch(
+    validator_image: Image.Image, miner_images: List[Image.Image], max_luminance=BLACK_MAX_LUMINANCE
+) -> List[int]:
+    """
+    Per miner image: 1 if the miner returned a black image for a non-black validator
+    image, 2 if the validator image is black (NSFW filtered) and the miner's is not, else 0.
+    Always 0 while `max_luminance` is None (see BLACK_MAX_LUMINANCE).
+    """
+    if max_luminance is None:
+        return [0] * len(miner_images)
+    validator_black = is_black([validator_image], max_luminance)[0]
+    miner_black = is_black(miner_images, max_luminance)
+    return [
+        1 if not validator_black and black else 2 if validator_black and not black else 0
+        for black in miner_black
+    ]
 
 
 def nsfw_filter(validator_image: Image.Image, miner_image: Image.Image) -> bool:
-    W, H = validator_image.size
-    validator_hash = imagehash.average_hash(validator_image, hash_size=6)
-    miner_hash = imagehash.average_hash(miner_image, hash_size=6)
-    validator_hash = str(validator_hash)
-    miner_hash = str(miner_hash)
-    black_hash = get_black_hash(H, W)
-    if validator_hash != black_hash and miner_hash == black_hash:
-        return 1
-    if validator_hash == black_hash and miner_hash != black_hash:
-        return 2
-    return 0
+    return nsfw_filter_batch(validator_image, [miner_image])[0]
 
 
 def infer_hash(validator_image: Image.Image, batched_miner_images: List[str]):
-    rewards = []
+    rewards = [False] * len(batched_miner_images)
     validator_image = base64_to_pil_image(validator_image)
-    for miner_image in batched_miner_images:
+    decoded = {}
+    for i, miner_image in enumerate(batched_miner_images):
         if not miner_image:
-            reward = False
+            continue
+        try:
+            decoded[i] = base64_to_pil_image(miner_image)
+        except Exception:
+            print("Corrupted miner image", flush=True)
+    indices = list(decoded)
+    nsfw_checks = nsfw_filter_batch(validator_image, [decoded[i] for i in indices])
+    to_match = []
+    for i, nsfw_check in zip(indices, nsfw_checks):
+        if nsfw_check:
+            rewards[i] = -5 if nsfw_check == 2 else 0
         else:
-            try:
-                miner_image = base64_to_pil_image(miner_image)
-            except Exception:
-                print("Corrupted miner image", flush=True)
-                reward = False
-                rewards.append(reward)
-                continue
-            nsfw_check = nsfw_filter(validator_image, miner_image)
-            if nsfw_check:
-                reward = -5 if nsfw_check == 2 else 0
-            else:
-                reward = matching_image(miner_image, validator_image)
-            # if reward <= 0 and webhook and random.random() < probability:
-            #     asyncio.create_task(notice_discord(validator_image, miner_image, webhook))
-        rewards.append(reward)
+            to_match.append(i)
+    # if reward <= 0 and webhook and random.random() < probability:
+    #     asyncio.create_task(notice_discord(validator_image, miner_image, webhook))
+    for i, reward in zip(to_match, matching_images([decoded[i] for i in to_match], validator_image)):
+        rewards[i] = reward
     print(rewards, flush=True)
     return rewards
@@ -7,8 +7,11 @@ from generation_models.utils import base64_to_pil_image
 import os
 import pyiqa
 import time
-from transformers import AutoModel, AutoTokenizer
+from transformers import AutoModel, AutoTokenizer, Cache, DynamicCache
+import torch.nn.functional as F
+from collections import OrderedDict
 from copy import deepcopy
+import hashlib
 import json
 import uuid
 from huggingface_hub import HfApi
@@ -16,8 +19,24 @@ import io
 import threading
 
 
+# Token ids of the "Y" / "N" answers compared by BinaryVQA
+YES_TOKEN_ID = 56
+NO_TOKEN_ID = 45
+IMAGE_PLACEHOLDER = "(<image>./</image>)"
+
+
 class BinaryVQA:
-    def __init__(self) -> None:
+    """
+    Probability that MiniCPM-V answers Yes to a question about an image.
+
+    `batch` answers many (question, image) pairs at once. Each distinct image is encoded
+    once: its vision hidden states and the LLM key/values of the prompt up to the end of
+    the image (the prefix shared by every question about it) are cached for the last
+    `cache_size` images. Each question then only runs its own few tokens on top of that
+    prefix, up to `max_batch_size` rows per forward, across images.
+    """
+
+    def __init__(self, max_batch_size=32, cache_size=16) -> None:
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.model = AutoModel.from_pretrained(
             "openbmb/MiniCPM-V-2_6",
@@ -30,6 +49,9 @@ class BinaryVQA:
             "openbmb/MiniCPM-V-2_6", trust_remote_code=True
         )
         self.model.eval().to(self.device)
+        self.max_batch_size = max_batch_size
+        self.cache_size = cache_size
+        self.image_states = OrderedDict()
 
     @staticmethod
     def preprocess(
@@ -145,7 +167,7 @@ class BinaryVQA:
         return inputs
 
     @torch.no_grad()
-    def __call__(self, question, image):
+    def __call__(self, question, image, vision_hidden_states=None):
         msgs = [{"role": "user", "content": [image, question]}]
 
         inputs = self.preprocess(
@@ -154,6 +176,8 @@ class BinaryVQA:
             msgs=msgs,
             tokenizer=self.tokenizer,
         )
+        if vision_hidden_states is not None:
+            inputs["vision_hidden_states"] = vision_hidden_states
 
         def forward(model, data, **kwargs):
             vllm_embedding, vision_hidden_states = model.get_vllm_embedding(data)
@@ -165,10 +189,133 @@ class BinaryVQA:
             )
 
         output = forward(model=self.model, data=inputs).logits
-        yes_logit = output[:, -1, 56]
-        no_logit = output[:, -1, 45]
-        yes_prob = torch.exp(yes_logit) / (torch.exp(yes_logit) + torch.exp(no_logit))
-        return yes_prob.item()
+        return self.yes_probabilities(output[:, -1])[0]
+
+    @staticmethod
+    def yes_probabilities(logits):
+        # exp(yes) / (exp(yes) + exp(no)), in fp32
+        return torch.sigmoid((logits[:, YES_TOKEN_ID] - logits[:, NO_TOKEN_ID]).float()).tolist()
+
+    def get_cache_key(self, image: Image.Image) -> str:
+        return hashlib.sha1(image.tobytes()).hexdigest() + str(image.size)
+
+    def question_ids(self, question):
+        """Token ids of the prompt after the image: the question and the assistant turn header."""
+        tokenizer = self.model.processor.tokenizer
+        prompt = tokenizer.apply_chat_template(
+            [{"role": "user", "content": f"{IMAGE_PLACEHOLDER}\n{question}"}],
+            tokenize=False,
+            add_generation_prompt=True,
+        )
+        return tokenizer.encode(prompt.split(IMAGE_PLACEHOLDER, 1)[1], add_special_tokens=False)
+
+    @torch.no_grad()
+    def encode_image(self, image, question):
+        """
+        Vision hidden states of `image` and the LLM key/values of the prompt prefix before
+        `question`. past_key_values stays None if the prompt tokens do not end with the
+        question's own tokens; such images are answered without the shared prefix.
+        """
+        inputs = self.preprocess(
+            self=self.model,
+            image=None,
+            msgs=[{"role": "user", "content": [image, question]}],
+            tokenizer=self.tokenizer,
+        )
+        embedding, vision_hidden_states = self.model.get_vllm_embedding(inputs)
+        state = {"vision_hidden_states": vision_hidden_states, "past_key_values": None, "length": 0}
+        input_ids = inputs["input_ids"][0].tolist()
+        suffix_ids = self.question_ids(question)
+        length = len(input_ids) - len(suffix_ids)
+        if not suffix_ids or input_ids[length:] != suffix_ids:
+            print("Prompt does not end with the question tokens, answering without the shared prefix", flush=True)
+            return state
+        past_key_values = self.model.llm.model(inputs_embeds=embedding[:, :length], use_cache=True).past_key_values
+        if isinstance(past_key_values, Cache):
+            past_key_values = past_key_values.to_legacy_cache()
+        state["past_key_values"] = past_key_values
+        state["length"] = length
+        return state
+
+    @torch.no_grad()
+    def answer_with_prefix(self, rows):
+        """
+        One forward for `rows` of (image state, question ids): the cached prefixes are left
+        padded to the longest one and the questions right padded, both masked out.
+        """
+        n = len(rows)
+        prefix_length = max(state["length"] for state, _ in rows)
+        suffix_lengths = torch.tensor([len(ids) for _, ids in rows], device=self.device)
+        suffix_length = int(suffix_lengths.max())
+        input_ids = torch.zeros((n, suffix_length), dtype=torch.long, device=self.device)
+        attention_mask = torch.zeros((n, prefix_length + suffix_length), dtype=torch.long, device=self.device)
+        position_ids = torch.zeros((n, suffix_length), dtype=torch.long, device=self.device)
+        for row, (state, ids) in enumerate(rows):
+            input_ids[row, : len(ids)] = torch.tensor(ids, device=self.device)
+            attention_mask[row, prefix_length - state["length"] : prefix_length + len(ids)] = 1
+            position_ids[row] = torch.arange(state["length"], state["length"] + suffix_length, device=self.device)
+        past_key_values = DynamicCache.from_legacy_cache(
+            tuple(
+                tuple(
+                    torch.cat(
+                        [
+                            F.pad(state["past_key_values"][layer][i], (0, 0, prefix_length - state["length"], 0))
+                            for state, _ in rows
+                        ]
+                    )
+                    for i in range(2)
+                )
+                for layer in range(len(rows[0][0]["past_key_values"]))
+            )
+        )
+        llm = self.model.llm
+        embedding = llm.model.embed_tokens(input_ids)
+        if hasattr(llm.config, "scale_emb"):
+            embedding = embedding * llm.config.scale_emb
+        hidden = llm.model(
+            inputs_embeds=embedding,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=past_key_values,
+            use_cache=True,
+        ).last_hidden_state
+        return self.yes_probabilities(llm.lm_head(hidden[torch.arange(n, device=self.device), suffix_lengths - 1]))
+
+    @torch.no_grad()
+    def batch(self, questions, images):
+        """Yes probability for each (question, image) pair, same as calling the pairs one by one."""
+        states = {}
+        keys = []
+        # The same image objects come back for every question, hash each one once
+        keys_by_id = {}
+        for question, image in zip(questions, images):
+            if id(image) not in keys_by_id:
+                keys_by_id[id(image)] = self.get_cache_key(image)
+            key = keys_by_id[id(image)]
+            keys.append(key)
+            if key in states:
+                continue
+            if key in self.image_states:
+                self.image_states.move_to_end(key)
+                states[key] = self.image_states[key]
+            else:
+                states[key] = self.image_states[key] = self.encode_image(image, question)
+        while len(self.image_states) > self.cache_size:
+            self.image_states.popitem(last=False)
+
+        scores = [0.0] * len(questions)
+        shared = []
+        for index, (question, image, key) in enumerate(zip(questions, images, keys)):
+            state = states[key]
+            if state["past_key_values"] is None:
+                scores[index] = self(question, image, vision_hidden_states=state["vision_hidden_states"])
+            else:
+                shared.append((index, (state, self.question_ids(question))))
+        for start in range(0, len(shared), self.max_batch_size):
+            chunk = shared[start : start + self.max_batch_size]
+            for (index, _), score in zip(chunk, self.answer_with_prefix([row for _, row in chunk])):
+                scores[index] = score
+        return scores
 
 
 class DSGPromptProcessor:
@@ -328,21 +475,25 @@ woman is holding a small, round, metallic object
             if len(layers) == 5:
                 break
 
-        ordered_indexes = [item for sublist in layers for item in sublist]
-        return ordered_indexes
+        return layers
 
     def _create_graph_questions(self, questions: list, dependencies: dict) -> set:
         # create a question graph
         for i in range(len(questions)):
             dependencies.setdefault(i, [])
-        layered_indexes = self.find_layers(dependencies)
+        layers = self.find_layers(dependencies)
+        layered_indexes = [item for sublist in layers for item in sublist]
         print(layered_indexes)
         print(questions)
         sorted_questions = [questions[i] for i in layered_indexes]
+        # Dependencies and layers as positions in sorted_questions; a question is only
+        # layered once all its dependencies are, so they are always in an earlier layer
+        position = {index: i for i, index in enumerate(layered_indexes)}
         new_dependencies = {}
         for i in range(len(sorted_questions)):
-            new_dependencies[i] = dependencies[layered_indexes[i]]
-        return sorted_questions, new_dependencies
+            new_dependencies[i] = [position[dep] for dep in dependencies[layered_indexes[i]]]
+        sorted_layers = [[position[index] for index in layer] for layer in layers]
+        return sorted_questions, new_dependencies, sorted_layers
 
     def get_reward(
         self,
@@ -358,7 +509,7 @@ woman is holding a small, round, metallic object
         """
         scores = {}
 
-        sorted_questions, dependencies = self._create_graph_questions(
+        sorted_questions, dependencies, layers = self._create_graph_questions(
             questions, dependencies
         )
         print(sorted_questions)
@@ -366,30 +517,32 @@ woman is holding a small, round, metallic object
         for i in range(len(images)):
             scores[i] = [0] * len(sorted_questions)
 
-        def get_reward_for_a_question(
-            question: str,
-            question_dependencies: list[int],
-            image: Image.Image,
-            prev_scores: list[int],
-        ) -> float:
-            if any([not (prev_scores[i] > 0.5) for i in question_dependencies]):
-                print(
-                    f"Skipping question: {question}. It depends on {[sorted_questions[i] for i in range(len(question_dependencies))]} that was answered as No."
-                )
-                return 0
-            if not isinstance(image, Image.Image):
-                raise ValueError("Invalid image type")
-            score = self.binary_vqa(question, image)
-            print(question)
-            print(f"The answer Yes has {score} probs")
-            return score
-
-        for i, question in enumerate(sorted_questions):
+        # Questions of a layer only depend on earlier layers: answer each layer for all
+        # images in one batch, skipping pairs whose dependencies were answered as No.
+        for layer in layers:
+            pairs = []
             for j, image in enumerate(images):
-                if image:
-                    scores[j][i] = get_reward_for_a_question(
-                        question, dependencies[i], image, scores[j]
-                    )
+                if not image:
+                    continue
+                if not isinstance(image, Image.Image):
+                    raise ValueError("Invalid image type")
+                for i in layer:
+                    failed = [dep for dep in dependencies[i] if not (scores[j][dep] > 0.5)]
+                    if failed:
+                        print(
+                            f"Skipping question: {sorted_questions[i]}. It depends on {[sorted_questions[dep] for dep in failed]} that was answered as No."
+                        )
+                        continue
+                    pairs.append((i, j))
+            if not pairs:
+                continue
+            yes_probs = self.binary_vqa.batch(
+                [sorted_questions[i] for i, _ in pairs], [images[j] for _, j in pairs]
+            )
+            for (i, j), score in zip(pairs, yes_probs):
+                scores[j][i] = score
+                print(sorted_questions[i])
+                print(f"The answer Yes has {score} probs")
 
         return scores, sorted_questions
 
@@ -0,0 +1,147 @@
+import random
+from typing import List, Tuple
+import numpy as np
+import torch
+from PIL import Image
+
+
+def to_gray_tensor(images: List[Image.Image], device="cpu") -> torch.Tensor:
+    """(N, H, W) float32 grayscale in [0, 1], converted by PIL exactly like `np.array(image.convert("L"))`."""
+    pixels = torch.from_numpy(
+        np.stack([np.asarray(image.convert("L")) for image in images])
+    )
+    return pixels.to(device).float().div_(255)
+
+
+def window_sum(x: torch.Tensor, win_size: int, dim: int) -> torch.Tensor:
+    """
+    Sums of `win_size` consecutive values along `dim`, valid positions only. Built from
+    shifted views added together (sums of 1, 2, 4... values), which on CPU is several
+    times faster than `avg_pool2d`.
+    """
+    length = x.shape[dim] - win_size + 1
+    total, covered = None, 0
+    span, partial = 1, x
+    while True:
+        if win_size & span:
+            part = partial.narrow(dim, covered, length)
+            total = part.clone() if total is None else total.add_(part)
+            covered += span
+        if span * 2 > win_size:
+            return total
+        n = partial.shape[dim] - span
+        partial = partial.narrow(dim, 0, n) + partial.narrow(dim, span, n)
+        span *= 2
+
+
+def box_filter(x: torch.Tensor, win_size: int) -> torch.Tensor:
+    """`win_size` x `win_size` mean filter over the last two dims, valid positions only."""
+    return window_sum(window_sum(x, win_size, -1), win_size, -2).div_(
+        win_size * win_size
+    )
+
+
+def ssim_maps(
+    reference: torch.Tensor, images: torch.Tensor, win_size=7, k1=0.01, k2=0.03
+) -> torch.Tensor:
+    """
+    SSIM maps of `images` (N, C, H, W) against `reference` (1, C, H, W), both in [0, 1].
+    Same definition as skimage's `structural_similarity` defaults (uniform window, sample
+    covariance); the output keeps the windows that fit, which is the region skimage averages.
+    """
+    c1, c2 = k1**2, k2**2
+    n_pixels = win_size**2
+    cov_norm = n_pixels / (n_pixels - 1)
+    uy = box_filter(reference, win_size)
+    vy = box_filter(reference * reference, win_size).sub_(uy * uy).mul_(cov_norm)
+    ux = box_filter(images, win_size)
+    vx = box_filter(images * images, win_size).sub_(ux * ux).mul_(cov_norm)
+    vxy = box_filter(images * reference, win_size).sub_(ux * uy).mul_(cov_norm)
+    # ((2 ux uy + c1)(2 vxy + c2)) / ((ux^2 + uy^2 + c1)(vx + vy + c2)), in place on the
+    # per-image maps to limit temporaries at 2048x2048
+    numerator = (ux * uy).mul_(2).add_(c1).mul_(vxy.mul_(2).add_(c2))
+    denominator = ux.square_().add_(uy * uy).add_(c1).mul_(vx.add_(vy).add_(c2))
+    return numerator.div_(denominator)
+
+
+def sample_tiles(
+    height, width, win_size, tile_size, n_tiles, rng=None
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Crops (top, left, height, width) to evaluate. With `n_tiles`, `n_tiles` random cells of
+    a `tile_size` grid over the SSIM window positions, each crop padded by `win_size - 1` so
+    its windows are exactly those of the cell; otherwise, or if the grid has no more cells
+    than that, the whole image.
+    """
+    pad = win_size - 1
+    rows, cols = (height - pad) // tile_size, (width - pad) // tile_size
+    if not n_tiles or rows * cols <= n_tiles:
+        return [(0, 0, height, width)]
+    cells = (rng or random).sample(range(rows * cols), n_tiles)
+    return [
+        (
+            (cell // cols) * tile_size,
+            (cell % cols) * tile_size,
+            tile_size + pad,
+            tile_size + pad,
+        )
+        for cell in cells
+    ]
+
+
+def crop_tiles(x: torch.Tensor, tiles) -> torch.Tensor:
+    """(N, H, W) -> (N, len(tiles), h, w); the tiles share one size."""
+    if len(tiles) == 1:
+        top, left, h, w = tiles[0]
+        return x[:, None, top : top + h, left : left + w]
+    return torch.stack(
+        [x[:, top : top + h, left : left + w] for top, left, h, w in tiles], dim=1
+    )
+
+
+@torch.inference_mode()
+def psnr_ssim(
+    reference: Image.Image,
+    images: List[Image.Image],
+    device="cpu",
+    batch_size=4,
+    win_size=7,
+    tile_size=256,
+    n_tiles=None,
+    rng=None,
+) -> Tuple[List[float], List[float]]:
+    """
+    PSNR (dB, data range 255) and mean SSIM of each grayscale image against `reference`,
+    `batch_size` images at a time on `device`. All images must have the reference's size.
+
+    By default the result is skimage's `peak_signal_noise_ratio` / `structural_similarity`
+    up to float32 rounding (below 1e-5 dB and 1e-6 SSIM). With `n_tiles`, only that many
+    random `tile_size` cells, the same for every image of the call, are evaluated: an
+    unbiased estimate of the value over the grid cells (the right/bottom remainder smaller
+    than a cell is left out), whose error shrinks like 1 / sqrt(n_tiles) and grows with how
+    unevenly the image is degraded. `tests/benchmark_upscale_metrics.py` measures it against
+    skimage at 2048x2048: with 16 tiles of 256 (1/4 of the pixels) within 0.008 SSIM and
+    0.13 dB PSNR over 20 draws on its test degradations, 0.005 and 0.12 dB with 32 tiles.
+    """
+    if not images:
+        return [], []
+    reference = to_gray_tensor([reference], device)
+    height, width = reference.shape[-2:]
+    tiles = sample_tiles(height, width, win_size, tile_size, n_tiles, rng)
+    reference = crop_tiles(reference, tiles)
+    # PSNR over the pixels at the centre of the SSIM windows of each tile (the whole image when untiled)
+    margin = (win_size - 1) // 2 if tiles[0][2:] != (height, width) else 0
+    inner = (
+        ...,
+        slice(margin, reference.shape[-2] - margin),
+        slice(margin, reference.shape[-1] - margin),
+    )
+    psnr_values, ssim_values = [], []
+    for i in range(0, len(images), batch_size):
+        batch = crop_tiles(to_gray_tensor(images[i : i + batch_size], device), tiles)
+        mse = (batch[inner] - reference[inner]).square_().flatten(1).mean(dim=1)
+        psnr_values += (10 * torch.log10(1 / mse)).tolist()
+        ssim_values += (
+            ssim_maps(reference, batch, win_size).flatten(1).mean(dim=1).tolist()
+        )
+    return psnr_values, ssim_values
@@ -0,0 +1,352 @@
+"""
+Binary VQA for open-category prompt adherence: the previous per (question, image) call,
+which preprocesses and encodes the image again for every question, versus
+`BinaryVQA.batch`, which encodes each image once, caches the prompt prefix up to the end
+of the image and answers the questions of a DSG layer for all images in one forward.
+
+MiniCPM-V is replaced by a small stand-in with the same interface (chat template, image
+slices, resampled vision tokens scattered into a Qwen2 LLM) and random weights, so the
+Yes probabilities are meaningless but must be the same on both paths.
+
+    python tests/benchmark_binary_vqa.py --n_images 4 --n_questions 20
+"""
+import argparse
+import random
+import re
+import time
+import zlib
+from collections import OrderedDict
+from types import SimpleNamespace
+import numpy as np
+import torch
+import torch.nn as nn
+from PIL import Image
+from transformers import Qwen2Config, Qwen2ForCausalLM
+from services.rewarding.open_category_reward import (
+    IMAGE_PLACEHOLDER,
+    BinaryVQA,
+    DSGPromptProcessor,
+)
+
+SPECIAL_TOKENS = [
+    "<pad>",
+    "<|im_start|>",
+    "<|im_end|>",
+    "<image>",
+    "</image>",
+    "<slice>",
+    "</slice>",
+    "<unk>",
+]
+
+
+class StandInBatchFeature(dict):
+    """Like MiniCPM-V's batch feature: `to` also moves the tensors inside lists."""
+
+    def to(self, device):
+        def move(value):
+            if isinstance(value, torch.Tensor):
+                return value.to(device)
+            if isinstance(value, list):
+                return [move(v) for v in value]
+            return value
+
+        return StandInBatchFeature({key: move(value) for key, value in self.items()})
+
+
+class WordTokenizer:
+    """Special tokens, newlines, words and punctuation, words hashed into the vocabulary."""
+
+    def __init__(self, vocab_size):
+        self.vocab_size = vocab_size
+        self.special_ids = {token: i for i, token in enumerate(SPECIAL_TOKENS)}
+        specials = "|".join(re.escape(token) for token in SPECIAL_TOKENS)
+        self.pattern = re.compile(rf"{specials}|\n|\w+|[^\w\s]")
+
+    def encode(self, text, add_special_tokens=False):
+        return [
+            self.special_ids.get(
+                token, 100 + zlib.crc32(token.encode()) % (self.vocab_size - 100)
+            )
+            for token in self.pattern.findall(text)
+        ]
+
+    def apply_chat_template(self, msgs, tokenize=False, add_generation_prompt=True):
+        text = "".join(
+            f"<|im_start|>{msg['role']}\n{msg['content']}<|im_end|>\n" for msg in msgs
+        )
+        return text + "<|im_start|>assistant\n" if add_generation_prompt else text
+
+
+class StandInProcessor:
+    """Images above `slice_area` pixels get a 2x2 grid of slices after the overview image."""
+
+    def __init__(self, tokenizer, query_num, image_size=224, slice_area=448 * 448):
+        self.tokenizer = tokenizer
+        self.query_num = query_num
+        self.image_size = image_size
+        self.slice_area = slice_area
+        self.image_processor = SimpleNamespace(
+            image_feature_size=query_num,
+            patch_size=14,
+            use_image_id=False,
+            max_slice_nums=9,
+            slice_mode=True,
+        )
+
+    def slices(self, image):
+        crops = [image]
+        if image.width * image.height > self.slice_area:
+            w, h = image.width // 2, image.height // 2
+            crops += [image.crop((x, y, x + w, y + h)) for y in (0, h) for x in (0, w)]
+        return [
+            torch.from_numpy(
+                np.asarray(
+                    crop.resize((self.image_size, self.image_size)), dtype=np.float32
+                )
+                / 255
+            ).permute(2, 0, 1)
+            for crop in crops
+        ]
+
+    def __call__(
+        self,
+        prompts,
+        images_lists,
+        max_slice_nums=None,
+        use_image_id=None,
+        return_tensors="pt",
+        max_length=None,
+    ):
+        query = "<unk>" * self.query_num
+        rows = []
+        for prompt, images in zip(prompts, images_lists):
+            pixel_values = []
+            for image in images:
+                slices = self.slices(image)
+                pixel_values += slices
+                placeholder = f"<image>{query}</image>" + f"<slice>{query}</slice>" * (
+                    len(slices) - 1
+                )
+                prompt = prompt.replace(IMAGE_PLACEHOLDER, placeholder, 1)
+            ids = self.tokenizer.encode(prompt)
+            starts = [i + 1 for i, token in enumerate(ids) if token in (3, 5)]
+            rows.append(
+                (
+                    ids,
+                    pixel_values,
+                    [[start, start + self.query_num] for start in starts],
+                )
+            )
+        length = max(len(ids) for ids, _, _ in rows)
+        input_ids = torch.zeros((len(rows), length), dtype=torch.long)
+        attention_mask = torch.zeros((len(rows), length), dtype=torch.bool)
+        image_bound = []
+        for row, (ids, _, bounds) in enumerate(rows):
+            padding = length - len(ids)
+            input_ids[row, padding:] = torch.tensor(ids)
+            attention_mask[row, padding:] = True
+            image_bound.append(
+                torch.tensor(bounds, dtype=torch.long).view(-1, 2) + padding
+            )
+        return StandInBatchFeature(
+            {
+                "input_ids": input_ids,
+                "attention_mask": attention_mask,
+                "pixel_values": [pixel_values for _, pixel_values, _ in rows],
+                "image_bound": image_bound,
+                "tgt_sizes": [
+                    torch.tensor([[16, 16]] * len(pixel_values))
+                    for _, pixel_values, _ in rows
+                ],
+            }
+        )
+
+
+class StandInMiniCPMV(nn.Module):
+    def __init__(
+        self,
+        query_num=32,
+        hidden_size=512,
+        num_layers=6,
+        vision_size=384,
+        vision_layers=6,
+        vocab_size=2048,
+    ):
+        super().__init__()
+        self.config = SimpleNamespace(
+            query_num=query_num,
+            patch_size=14,
+            use_image_id=False,
+            slice_config=SimpleNamespace(max_slice_nums=9),
+            slice_mode=True,
+            _name_or_path="stand-in",
+        )
+        self.processor = StandInProcessor(WordTokenizer(vocab_size), query_num)
+        self.llm = Qwen2ForCausalLM(
+            Qwen2Config(
+                vocab_size=vocab_size,
+                hidden_size=hidden_size,
+                intermediate_size=hidden_size * 3,
+                num_hidden_layers=num_layers,
+                num_attention_heads=8,
+                num_key_value_heads=2,
+                max_position_embeddings=4096,
+                attn_implementation="sdpa",
+            )
+        )
+        self.patch_embed = nn.Conv2d(3, vision_size, kernel_size=14, stride=14)
+        self.vpm = nn.TransformerEncoder(
+            nn.TransformerEncoderLayer(
+                vision_size, 6, vision_size * 4, batch_first=True
+            ),
+            vision_layers,
+        )
+        self.queries = nn.Parameter(torch.randn(query_num, vision_size))
+        self.resampler = nn.MultiheadAttention(vision_size, 6, batch_first=True)
+        self.proj = nn.Linear(vision_size, hidden_size)
+
+    @property
+    def device(self):
+        return self.proj.weight.device
+
+    def get_vllm_embedding(self, data):
+        # Same contract as MiniCPM-V: vision states per row, scattered over the image bounds
+        if "vision_hidden_states" not in data:
+            vision_hidden_states = []
+            for pixel_values in data["pixel_values"]:
+                patches = self.vpm(
+                    self.patch_embed(torch.stack(pixel_values))
+                    .flatten(2)
+                    .transpose(1, 2)
+                )
+                queries = self.queries.expand(len(pixel_values), -1, -1)
+                vision_hidden_states.append(
+                    self.proj(self.resampler(queries, patches, patches)[0])
+                )
+        else:
+            vision_hidden_states = data["vision_hidden_states"]
+        vllm_embedding = self.llm.model.embed_tokens(data["input_ids"])
+        for i, bounds in enumerate(data["image_bound"]):
+            if len(bounds):
+                indices = torch.cat(
+                    [torch.arange(start, end) for start, end in bounds.tolist()]
+                )
+                vllm_embedding[i, indices] = vision_hidden_states[i].reshape(
+                    -1, vllm_embedding.shape[-1]
+                )
+        return vllm_embedding, vision_hidden_states
+
+
+class StandInVQA(BinaryVQA):
+    def __init__(self, model, max_batch_size=32, cache_size=16):
+        self.device = "cpu"
+        self.model = model.eval()
+        self.tokenizer = model.processor.tokenizer
+        self.max_batch_size = max_batch_size
+        self.cache_size = cache_size
+        self.image_states = OrderedDict()
+
+
+def make_images(n, seed):
+    rng = np.random.default_rng(seed)
+    # One small image without slices so prefixes of different lengths share a batch
+    sizes = [448] + [1024] * (n - 1)
+    return [
+        Image.fromarray(rng.integers(0, 255, (size, size, 3), dtype=np.uint8))
+        for size in sizes[:n]
+    ]
+
+
+def make_questions(n, seed):
+    rng = random.Random(seed)
+    words = [
+        "cat",
+        "chair",
+        "window",
+        "garden",
+        "red car",
+        "blue sky",
+        "tree",
+        "mountain",
+        "woman",
+        "hat",
+    ]
+    questions = [
+        f"Is there {rng.choice(words)} number {i}? Answer only Y or N."
+        for i in range(n)
+    ]
+    # Each question depends on up to two earlier ones, giving several DSG layers
+    dependencies = {
+        i: rng.sample(range(i), min(i, rng.randint(0, 2))) for i in range(1, n)
+    }
+    return questions, dependencies
+
+
+def sequential_reward(processor, questions, dependencies, images):
+    """The previous question-by-question loop of DSGPromptProcessor.get_reward."""
+    sorted_questions, dependencies, _ = processor._create_graph_questions(
+        questions, dict(dependencies)
+    )
+    scores = {j: [0] * len(sorted_questions) for j in range(len(images))}
+    for i, question in enumerate(sorted_questions):
+        for j, image in enumerate(images):
+            if all(scores[j][dep] > 0.5 for dep in dependencies[i]):
+                scores[j][i] = processor.binary_vqa(question, image)
+    return scores
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_images", type=int, default=4)
+    parser.add_argument("--n_questions", type=int, default=20)
+    parser.add_argument("--max_batch_size", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    torch.manual_seed(args.seed)
+
+    vqa = StandInVQA(StandInMiniCPMV(), max_batch_size=args.max_batch_size)
+    images = make_images(args.n_images, args.seed)
+    questions, dependencies = make_questions(args.n_questions, args.seed)
+    pairs = [(question, image) for image in images for question in questions]
+    print(
+        f"images: {args.n_images}, questions: {args.n_questions}, pairs: {len(pairs)}"
+    )
+
+    vqa(*pairs[0])  # warm up
+    start = time.perf_counter()
+    expected = [vqa(question, image) for question, image in pairs]
+    per_pair_time = time.perf_counter() - start
+
+    vqa.image_states.clear()
+    start = time.perf_counter()
+    results = vqa.batch(
+        [question for question, _ in pairs], [image for _, image in pairs]
+    )
+    batched_time = time.perf_counter() - start
+    print(f"all pairs, one by one:     {per_pair_time:6.2f} s")
+    print(f"all pairs, batched:        {batched_time:6.2f} s")
+    print(f"max |dP(yes)|: {max(abs(a - b) for a, b in zip(expected, results)):.2e}")
+
+    # Whole DSG reward: dependencies are answered layer by layer and can skip questions
+    processor = DSGPromptProcessor.__new__(DSGPromptProcessor)
+    processor.binary_vqa = vqa
+    start = time.perf_counter()
+    expected = sequential_reward(processor, questions, dependencies, images)
+    sequential_time = time.perf_counter() - start
+    vqa.image_states.clear()
+    start = time.perf_counter()
+    scores, _ = processor.get_reward(questions, dict(dependencies), images)
+    layered_time = time.perf_counter() - start
+    answered = sum(score != 0 for row in scores.values() for score in row)
+    print(f"DSG reward, sequential:    {sequential_time:6.2f} s")
+    print(
+        f"DSG reward, layer batches: {layered_time:6.2f} s ({answered} of {len(pairs)} pairs answered)"
+    )
+    print(
+        f"max |dscore|: {max(abs(a - b) for j in scores for a, b in zip(expected[j], scores[j])):.2e}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Size report for offline reward stream messages with images inline (base64 JSON)
+versus references into the content-addressed blob store, on fakeredis.
+
+Each message mirrors `get_reward_offline`: every valid miner's image appears in
+both `miner_data` and `all_miner_data`, and the base synapse may carry a
+conditional image. Retention is the stream trimmed to `max_queue_size` messages.
+
+    python tests/benchmark_blob_store.py --n_messages 50 --n_miners 8 --size 768
+    python tests/benchmark_blob_store.py --conditional  # img2img / controlnet
+"""
+import argparse
+import asyncio
+import base64
+import json
+import random
+import time
+from io import BytesIO
+import fakeredis
+import numpy as np
+from PIL import Image
+from services.offline_rewarding.redis_client import RedisClient
+from services.offline_rewarding.blob_store import decode_image
+
+IMAGE_FIELDS = ["image", "conditional_image"]
+
+
+def random_image(size, seed):
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, size, dtype=np.float32)
+    array = (gradient[None, :, None] + rng.normal(0, 8, (size, size, 3))).clip(0, 255)
+    buffer = BytesIO()
+    Image.fromarray(array.astype(np.uint8)).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def make_message(images, conditional_image, n_miners):
+    miner_images = random.sample(images, n_miners)
+    base_data = {
+        "prompt": "a cat",
+        "model_name": "model",
+        "image": "",
+        "conditional_image": conditional_image,
+    }
+    miner_data = [
+        dict(base_data, image=image, process_time=1.0) for image in miner_images
+    ]
+    all_miner_data = [dict(base_data, image=image) for image in miner_images] + [
+        dict(base_data, image="")
+    ]
+    return {
+        "timeout": 12,
+        "valid_uids": list(range(n_miners)),
+        "invalid_uids": [n_miners],
+        "miner_data": miner_data,
+        "base_data": base_data,
+        "uids": list(range(n_miners + 1)),
+        "all_miner_data": all_miner_data,
+    }
+
+
+def new_client():
+    redis_client = RedisClient()
+    server = fakeredis.FakeServer()
+    redis_client.client = fakeredis.FakeRedis(server=server)
+    redis_client.async_client = fakeredis.aioredis.FakeRedis(server=server)
+    return redis_client
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_messages", type=int, default=50)
+    parser.add_argument("--n_miners", type=int, default=8)
+    parser.add_argument(
+        "--n_images",
+        type=int,
+        default=24,
+        help="Distinct images, miners often return the same one",
+    )
+    parser.add_argument("--size", type=int, default=768)
+    parser.add_argument(
+        "--conditional",
+        action="store_true",
+        help="Base synapse carries a conditional image",
+    )
+    args = parser.parse_args()
+
+    random.seed(0)
+    images = [random_image(args.size, seed) for seed in range(args.n_images)]
+    conditional_image = (
+        random_image(args.size, args.n_images) if args.conditional else ""
+    )
+    messages = [
+        make_message(images, conditional_image, args.n_miners)
+        for _ in range(args.n_messages)
+    ]
+
+    inline_sizes = [len(json.dumps(message)) for message in messages]
+
+    redis_client = new_client()
+    blob_store = redis_client.blob_store
+    ref_sizes = []
+    start = time.perf_counter()
+    for message in messages:
+        message = json.loads(json.dumps(message))
+        blob_store.offload(
+            message["miner_data"] + message["all_miner_data"], IMAGE_FIELDS
+        )
+        blob_store.offload([message["base_data"]], IMAGE_FIELDS)
+        encoded = json.dumps(message)
+        ref_sizes.append(len(encoded))
+        redis_client.publish_to_stream(
+            redis_client.reward_stream_name, {"data": encoded}
+        )
+    offload_time = time.perf_counter() - start
+
+    async def resolve_all():
+        items = []
+        for _, message in redis_client.client.xrange(redis_client.reward_stream_name):
+            data = json.loads(message[b"data"])
+            await blob_store.resolve(data["miner_data"], ["image"], decode=decode_image)
+            items.append(data)
+        return items
+
+    start = time.perf_counter()
+    resolved = asyncio.run(resolve_all())
+    resolve_time = time.perf_counter() - start
+    assert all(
+        x["image"].size == (args.size, args.size)
+        for message in resolved
+        for x in message["miner_data"]
+    )
+
+    stats = blob_store.summary()
+    retained = min(args.n_messages, redis_client.max_queue_size)
+    inline_mean = sum(inline_sizes) / len(inline_sizes)
+    ref_mean = sum(ref_sizes) / len(ref_sizes)
+    print(
+        f"messages: {args.n_messages}, miners per message: {args.n_miners}, distinct images: {stats['stored']}"
+    )
+    print(
+        f"message size        inline {inline_mean / 1e6:8.2f} MB   refs {ref_mean / 1e3:8.2f} KB"
+    )
+    print(
+        f"sent to redis       inline {sum(inline_sizes) / 1e6:8.2f} MB   refs {(sum(ref_sizes) + stats['sent_bytes']) / 1e6:8.2f} MB"
+        f" (messages + blob writes)"
+    )
+    print(
+        f"stream retention    inline {inline_mean * retained / 1e6:8.2f} MB   refs {(ref_mean * retained + stats['stored_bytes']) / 1e6:8.2f} MB"
+        f" ({retained} messages + {stats['stored']} blobs)"
+    )
+    print(
+        f"offload {offload_time / args.n_messages * 1e3:.1f} ms/message, resolve+decode {resolve_time / args.n_messages * 1e3:.1f} ms/message"
+    )
+    print(f"blob store stats: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+CPU throughput of CosineSimilarityReward: the previous per-miner loop (validator
+image and miner image embedded again for every miner) versus the batched
+`get_reward` path that embeds the validator image once and all miner images in
+one pass. Random weights are used unless --pretrained is set; the timing does
+not depend on them.
+
+    python tests/benchmark_cosine_reward.py --n_miners 4 --n_rounds 5
+    python tests/benchmark_cosine_reward.py --dtype bf16 --channels_last
+"""
+import argparse
+import time
+import numpy as np
+import torch
+from PIL import Image
+from services.rewarding.cosine_similarity_compare import CosineSimilarityReward
+
+
+def make_images(n, size, seed):
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 255, (size, size, 3), dtype=np.uint8)
+    images = [Image.fromarray(base)]
+    for _ in range(n):
+        noise = rng.normal(0, 40, base.shape)
+        images.append(Image.fromarray((base + noise).clip(0, 255).astype(np.uint8)))
+    return images[0], images[1:]
+
+
+def legacy_rewards(rewarder, validator_image, miner_images):
+    return [
+        rewarder.forward(validator_image, miner_image) for miner_image in miner_images
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_miners", type=int, default=4)
+    parser.add_argument("--n_rounds", type=int, default=5)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--dtype", type=str, default=None, choices=["fp16", "bf16"])
+    parser.add_argument("--channels_last", action="store_true")
+    parser.add_argument("--pretrained", action="store_true")
+    args = parser.parse_args()
+    torch.manual_seed(0)
+
+    rewarder = CosineSimilarityReward(device="cpu", pretrained=args.pretrained)
+    fast_rewarder = CosineSimilarityReward(
+        device="cpu",
+        dtype=args.dtype,
+        channels_last=args.channels_last,
+        pretrained=False,
+    )
+    fast_rewarder.model.load_state_dict(rewarder.model.state_dict())
+    rounds = [
+        make_images(args.n_miners, args.size, seed) for seed in range(args.n_rounds)
+    ]
+    legacy_rewards(rewarder, *rounds[0])  # warm up
+
+    start = time.perf_counter()
+    expected = [legacy_rewards(rewarder, *images) for images in rounds]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [fast_rewarder.get_reward(*images, "txt2img") for images in rounds]
+    batched_time = time.perf_counter() - start
+
+    # Same validator images again: their embeddings come from the cache
+    start = time.perf_counter()
+    for images in rounds:
+        fast_rewarder.get_reward(*images, "txt2img")
+    cached_time = time.perf_counter() - start
+
+    sims = [fast_rewarder.similarities(*images) for images in rounds]
+    legacy_sims = [
+        [rewarder.forward(v, m, binary=False) for m in miners] for v, miners in rounds
+    ]
+    max_diff = float(np.abs(np.array(sims) - np.array(legacy_sims)).max())
+    mismatched = sum(
+        abs(a - b) > 1e-3
+        for exp, res in zip(expected, results)
+        for a, b in zip(exp, res)
+    )
+    n_rewards = args.n_miners * args.n_rounds
+    print(
+        f"miners per request: {args.n_miners}, requests: {args.n_rounds}, dtype: {args.dtype or 'fp32'}, channels_last: {args.channels_last}"
+    )
+    print(f"per-miner loop:          {n_rewards / legacy_time:6.2f} rewards/s")
+    print(f"batched:                 {n_rewards / batched_time:6.2f} rewards/s")
+    print(f"batched, cached vector:  {n_rewards / cached_time:6.2f} rewards/s")
+    print(
+        f"max similarity difference: {max_diff:.2e}, rewards differing by >1e-3: {mismatched}/{n_rewards}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Per-request cost of authenticating organic proxy requests: the previous
+Ed25519 verification on every request against CredentialVerifier, which
+verifies each client key once and serves repeats from its cache.
+
+    python tests/benchmark_proxy_auth.py --n_requests 20000 --n_clients 8
+"""
+import argparse
+import base64
+import random
+import time
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import (
+    Ed25519PrivateKey,
+    Ed25519PublicKey,
+)
+from image_generation_subnet.validator.proxy_auth import CredentialVerifier
+
+
+def make_credentials(n_clients):
+    """One signing key shared by the clients, like the proxy client service."""
+    private_key = Ed25519PrivateKey.generate()
+    message = b"validator proxy credentials"
+    signature = private_key.sign(message)
+    public_key = private_key.public_key().public_bytes(
+        serialization.Encoding.Raw, serialization.PublicFormat.Raw
+    )
+    tokens = [base64.b64encode(public_key).decode() for _ in range(n_clients)]
+    return message, signature, tokens
+
+
+def verify_uncached(message, signature, token):
+    public_key_bytes = base64.b64decode(token)
+    public_key = Ed25519PublicKey.from_public_bytes(public_key_bytes)
+    public_key.verify(signature, message)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_requests", type=int, default=20000)
+    parser.add_argument("--n_clients", type=int, default=8)
+    args = parser.parse_args()
+
+    message, signature, tokens = make_credentials(args.n_clients)
+    requests = [random.choice(tokens) for _ in range(args.n_requests)]
+
+    start = time.perf_counter()
+    for token in requests:
+        verify_uncached(message, signature, token)
+    uncached = time.perf_counter() - start
+
+    verifier = CredentialVerifier()
+    verifier.set_credentials(message, signature)
+    start = time.perf_counter()
+    for token in requests:
+        assert verifier.verify_token(token)
+    cached = time.perf_counter() - start
+
+    assert not verifier.verify_token(base64.b64encode(b"\0" * 32).decode())
+    verifier.set_credentials(message, signature)
+    assert not verifier.verified, "refreshing credentials must drop cached keys"
+
+    print(f"requests: {args.n_requests}, clients: {args.n_clients}")
+    print(f"uncached: {uncached / args.n_requests * 1e6:.1f} us/request")
+    print(f"cached:   {cached / args.n_requests * 1e6:.1f} us/request")
+    print(f"speedup:  {uncached / cached:.1f}x")
+    print(f"stats:    {verifier.stats}")
+
+
+if __name__ == "__main__":
+    main()
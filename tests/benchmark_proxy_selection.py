@@ -0,0 +1,141 @@
+"""
+Discrete-event simulation of organic proxy traffic comparing miner selection
+policies. Each attempt replays a latency sampled from the miner's trace; a
+failed attempt costs the model timeout and the request moves on to the next
+candidate, like ValidatorProxy.forward without hedging. Miners slow down with
+the number of requests they are serving at once.
+
+    python tests/benchmark_proxy_selection.py --n_requests 5000 --rps 4
+    python tests/benchmark_proxy_selection.py --trace process_times.json
+
+A trace is a JSON object `{uid: [process_time, ...]}` where -1 marks a failed
+response, e.g. the `process_time` lists of a `store_miner_info` payload.
+"""
+import argparse
+import heapq
+import json
+import random
+from image_generation_subnet.validator.query_queue import QueryQueue
+from image_generation_subnet.validator.proxy_selection import build_selection_policy
+
+MODEL_NAME = "model"
+
+
+def synthetic_trace(n_uids, timeout):
+    traces, scores = {}, {}
+    for uid in range(n_uids):
+        kind = random.random()
+        if kind < 0.7:
+            median = random.uniform(2, 8)
+            traces[uid] = [random.lognormvariate(0, 0.3) * median for _ in range(200)]
+            scores[uid] = random.uniform(0.6, 1.0)
+        elif kind < 0.85:
+            median = random.uniform(0.5, 0.9) * timeout
+            traces[uid] = [random.lognormvariate(0, 0.2) * median for _ in range(200)]
+            scores[uid] = random.uniform(0.3, 0.6)
+        else:
+            traces[uid] = [-1 if random.random() < 0.8 else 5.0 for _ in range(200)]
+            scores[uid] = 0.0
+    return traces, scores
+
+
+def simulate(policy_name, traces, scores, args, seed):
+    random.seed(seed)
+    query_queue = QueryQueue([MODEL_NAME])
+    query_queue.update_queue(
+        {uid: {"model_name": MODEL_NAME, "rate_limit": args.volume} for uid in traces}
+    )
+    policy = build_selection_policy(
+        policy_name, args.timeout, score_fn=lambda uid: scores.get(uid, 1.0)
+    )
+    in_flight = {uid: 0 for uid in traces}
+    events = []
+    seq = 0
+    now = 0.0
+    for request_id in range(args.n_requests):
+        now += random.expovariate(args.rps)
+        heapq.heappush(events, (now, seq, "arrival", request_id, None))
+        seq += 1
+
+    candidates, arrivals = {}, {}
+    latencies, first_attempt_failures, failed_requests = [], 0, 0
+
+    def start_attempt(request_id, now, first):
+        nonlocal seq
+        uid, _ = next(candidates[request_id], (None, None))
+        if uid is None:
+            return False
+        sample = random.choice(traces[uid])
+        success = sample >= 0
+        if success:
+            duration = min(
+                sample * (1 + args.load_factor * in_flight[uid]), args.timeout
+            )
+        else:
+            duration = args.timeout
+        in_flight[uid] += 1
+        if policy is not None:
+            policy.on_start(uid)
+        attempt = (uid, success, duration, first)
+        heapq.heappush(events, (now + duration, seq, "done", request_id, attempt))
+        seq += 1
+        return True
+
+    while events:
+        now, _, kind, request_id, data = heapq.heappop(events)
+        if kind == "arrival":
+            arrivals[request_id] = now
+            candidates[request_id] = query_queue.get_query_for_proxy(MODEL_NAME, policy)
+            if not start_attempt(request_id, now, True):
+                failed_requests += 1
+            continue
+        uid, success, duration, first = data
+        in_flight[uid] -= 1
+        if policy is not None:
+            policy.on_finish(uid, duration, success)
+        if success:
+            latencies.append(now - arrivals[request_id])
+            continue
+        first_attempt_failures += first
+        if not start_attempt(request_id, now, False):
+            failed_requests += 1
+
+    latencies.sort()
+    return {
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[int(len(latencies) * 0.99)],
+        "mean": sum(latencies) / len(latencies),
+        "first_attempt_failure_rate": first_attempt_failures / args.n_requests,
+        "failed_requests": failed_requests,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trace", type=str, default=None)
+    parser.add_argument("--n_uids", type=int, default=64)
+    parser.add_argument("--n_requests", type=int, default=5000)
+    parser.add_argument("--rps", type=float, default=4)
+    parser.add_argument("--timeout", type=float, default=32)
+    parser.add_argument("--volume", type=int, default=1000)
+    parser.add_argument("--load_factor", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    if args.trace:
+        with open(args.trace) as f:
+            traces = {int(uid): times for uid, times in json.load(f).items() if times}
+        scores = {}
+    else:
+        traces, scores = synthetic_trace(args.n_uids, args.timeout)
+
+    print(f"miners: {len(traces)}, requests: {args.n_requests}, rps: {args.rps}")
+    for policy_name in ["queue", "random", "least_outstanding", "p2c"]:
+        result = simulate(policy_name, traces, scores, args, args.seed + 1)
+        print(
+            f"{policy_name:>18}: p50 {result['p50']:6.2f}s  p99 {result['p99']:6.2f}s  "
+            f"mean {result['mean']:6.2f}s  "
+            f"first attempt failures {result['first_attempt_failure_rate']:.1%}  "
+            f"failed requests {result['failed_requests']}"
+        )
@@ -0,0 +1,54 @@
+"""
+Microbenchmark for QueryQueue: time and peak memory of update_queue + draining
+get_batch_query for a metagraph of `--n_uids` miners each with `--volume` credits.
+
+    python tests/benchmark_query_queue.py --n_uids 256 --volume 1000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from collections import Counter
+from image_generation_subnet.validator.query_queue import QueryQueue
+
+
+def build_uids_info(n_uids, volume, model_names):
+    return {
+        uid: {"model_name": random.choice(model_names), "rate_limit": volume}
+        for uid in range(n_uids)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_uids", type=int, default=256)
+    parser.add_argument("--volume", type=int, default=1000)
+    parser.add_argument("--batch_size", type=int, default=16)
+    parser.add_argument("--n_models", type=int, default=8)
+    args = parser.parse_args()
+
+    model_names = [f"model_{i}" for i in range(args.n_models)]
+    all_uids_info = build_uids_info(args.n_uids, args.volume, model_names)
+    query_queue = QueryQueue(model_names, time_per_loop=600)
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    query_queue.update_queue(all_uids_info)
+    t1 = time.perf_counter()
+    n_queried = Counter()
+    n_rewarded = 0
+    for _, uids, should_rewards, _ in query_queue.get_batch_query(args.batch_size):
+        n_queried.update(uids)
+        n_rewarded += sum(should_rewards)
+    t2 = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    expected, _ = query_queue.get_rate_limit_by_type(args.volume)
+    assert all(count == expected for count in n_queried.values())
+    assert n_rewarded == len(n_queried) == args.n_uids
+
+    print(f"uids: {args.n_uids}, volume: {args.volume}")
+    print(f"update_queue: {(t1 - t0) * 1000:.2f} ms")
+    print(f"get_batch_query (drain {sum(n_queried.values())} items): {t2 - t1:.3f} s")
+    print(f"peak traced memory: {peak / 1024 / 1024:.2f} MiB")
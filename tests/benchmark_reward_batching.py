@@ -0,0 +1,126 @@
+"""
+Validator response generation in RewardApp: one request per base synapse versus
+batched multi-prompt requests with pipelining, against a simulated validator
+endpoint (fixed cost per request for loading/serialization plus a cost per
+prompt) and fakeredis.
+
+    python tests/benchmark_reward_batching.py --n_synapses 64 --request_cost 0.3 --prompt_cost 0.1
+"""
+import argparse
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+import fakeredis
+import httpx
+from services.offline_rewarding.redis_client import RedisClient
+from services.offline_rewarding.reward_app import RewardApp
+
+
+def make_endpoint(args, calls):
+    lock = asyncio.Lock()
+
+    async def handler(request):
+        data = json.loads(request.content)
+        calls.append(len(data["prompts"]))
+        await asyncio.sleep(args.request_cost)
+        # One GPU: prompts of concurrent requests are generated one at a time
+        async with lock:
+            await asyncio.sleep(args.prompt_cost * len(data["prompts"]))
+        outputs = [
+            dict(prompt, image=f"image-{prompt['prompt']}")
+            for prompt in data["prompts"]
+        ]
+        return httpx.Response(200, json=outputs)
+
+    return handler
+
+
+def make_app(args, batch_size, max_in_flight, calls):
+    server = fakeredis.FakeServer()
+    redis_client = RedisClient()
+    redis_client.client = fakeredis.FakeRedis(server=server)
+    redis_client.async_client = fakeredis.aioredis.FakeRedis(server=server)
+    # RewardApp.__init__ loads the reward model, only the generation stage is needed here
+    app = RewardApp.__new__(RewardApp)
+    app.validator = SimpleNamespace(nicheimage_catalogue={})
+    app.redis_client = redis_client
+    app.blob_store = redis_client.blob_store
+    app.log_validator_response_engine = "redis"
+    app.redis_key_ttl = 60
+    app.reward_endpoint = "http://validator-endpoint/generate"
+    app.batch_size = batch_size
+    app.max_in_flight = max_in_flight
+    app.current_model = None
+    app.http_client = httpx.AsyncClient(
+        transport=httpx.MockTransport(make_endpoint(args, calls))
+    )
+    return app
+
+
+def make_synapses(app, n_synapses, n_models):
+    synapses = []
+    for i in range(n_synapses):
+        base_synapse = {
+            "prompt": str(i % (n_synapses * 3 // 4)),  # some prompts repeat
+            "seed": 0,
+            "model_name": f"model-{i % n_models}",
+            "pipeline_type": "txt2img",
+            "pipeline_params": {},
+            "conditional_image": "",
+            "message_id": f"{i}-0",
+        }
+        base_synapse["hash_id"] = app.get_base_synapse_hashid(base_synapse)
+        synapses.append(base_synapse)
+    return synapses
+
+
+async def run(args, batch_size, max_in_flight):
+    calls = []
+    app = make_app(args, batch_size, max_in_flight, calls)
+    synapses = make_synapses(app, args.n_synapses, args.n_models)
+    groups = app.group_synapse_by_model(synapses)
+    start = time.perf_counter()
+    success_ids = []
+    for model_name, base_synapses in groups.items():
+        if batch_size == 1 and max_in_flight == 1:
+            # Previous behaviour: one request and one cache round trip per base synapse
+            for base_synapse in base_synapses:
+                ids, _ = await app.generate_response([base_synapse], model_name)
+                success_ids.extend(ids)
+        else:
+            ids, _ = await app.generate_response(base_synapses, model_name)
+            success_ids.extend(ids)
+    elapsed = time.perf_counter() - start
+    assert len(success_ids) == args.n_synapses
+    cached = await app.get_log_validators([x["hash_id"] for x in synapses])
+    assert all(
+        cached[x["hash_id"]]["validator_response"] == f"image-{x['prompt']}"
+        for x in synapses
+    )
+    return elapsed, calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_synapses", type=int, default=64)
+    parser.add_argument("--n_models", type=int, default=2)
+    parser.add_argument("--request_cost", type=float, default=0.3)
+    parser.add_argument("--prompt_cost", type=float, default=0.1)
+    parser.add_argument("--batch_size", type=int, default=8)
+    parser.add_argument("--max_in_flight", type=int, default=2)
+    args = parser.parse_args()
+
+    for name, batch_size, max_in_flight in [
+        ("one prompt per request", 1, 1),
+        ("batched", args.batch_size, 1),
+        ("batched + pipelined", args.batch_size, args.max_in_flight),
+    ]:
+        elapsed, calls = asyncio.run(run(args, batch_size, max_in_flight))
+        print(
+            f"{name:24s} {elapsed:6.2f}s  requests: {len(calls):3d}  prompts: {sum(calls)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
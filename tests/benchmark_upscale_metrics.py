@@ -0,0 +1,164 @@
+"""
+Upscale reward metrics at 2048x2048: the previous per-miner skimage PSNR/SSIM versus
+the batched torch implementation in `services.rewarding.upscale_metrics`, whole image
+and tile-sampled. Reports the time per request and the largest difference to skimage
+over miner images degraded in different ways (noise, blur, JPEG, a one pixel shift).
+
+    python tests/benchmark_upscale_metrics.py --n_miners 4
+    python tests/benchmark_upscale_metrics.py --device cuda --n_tiles 16 32 64
+"""
+import argparse
+import random
+import time
+from io import BytesIO
+import numpy as np
+import torch
+from PIL import Image, ImageFilter
+from skimage.metrics import peak_signal_noise_ratio as psnr
+from skimage.metrics import structural_similarity as ssim
+from services.rewarding.upscale_metrics import psnr_ssim
+
+
+def make_validator_image(size, seed):
+    # Smooth structure plus fine texture, closer to a photo than uniform noise
+    rng = np.random.default_rng(seed)
+    coarse = Image.fromarray(
+        rng.integers(0, 255, (size // 64, size // 64, 3), dtype=np.uint8)
+    )
+    base = np.asarray(coarse.resize((size, size), Image.BICUBIC)).astype(np.float32)
+    base += rng.normal(0, 12, base.shape)
+    return Image.fromarray(base.clip(0, 255).astype(np.uint8))
+
+
+def degrade(image, kind, rng):
+    if kind.startswith("noise"):
+        sigma = float(kind[len("noise") :])
+        pixels = np.asarray(image).astype(np.float32) + rng.normal(
+            0, sigma, (image.height, image.width, 3)
+        )
+        return Image.fromarray(pixels.clip(0, 255).astype(np.uint8))
+    if kind == "blur":
+        return image.filter(ImageFilter.GaussianBlur(1.5))
+    if kind == "bicubic":
+        return image.resize(
+            (image.width // 2, image.height // 2), Image.BICUBIC
+        ).resize(image.size, Image.BICUBIC)
+    if kind == "jpeg":
+        buffer = BytesIO()
+        image.save(buffer, format="JPEG", quality=30)
+        return Image.open(BytesIO(buffer.getvalue())).convert("RGB")
+    if kind == "shift":
+        return Image.fromarray(np.roll(np.asarray(image), 1, axis=1))
+    raise ValueError(kind)
+
+
+def skimage_metrics(validator_image, miner_images):
+    validator_array = np.array(validator_image.convert("L"))
+    values = []
+    for miner_image in miner_images:
+        miner_array = np.array(miner_image.convert("L"))
+        values.append(
+            (
+                psnr(validator_array, miner_array),
+                ssim(validator_array, miner_array, full=True)[0],
+            )
+        )
+    return [v[0] for v in values], [v[1] for v in values]
+
+
+def max_errors(expected, results):
+    return (
+        max(abs(a - b) for a, b in zip(expected[0], results[0])),
+        max(abs(a - b) for a, b in zip(expected[1], results[1])),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=2048)
+    parser.add_argument("--n_miners", type=int, default=4)
+    parser.add_argument("--n_rounds", type=int, default=3)
+    parser.add_argument(
+        "--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu"
+    )
+    parser.add_argument("--batch_size", type=int, default=4)
+    parser.add_argument("--tile_size", type=int, default=256)
+    parser.add_argument("--n_tiles", type=int, nargs="+", default=[16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    kinds = ["noise2", "noise8", "blur", "bicubic", "jpeg", "shift"]
+
+    rng = np.random.default_rng(args.seed)
+    rounds = []
+    for r in range(args.n_rounds):
+        validator_image = make_validator_image(args.size, args.seed + r)
+        miner_images = [
+            degrade(validator_image, kinds[(r + i) % len(kinds)], rng)
+            for i in range(args.n_miners)
+        ]
+        rounds.append((validator_image, miner_images))
+    # Error statistics over every degradation, on the first validator image
+    error_round = (rounds[0][0], [degrade(rounds[0][0], kind, rng) for kind in kinds])
+    print(
+        f"{args.size}x{args.size}, miners per request: {args.n_miners}, device: {args.device}"
+    )
+
+    def run(name, fn):
+        fn(*rounds[0])  # warm up
+        start = time.perf_counter()
+        results = [fn(*images) for images in rounds]
+        elapsed = (time.perf_counter() - start) / len(rounds)
+        print(f"{name:<28} {elapsed * 1000:9.1f} ms/request")
+        return results
+
+    expected = run("skimage, per miner", skimage_metrics)
+    results = run(
+        "torch, whole image",
+        lambda v, m: psnr_ssim(v, m, device=args.device, batch_size=args.batch_size),
+    )
+    psnr_error, ssim_error = max(
+        (max_errors(e, r) for e, r in zip(expected, results)),
+        key=lambda errors: errors[1],
+    )
+    print(f"{'':<28} max |dPSNR| {psnr_error:.2e} dB, max |dSSIM| {ssim_error:.2e}")
+
+    reference = skimage_metrics(*error_round)
+    for n_tiles in args.n_tiles:
+        run(
+            f"torch, {n_tiles} tiles of {args.tile_size}",
+            lambda v, m: psnr_ssim(
+                v,
+                m,
+                device=args.device,
+                batch_size=args.batch_size,
+                tile_size=args.tile_size,
+                n_tiles=n_tiles,
+            ),
+        )
+        # Spread of the estimate over many tile draws, per degradation
+        draws = [
+            psnr_ssim(
+                *error_round,
+                device=args.device,
+                batch_size=args.batch_size,
+                tile_size=args.tile_size,
+                n_tiles=n_tiles,
+                rng=random.Random(seed),
+            )
+            for seed in range(20)
+        ]
+        psnr_errors = np.abs(np.array([d[0] for d in draws]) - np.array(reference[0]))
+        ssim_errors = np.abs(np.array([d[1] for d in draws]) - np.array(reference[1]))
+        print(
+            f"{'':<28} max |dPSNR| {psnr_errors.max():.3f} dB, max |dSSIM| {ssim_errors.max():.4f} over 20 draws"
+        )
+        for kind, p, s, ref_p, ref_s in zip(
+            kinds, psnr_errors.max(axis=0), ssim_errors.max(axis=0), *reference
+        ):
+            print(
+                f"{'':<30} {kind:<8} PSNR {ref_p:6.2f} (+-{p:.3f})  SSIM {ref_s:.4f} (+-{s:.4f})"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Adaptive miner timeouts with heavy-tailed latencies: each loop queries miners with the
+current timeout and observes the responses. Recording only the responses that beat the
+timeout lets the quantile shrink with the timeout; recording the cut-off requests at their
+timeout keeps the share of cut-off requests below `1 - quantile`. With a small margin the
+first goes down to the `min_fraction` floor and cuts off about twice as many requests.
+
+    python tests/test_adaptive_timeout.py --n_loops 80
+"""
+import argparse
+import numpy as np
+from image_generation_subnet.validator import AdaptiveTimeout
+
+
+def simulate(latencies, max_timeout, censored, n_requests, quantile, margin):
+    adaptive_timeout = AdaptiveTimeout(
+        {"model": max_timeout}, quantile=quantile, margin=margin
+    )
+    timeouts, cut_off = [], []
+    for loop_latencies in latencies:
+        timeout = adaptive_timeout.get_timeout("model")
+        process_times = [t if t <= timeout else -1 for t in loop_latencies]
+        timed_out = [timeout for t in loop_latencies if t > timeout]
+        adaptive_timeout.observe("model", process_times, timed_out if censored else [])
+        with adaptive_timeout.lock:
+            adaptive_timeout.sketches["model"].decay(adaptive_timeout.decay_factor)
+        timeouts.append(timeout)
+        cut_off.append(len(timed_out) / n_requests)
+    return timeouts, cut_off
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_loops", type=int, default=80)
+    parser.add_argument("--n_requests", type=int, default=256)
+    parser.add_argument("--max_timeout", type=float, default=64)
+    parser.add_argument("--quantile", type=float, default=0.99)
+    parser.add_argument("--margins", type=float, nargs="+", default=[1.5, 1.2, 1.1])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Log-normal latencies, median 2 s: the true p99 is about 20 s
+    rng = np.random.default_rng(args.seed)
+    latencies = rng.lognormal(np.log(2), 1.0, (args.n_loops, args.n_requests))
+    true_quantile = np.quantile(latencies, args.quantile)
+    print(
+        f"true p{int(args.quantile * 100)}: {true_quantile:.1f} s, catalogue timeout: {args.max_timeout:.0f} s"
+    )
+
+    floor = args.max_timeout * 0.25
+    for margin in args.margins:
+        results = {}
+        for censored in (False, True):
+            timeouts, cut_off = simulate(
+                latencies,
+                args.max_timeout,
+                censored,
+                args.n_requests,
+                args.quantile,
+                margin,
+            )
+            # Skip the first loops, queried with the catalogue timeout until enough samples
+            steady = slice(args.n_loops // 2, None)
+            results[censored] = (min(timeouts[steady]), np.mean(cut_off[steady]))
+            name = "successes + cut-off" if censored else "successes only"
+            print(
+                f"margin {margin}, {name:<20} timeout {timeouts[-1]:5.1f} s"
+                f" (min {results[censored][0]:5.1f} s), cut off {results[censored][1]:.2%} of requests"
+            )
+        timeout, cut_off = results[True]
+        assert (
+            timeout > floor
+        ), f"margin {margin}: timeout down to the {floor:.0f} s floor"
+        assert (
+            cut_off <= 1 - args.quantile
+        ), f"margin {margin}: {cut_off:.2%} of the requests cut off"
+        assert (
+            results[False][1] > cut_off
+        ), "observing only successes should cut off more requests"
+
+
+if __name__ == "__main__":
+    main()
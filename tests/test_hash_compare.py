@@ -0,0 +1,158 @@
+"""
+Checks that the batched average hash, hash matching and NSFW/black-image filter
+give the same results as the per-image imagehash implementation, and times the
+matching of one validator image against a batch of miner images.
+
+The previous NSFW filter compared 6x6 hashes with the hex string of an 8x8 black
+hash and never fired; by default the batched filter keeps that outcome. The
+opt-in luminance check must flag black images only, not white or solid colours.
+
+    python tests/test_hash_compare.py --n_miners 8 --size 1024
+"""
+import argparse
+import time
+import imagehash
+import numpy as np
+from PIL import Image
+from services.rewarding.hash_compare import (
+    average_hashes,
+    is_black,
+    matching_images,
+    nsfw_filter_batch,
+)
+
+
+def legacy_black_hash(H, W):
+    image = Image.new("RGB", (W, H), color="black")
+    return str(imagehash.average_hash(image, hash_size=8))
+
+
+def legacy_matching_image(miner_image, validator_image):
+    return (
+        imagehash.average_hash(miner_image, hash_size=8)
+        - imagehash.average_hash(validator_image, hash_size=8)
+    ) <= 6
+
+
+def legacy_nsfw_filter(validator_image, miner_image):
+    W, H = validator_image.size
+    validator_hash = str(imagehash.average_hash(validator_image, hash_size=6))
+    miner_hash = str(imagehash.average_hash(miner_image, hash_size=6))
+    black_hash = legacy_black_hash(H, W)
+    if validator_hash != black_hash and miner_hash == black_hash:
+        return 1
+    if validator_hash == black_hash and miner_hash != black_hash:
+        return 2
+    return 0
+
+
+def sample_images(rng, size):
+    images = [
+        Image.fromarray(rng.integers(0, 255, (size, size, 3), dtype=np.uint8)),
+        Image.fromarray(rng.integers(0, 255, (size // 2, size, 3), dtype=np.uint8)),
+        Image.new("RGB", (size, size), color="black"),
+        Image.new("RGB", (size // 3, size), color="black"),
+        Image.new("RGB", (size, size), color=(128, 128, 128)),
+        Image.new("RGB", (size, size), color="white"),
+        Image.new("RGB", (size, size), color=(0, 255, 0)),
+    ]
+    nearly_black = np.zeros((size, size, 3), dtype=np.uint8)
+    nearly_black[: size // 4, : size // 4] = 3
+    images.append(Image.fromarray(nearly_black))
+    return images
+
+
+def check_equivalence(size):
+    rng = np.random.default_rng(0)
+    images = sample_images(rng, size)
+    for hash_size in [6, 8, 16]:
+        expected = np.stack(
+            [
+                imagehash.average_hash(image, hash_size=hash_size).hash.flatten()
+                for image in images
+            ]
+        )
+        assert (
+            average_hashes(images, hash_size=hash_size) == expected
+        ).all(), hash_size
+    for validator_image in images:
+        expected = [
+            legacy_nsfw_filter(validator_image, miner_image) for miner_image in images
+        ]
+        assert nsfw_filter_batch(validator_image, images) == expected
+        expected = [
+            legacy_matching_image(miner_image, validator_image)
+            for miner_image in images
+        ]
+        assert matching_images(images, validator_image) == expected
+    print(
+        f"average hashes, matching and NSFW checks match imagehash on {len(images)} images"
+    )
+
+
+def check_black_detection(size):
+    rng = np.random.default_rng(0)
+    # random, random, black, black, gray, white, green, nearly black
+    images = sample_images(rng, size)
+    assert is_black(images) == [False, False, True, True, False, False, False, True]
+    white, green, black = images[5], images[6], images[2]
+    assert nsfw_filter_batch(white, [white, green, black], max_luminance=10) == [
+        0,
+        0,
+        1,
+    ]
+    assert nsfw_filter_batch(black, [white, green, black], max_luminance=10) == [
+        2,
+        2,
+        0,
+    ]
+    print("luminance check flags black images, not white or solid colours")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_miners", type=int, default=8)
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--n_rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    check_equivalence(args.size // 4)
+    check_black_detection(args.size // 4)
+
+    rng = np.random.default_rng(1)
+    validator_image = Image.fromarray(
+        rng.integers(0, 255, (args.size, args.size, 3), dtype=np.uint8)
+    )
+    miner_images = [
+        Image.fromarray(rng.integers(0, 255, (args.size, args.size, 3), dtype=np.uint8))
+        for _ in range(args.n_miners)
+    ]
+
+    start = time.perf_counter()
+    for _ in range(args.n_rounds):
+        expected = [
+            legacy_nsfw_filter(validator_image, miner_image)
+            or legacy_matching_image(miner_image, validator_image)
+            for miner_image in miner_images
+        ]
+    legacy_time = (time.perf_counter() - start) / args.n_rounds
+
+    start = time.perf_counter()
+    for _ in range(args.n_rounds):
+        nsfw_checks = nsfw_filter_batch(validator_image, miner_images)
+        result = [
+            nsfw_check or match
+            for nsfw_check, match in zip(
+                nsfw_checks, matching_images(miner_images, validator_image)
+            )
+        ]
+    batch_time = (time.perf_counter() - start) / args.n_rounds
+    assert result == expected
+
+    print(
+        f"NSFW filter + matching, {args.n_miners} miners at {args.size}px: {legacy_time * 1e3:.1f} ms -> {batch_time * 1e3:.1f} ms per request"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Consumer-group checks and throughput of the offline reward streams, against
+fakeredis:
+- messages are shared between workers without being processed twice,
+- unacknowledged messages are reclaimed once idle,
+- both stream loops progress concurrently on one event loop,
+- a slow custom_offline reward does not stall the base synapse loop,
+- pipelined bulk ack/delete versus one XREAD from 0-0 and one XDEL per message.
+
+    python tests/test_redis_streams.py --n_messages 5000 --batch_size 100
+"""
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+import fakeredis
+from services.offline_rewarding.redis_client import RedisClient
+from services.offline_rewarding.reward_app import RewardApp
+
+STREAM = "synapse_data"
+BASE_STREAM = "base_synapse"
+
+
+def new_client(server, consumer_name, claim_idle_ms=10000):
+    redis_client = RedisClient(consumer_name=consumer_name, claim_idle_ms=claim_idle_ms)
+    redis_client.client = fakeredis.FakeRedis(server=server)
+    redis_client.async_client = fakeredis.aioredis.FakeRedis(server=server)
+    return redis_client
+
+
+def publish(redis_client, n_messages, stream_name=STREAM):
+    pipe = redis_client.client.pipeline(transaction=False)
+    for i in range(n_messages):
+        pipe.xadd(stream_name, {"data": f'{{"index": {i}}}'})
+    pipe.execute()
+
+
+def consume_legacy(redis_client, batch_size):
+    """Previous behaviour: XREAD from 0-0 on every poll, one XDEL per message."""
+    processed = 0
+    while True:
+        messages = redis_client.client.xread({STREAM: "0-0"}, count=batch_size)
+        if not messages:
+            return processed
+        for _, message_list in messages:
+            for message_id, message_data in message_list:
+                redis_client.decode_message_stream(message_data)
+                redis_client.client.xdel(STREAM, message_id)
+                processed += 1
+
+
+async def consume_batch(redis_client, batch_size, seen):
+    messages = await redis_client.read_from_stream(STREAM, batch_size, None)
+    if not messages:
+        return 0
+    message_ids = []
+    for _, message_list in messages:
+        for message_id, message_data in message_list:
+            seen.append(redis_client.decode_message_stream(message_data)["data"])
+            message_ids.append(message_id)
+    await redis_client.ack_messages(STREAM, message_ids)
+    return len(message_ids)
+
+
+async def consume_group(redis_client, batch_size):
+    processed, seen = 0, []
+    while True:
+        count = await consume_batch(redis_client, batch_size, seen)
+        if not count:
+            return processed
+        processed += count
+
+
+async def check_shared_consumers(n_messages, batch_size):
+    server = fakeredis.FakeServer()
+    workers = [new_client(server, f"worker-{i}") for i in range(2)]
+    publish(workers[0], n_messages)
+    seen = []
+    counts = [0, 0]
+    # Alternate the two workers batch by batch
+    while True:
+        done = True
+        for i, worker in enumerate(workers):
+            count = await consume_batch(worker, batch_size, seen)
+            done = done and not count
+            counts[i] += count
+        if done:
+            break
+    assert (
+        len(seen) == n_messages and len(set(seen)) == n_messages
+    ), "messages processed twice"
+    assert all(counts), counts
+    assert workers[0].client.xlen(STREAM) == 0
+    print(f"two workers processed {counts} messages, no duplicates")
+
+
+async def check_reclaim():
+    server = fakeredis.FakeServer()
+    dead_worker = new_client(server, "dead", claim_idle_ms=50)
+    worker = new_client(server, "alive", claim_idle_ms=50)
+    publish(worker, 10)
+    assert len((await dead_worker.read_from_stream(STREAM, 10, None))[0][1]) == 10
+    assert await worker.read_from_stream(STREAM, 10, None) == []
+    await asyncio.sleep(0.1)
+    reclaimed = (await worker.read_from_stream(STREAM, 10, None))[0][1]
+    assert len(reclaimed) == 10
+    await worker.ack_messages(STREAM, [message_id for message_id, _ in reclaimed])
+    assert worker.client.xpending(STREAM, worker.group_name)["pending"] == 0
+    print("pending messages of a dead worker were reclaimed")
+
+
+async def check_process_loops():
+    """
+    Both stream loops share one event loop, like RewardApp.run. Messages the
+    reward callback does not report as successful stay pending and are retried.
+    """
+    server = fakeredis.FakeServer()
+    worker = new_client(server, "worker", claim_idle_ms=50)
+    publish(worker, 4)
+    publish(worker, 3, BASE_STREAM)
+    calls = {STREAM: [], BASE_STREAM: []}
+
+    def make_callback(stream_name):
+        async def callback(messages):
+            calls[stream_name].append(len(messages))
+            ids = [x["id"] for x in messages]
+            if stream_name == STREAM and len(calls[stream_name]) == 1:
+                return ids[:2], ids[2:], {"count_success": {"model": 2}}
+            return ids, [], {"count_success": {"model": len(ids)}}
+
+        return callback
+
+    tasks = [
+        asyncio.ensure_future(
+            worker.process_message_from_stream_async(
+                stream_name, make_callback(stream_name), count=10, block=10
+            )
+        )
+        for stream_name in (STREAM, BASE_STREAM)
+    ]
+    deadline = time.time() + 10
+    while (
+        worker.client.xlen(STREAM) or worker.client.xlen(BASE_STREAM)
+    ) and time.time() < deadline:
+        await asyncio.sleep(0.05)
+    for task in tasks:
+        task.cancel()
+    assert calls[STREAM][0] == 4 and sum(calls[STREAM]) == 6, calls
+    assert sum(calls[BASE_STREAM]) == 3, calls
+    assert worker.count_success == {STREAM: {"model": 4}, BASE_STREAM: {"model": 3}}
+    print("both loops ran on one event loop, unprocessed messages were retried")
+
+
+async def check_custom_reward_off_loop(reward_seconds=1.0):
+    """
+    A custom_offline reward (GoJourney makes one blocking HTTP call per miner) runs while
+    the base synapse loop shares the event loop; the loop must keep consuming meanwhile.
+    """
+    server = fakeredis.FakeServer()
+    worker = new_client(server, "worker", claim_idle_ms=50)
+    publish(worker, 20, BASE_STREAM)
+    progress = []
+
+    async def base_callback(messages):
+        progress.append(time.perf_counter())
+        ids = [x["id"] for x in messages]
+        return ids, [], {"count_success": {"model": len(ids)}}
+
+    def slow_reward_url(base_synapse, synapses, uids):
+        time.sleep(reward_seconds)
+        return uids, [1.0] * len(uids)
+
+    app = RewardApp.__new__(RewardApp)
+    app.validator = SimpleNamespace(
+        nicheimage_catalogue={
+            "GoJourney": {
+                "reward_url": slow_reward_url,
+                "reward_type": "custom_offline",
+            }
+        },
+        miner_manager=SimpleNamespace(
+            all_uids_info={1: {"reward_scale": 1.0}},
+            update_scores=lambda uids, rewards: None,
+        ),
+    )
+    app.blob_store = worker.blob_store
+    app.total_uids, app.total_rewards = [], []
+    data = {
+        "GoJourney": [
+            {
+                "message_id": "1-0",
+                "base_data": {"prompt": "a cat", "model_name": "GoJourney"},
+                "all_miner_data": [{}],
+                "uids": [1],
+            }
+        ]
+    }
+
+    loop_task = asyncio.ensure_future(
+        worker.process_message_from_stream_async(
+            BASE_STREAM, base_callback, count=1, block=10
+        )
+    )
+    start = time.perf_counter()
+    success_ids, _ = await app.categorize_rewards_type(data)
+    reward_end = time.perf_counter()
+    loop_task.cancel()
+    assert success_ids == ["1-0"] and app.total_uids == [1], (
+        success_ids,
+        app.total_uids,
+    )
+    assert reward_end - start >= reward_seconds
+    during = [t for t in progress if start <= t < reward_end]
+    assert (
+        len(during) == 20
+    ), f"base synapse loop stalled: {len(during)} of 20 batches during the reward"
+    print(
+        f"base synapse loop processed {len(during)} batches during a {reward_seconds:.1f} s custom reward"
+    )
+
+
+async def main(args):
+    await check_shared_consumers(args.n_messages, args.batch_size)
+    await check_reclaim()
+    await check_process_loops()
+    await check_custom_reward_off_loop()
+
+    legacy = new_client(fakeredis.FakeServer(), "legacy")
+    publish(legacy, args.n_messages)
+    start = time.perf_counter()
+    assert consume_legacy(legacy, args.batch_size) == args.n_messages
+    legacy_time = time.perf_counter() - start
+
+    grouped = new_client(fakeredis.FakeServer(), "grouped")
+    publish(grouped, args.n_messages)
+    start = time.perf_counter()
+    assert await consume_group(grouped, args.batch_size) == args.n_messages
+    group_time = time.perf_counter() - start
+
+    print(f"XREAD + XDEL per message: {args.n_messages / legacy_time:.0f} messages/s")
+    print(
+        f"XREADGROUP + pipelined XACK/XDEL: {args.n_messages / group_time:.0f} messages/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_messages", type=int, default=5000)
+    parser.add_argument("--batch_size", type=int, default=100)
+    asyncio.run(main(parser.parse_args()))
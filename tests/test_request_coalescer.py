@@ -0,0 +1,42 @@
+"""
+Keys of the organic request coalescer: computing one must leave the synapse sent to
+miners untouched, and requests that differ only by seed must not share a cache entry.
+
+    python tests/test_request_coalescer.py
+"""
+
+from image_generation_subnet.protocol import MultiModalGenerating, TextGenerating
+from image_generation_subnet.validator import request_key
+
+
+def check_input_unchanged():
+    synapse = MultiModalGenerating(
+        prompt="Describe the image",
+        model_name="Pixtral_12b",
+        pipeline_params={"logprobs": 5},
+    )
+    request_key(synapse)
+    assert synapse.pipeline_params == {"logprobs": 5}, synapse.pipeline_params
+    # What the miner computes from the synapse it receives
+    data = synapse.deserialize_input()
+    assert data["logprobs"] is True and data["top_logprobs"] == 5, data
+
+
+def check_seed_and_model_in_key():
+    base = {
+        "prompt_input": "Hello",
+        "model_name": "Gemma7b",
+        "pipeline_params": {"max_tokens": 64},
+    }
+    key = request_key(TextGenerating(**base, seed=1))
+    assert key == request_key(TextGenerating(**base, seed=1))
+    assert key != request_key(TextGenerating(**base, seed=2))
+    assert key != request_key(
+        TextGenerating(**{**base, "model_name": "Llama3_70b"}, seed=1)
+    )
+
+
+if __name__ == "__main__":
+    check_input_unchanged()
+    check_seed_and_model_in_key()
+    print("request keys: ok")
@@ -0,0 +1,119 @@
+"""
+Equivalence of the fast path in CosineSimilarityReward: on a labelled sample
+of validator/miner pairs, rewards with the fast path must equal the rewards of
+the embedding model alone, while the exact pairs skip the model. Identical
+pixels embed identically, so this holds with random weights as well.
+
+`--max_distance` adds the opt-in average hash tier and reports the reward
+differences it makes; with the pretrained model on near pairs they are the
+gap between 1.0 and the model's reward.
+
+Labels: "exact" (same pixels, possibly re-encoded losslessly), "near"
+(JPEG re-encode or slight noise, what non-bit-exact honest miners return) and
+"different" (another image, or the same scene heavily altered).
+
+    python tests/test_reward_fast_path.py --n_images 8
+    python tests/test_reward_fast_path.py --max_distance 4
+"""
+import argparse
+import base64
+import time
+from io import BytesIO
+import numpy as np
+from PIL import Image, ImageFilter
+from services.rewarding.cosine_similarity_compare import CosineSimilarityReward
+
+
+def natural_image(rng, size):
+    """Smooth random scene: low resolution noise upsampled, plus some texture."""
+    low = rng.integers(0, 255, (8, 8, 3), dtype=np.uint8)
+    image = Image.fromarray(low).resize((size, size), Image.BICUBIC)
+    texture = rng.normal(0, 6, (size, size, 3))
+    return Image.fromarray((np.asarray(image) + texture).clip(0, 255).astype(np.uint8))
+
+
+def reencode(image, format, **kwargs):
+    buffer = BytesIO()
+    image.save(buffer, format=format, **kwargs)
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def make_pairs(n_images, size, seed=0):
+    rng = np.random.default_rng(seed)
+    scenes = [natural_image(rng, size) for _ in range(n_images)]
+    pairs = []
+    for i, validator_image in enumerate(scenes):
+        noisy = np.asarray(validator_image) + rng.normal(0, 1.5, (size, size, 3))
+        miners = [
+            ("exact", validator_image.copy()),
+            ("exact", reencode(validator_image, "PNG")),
+            ("near", reencode(validator_image, "JPEG", quality=95)),
+            ("near", Image.fromarray(noisy.clip(0, 255).astype(np.uint8))),
+            ("different", scenes[(i + 1) % n_images]),
+            (
+                "different",
+                validator_image.filter(ImageFilter.GaussianBlur(12)).rotate(90),
+            ),
+        ]
+        pairs.append((validator_image, miners))
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_images", type=int, default=8)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--hash_size", type=int, default=16)
+    parser.add_argument("--max_distance", type=int, default=None)
+    parser.add_argument(
+        "--random_weights", action="store_true", help="Run without the pretrained model"
+    )
+    args = parser.parse_args()
+
+    reference = CosineSimilarityReward(
+        device="cpu", fast_path=False, pretrained=not args.random_weights
+    )
+    tiered = CosineSimilarityReward(
+        device="cpu",
+        pretrained=False,
+        fast_path_hash_size=args.hash_size,
+        fast_path_max_distance=args.max_distance,
+    )
+    tiered.model.load_state_dict(reference.model.state_dict())
+    pairs = make_pairs(args.n_images, args.size)
+
+    start = time.perf_counter()
+    expected = [
+        reference.get_reward(v, [m for _, m in miners], "txt2img")
+        for v, miners in pairs
+    ]
+    reference_time = time.perf_counter() - start
+    start = time.perf_counter()
+    results = [
+        tiered.get_reward(v, [m for _, m in miners], "txt2img") for v, miners in pairs
+    ]
+    tiered_time = time.perf_counter() - start
+
+    mismatches, max_difference = {}, 0.0
+    for (_, miners), exp, res in zip(pairs, expected, results):
+        for (label, _), a, b in zip(miners, exp, res):
+            if abs(a - b) > 1e-6:
+                mismatches[label] = mismatches.get(label, 0) + 1
+                max_difference = max(max_difference, abs(a - b))
+    n_pairs = sum(len(miners) for _, miners in pairs)
+    skipped = tiered.match_stats["exact"] + tiered.match_stats["perceptual"]
+    print(f"pairs: {n_pairs}, match stats: {tiered.match_stats}")
+    print(
+        f"skipped the model: {skipped / n_pairs:.0%}, time {reference_time:.1f}s -> {tiered_time:.1f}s"
+    )
+    print(
+        f"reward mismatches by label: {mismatches or 'none'}, max difference {max_difference:.3f}"
+    )
+    assert tiered.match_stats["exact"] == 2 * args.n_images
+    if args.max_distance is None:
+        assert tiered.match_stats["perceptual"] == 0
+        assert not mismatches, mismatches
+
+
+if __name__ == "__main__":
+    main()
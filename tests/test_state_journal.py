@@ -0,0 +1,105 @@
+"""
+Replay and crash-recovery checks for the validator state journal.
+"""
+
+import os
+import tempfile
+from types import SimpleNamespace
+import torch
+from image_generation_subnet.validator import MinerManager, StateJournal
+
+
+def new_miner_manager(n_uids=8):
+    validator = SimpleNamespace(metagraph=SimpleNamespace(uids=torch.arange(n_uids)))
+    return MinerManager(validator)
+
+
+def restore(directory):
+    journal = StateJournal(directory, compact_size=1024)
+    snapshot, records = journal.load()
+    miner_manager = new_miner_manager()
+    if snapshot is not None:
+        miner_manager.all_uids_info = snapshot["all_uids_info"]
+    miner_manager.replay(records)
+    miner_manager.journal = journal
+    return miner_manager, journal
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        # Only then may the validator migrate a legacy state.pt
+        assert not StateJournal(directory).exists()
+        miner_manager, journal = restore(directory)
+        miner_manager._set_identity(
+            3,
+            {
+                "model_name": "AnimeV3",
+                "total_volume": 100,
+                "rate_limit": 5,
+                "min_stake": 10000,
+                "device_info": {},
+            },
+        )
+        miner_manager._record("identity", [3, miner_manager.all_uids_info[3]])
+        for i in range(200):
+            miner_manager.update_scores([3, 4], [i / 200, 1.0])
+            miner_manager.update_metadata([3], [i * 0.1])
+            if journal.should_compact():
+                with miner_manager.lock:
+                    journal.compact(
+                        {
+                            "step": i,
+                            "all_uids_info": miner_manager.all_uids_info.to_dict(),
+                        }
+                    )
+        miner_manager.update_scores([5], [0.5])
+        journal.sync()
+        expected = miner_manager.all_uids_info.to_dict()
+        journal.close()
+
+        # A torn write at the end of the journal is dropped on the next load.
+        journal_path = os.path.join(directory, "state_journal.msgpack")
+        with open(journal_path, "ab") as f:
+            f.write(b"\x93\x05")
+        restored, journal = restore(directory)
+        assert restored.all_uids_info.to_dict() == expected
+        journal.close()
+
+        # A crash after the snapshot rename but before the truncate replays nothing twice.
+        with open(journal_path, "rb") as f:
+            stale_tail = f.read()
+        restored, journal = restore(directory)
+        with restored.lock:
+            journal.compact(
+                {"step": 0, "all_uids_info": restored.all_uids_info.to_dict()}
+            )
+        journal.close()
+        with open(journal_path, "wb") as f:
+            f.write(stale_tail)
+        restored, journal = restore(directory)
+        assert restored.all_uids_info.to_dict() == expected
+        journal.close()
+
+        # A corrupt snapshot is moved aside and later records are still written.
+        snapshot_path = os.path.join(directory, "state_snapshot.msgpack")
+        with open(snapshot_path, "r+b") as f:
+            f.truncate(f.seek(0, os.SEEK_END) // 2)
+        assert StateJournal(directory).exists()
+        restored, journal = restore(directory)
+        assert (
+            restored.all_uids_info.to_dict()
+            == new_miner_manager().all_uids_info.to_dict()
+        )
+        assert any(
+            name.startswith("state_snapshot.msgpack.corrupt-")
+            for name in os.listdir(directory)
+        )
+        restored.update_scores([5], [0.5])
+        journal.sync()
+        expected = restored.all_uids_info.to_dict()
+        journal.close()
+        assert os.path.getsize(journal_path) > 0
+        restored, journal = restore(directory)
+        assert restored.all_uids_info.to_dict() == expected
+        journal.close()
+    print("State journal replay matches the in-memory state")
@@ -0,0 +1,84 @@
+"""
+Check that the vectorized weight computation matches the per-model loop it
+replaced in `Validator.update_scores_on_chain`.
+"""
+
+import random
+from types import SimpleNamespace
+import torch
+from image_generation_subnet.validator import MinerManager, compute_weights
+
+MODELS = {
+    "AnimeV3": ("image_generation", 0.2),
+    "JuggernautXL": ("image_generation", 0.2),
+    "OpenGeneral": ("open_category", 0.3),
+    "OpenDigitalArt": ("open_category", 0.3),
+}
+
+
+def legacy_rank_tensor(tensor):
+    if torch.sum(tensor) == 0:
+        return tensor
+    sorted_tensor, indices = torch.sort(tensor, descending=True)
+    ranked_tensor = torch.zeros_like(tensor)
+    ranked_tensor[indices[0]] = 1.0
+    if sorted_tensor[1] == sorted_tensor[2]:
+        ranked_tensor[indices[1]] = 0.5
+        ranked_tensor[indices[2]] = 0.5
+    else:
+        ranked_tensor[indices[1]] = 2 / 3
+        ranked_tensor[indices[2]] = 1 / 3
+    return ranked_tensor
+
+
+def legacy_weights(miner_manager):
+    weights = torch.zeros(len(miner_manager.all_uids))
+    for model_name, (reward_type, incentive) in MODELS.items():
+        model_specific_weights = miner_manager.get_model_specific_weights(model_name)
+        if reward_type == "open_category":
+            mask = model_specific_weights > 1e-4
+            ranked = legacy_rank_tensor(model_specific_weights)
+            model_specific_weights = model_specific_weights * 0.5 + ranked * 0.5
+            model_specific_weights = 0.8 + 0.2 * model_specific_weights
+            model_specific_weights = model_specific_weights * mask
+            model_specific_weights = torch.nn.functional.normalize(
+                model_specific_weights, p=1, dim=0
+            )
+        weights += model_specific_weights * incentive
+    return weights
+
+
+def random_miner_manager(n_uids, seed):
+    rng = random.Random(seed)
+    validator = SimpleNamespace(metagraph=SimpleNamespace(uids=torch.arange(n_uids)))
+    miner_manager = MinerManager(validator)
+    all_uids_info = {}
+    for uid in range(n_uids):
+        model_name = rng.choice(list(MODELS) + [""])
+        n_scores = rng.randint(0, 15)
+        scores = [
+            rng.choice([0.0, 1.0, round(rng.random(), 2)]) for _ in range(n_scores)
+        ]
+        all_uids_info[uid] = {"model_name": model_name, "scores": scores}
+    miner_manager.all_uids_info = all_uids_info
+    return miner_manager
+
+
+if __name__ == "__main__":
+    model_names = list(MODELS)
+    is_open_category = torch.tensor(
+        [MODELS[model_name][0] == "open_category" for model_name in model_names]
+    )
+    incentive_weights = torch.tensor(
+        [MODELS[model_name][1] for model_name in model_names]
+    )
+    for seed in range(50):
+        miner_manager = random_miner_manager(random.Random(seed).randint(3, 256), seed)
+        expected = legacy_weights(miner_manager)
+        actual = compute_weights(
+            miner_manager.get_score_matrix(model_names),
+            is_open_category,
+            incentive_weights,
+        )
+        assert torch.allclose(actual, expected, atol=1e-6), (seed, actual, expected)
+    print("Vectorized weights match the per-model loop for 50 random states")